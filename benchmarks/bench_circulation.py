@@ -0,0 +1,88 @@
+"""Batch checkout and return against one loan at a time.
+
+Fills the scratch database with datagen, then lends and returns the same
+stacks of books both ways, alternating so both see the same server state:
+one ``issue``/``return_loan`` transaction per book as the dialogs do, and
+``issue_many``/``return_many`` with CIRCULATION_BATCH books per transaction:
+
+    python benchmarks/bench_circulation.py --sizes 30 300 1000
+    python benchmarks/bench_circulation.py --sqlite /tmp/circ.db
+
+A class checkout is a few dozen books; a morning's book-drop a few hundred.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import datagen
+import library
+from library.settings import CIRCULATION_BATCH
+
+
+def one_at_a_time(circ, member_id, books):
+    loans = [circ.issue(book_id, member_id)[0] for book_id in books]
+    for loan_id in loans:
+        circ.return_loan(loan_id)
+
+
+def batched(circ, member_id, books, batch_size):
+    report = circ.issue_many(member_id, books, batch_size=batch_size)
+    if report.failed:
+        raise RuntimeError(f"batch issue failed: {report}")
+    report = circ.return_many([r[1] for r in report.results], batch_size=batch_size)
+    if report.failed:
+        raise RuntimeError(f"batch return failed: {report}")
+
+
+def consistent(db):
+    return db.fetchone("""
+        SELECT COUNT(*) FROM books b
+        WHERE available != copies - (SELECT COUNT(*) FROM borrowings br
+                                     WHERE br.book_id = b.id AND br.status != 'Returned')
+    """)[0] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 300, 1000],
+                        help="books lent and returned per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=CIRCULATION_BATCH)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    db = datagen.bench_db(args.sqlite)
+    datagen.generate(db, args.books, max(100, args.books // 5), 1, args.seed)
+    circ = library.CirculationService(db)
+    member_id = db.fetchone("SELECT id FROM members WHERE status='Active' ORDER BY id LIMIT 1")[0]
+    shelf = [r[0] for r in db.fetchall(
+        "SELECT id FROM books WHERE available > 0 ORDER BY id LIMIT %s", (max(args.sizes),))]
+
+    print(f"{'books':>6} {'one at a time':>15} {'batched':>13} {'speed-up':>9}")
+    for size in args.sizes:
+        books = shelf[:size]
+        timings = {"single": [], "batch": []}
+        for _ in range(args.repeat):
+            for label, run in (("single", lambda: one_at_a_time(circ, member_id, books)),
+                               ("batch", lambda: batched(circ, member_id, books,
+                                                         args.batch_size))):
+                started = time.perf_counter()
+                run()
+                timings[label].append(time.perf_counter() - started)
+        single = statistics.median(timings["single"])
+        batch  = statistics.median(timings["batch"])
+        print(f"{len(books):>6} {len(books) * 2 / single:>9,.0f} ops/s "
+              f"{len(books) * 2 / batch:>7,.0f} ops/s {single / batch:>8.1f}x")
+    print("available copies consistent:", consistent(db))
+    db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Loan export benchmark: throughput and peak memory at growing sizes.
+
+Grows the loan history in the ``library_bench`` database (never the live
+one) to each scale in turn, exports it to every available format and
+prints rows/s and the process's peak RSS. The peak should stay flat as the
+history grows: only one batch of rows is ever held in memory.
+
+    python benchmarks/bench_export.py --scales 100000 1000000 10000000
+"""
+import argparse
+import datetime
+import importlib.util
+import os
+import random
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datagen import bench_db
+import library
+
+BATCH    = 10_000
+BOOKS    = 1_000
+MEMBERS  = 1_000
+
+
+def ids(db, table, count, insert, row):
+    have = [r[0] for r in db.fetchall(f"SELECT id FROM {table} ORDER BY id LIMIT %s", (count,))]
+    with db.cursor() as cursor:
+        cursor.executemany(insert, [row(n) for n in range(len(have), count)])
+    return [r[0] for r in db.fetchall(f"SELECT id FROM {table} ORDER BY id LIMIT %s", (count,))]
+
+
+def grow(db, target, rng):
+    books = ids(db, "books", BOOKS, """
+        INSERT INTO books (isbn,title,author,genre,year,copies,available)
+        VALUES (%s,%s,'Bench Author','Fiction',2000,1,1)
+    """, lambda n: (f"979-EXP-{n:07d}", f"Export Title {n}"))
+    members = ids(db, "members", MEMBERS, """
+        INSERT INTO members (member_id,name,email) VALUES (%s,%s,%s)
+    """, lambda n: (f"EXP{n:06d}", f"Export Member {n}", f"exp{n}@bench.invalid"))
+    have = db.fetchone("SELECT COUNT(*) FROM borrowings")[0]
+    start = datetime.date(2015, 1, 1)
+    while have < target:
+        rows = []
+        for _ in range(min(BATCH, target - have)):
+            borrowed = start + datetime.timedelta(days=rng.randrange(3650))
+            due = borrowed + datetime.timedelta(days=14)
+            returned = rng.random() < 0.9
+            rows.append((rng.choice(books), rng.choice(members), borrowed, due,
+                         due if returned else None, "Returned" if returned else "Borrowed"))
+        with db.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO borrowings (book_id,member_id,borrow_date,due_date,return_date,status)
+                VALUES (%s,%s,%s,%s,%s,%s)
+            """, rows)
+        have += len(rows)
+        print(f"\r  seeded {have:,} loans", end="", flush=True)
+    print()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def formats():
+    yield "csv"
+    yield "jsonl"
+    if importlib.util.find_spec("pyarrow"):
+        yield "parquet"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = bench_db(args.sqlite)
+    print(f"{'loans':>12}  {'format':<8} {'rows/s':>10} {'MB':>8} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in sorted(args.scales):
+            grow(db, scale, rng)
+            for fmt in formats():
+                path = os.path.join(tmp, f"loans.{fmt}")
+                report = library.export_loans(db, path)
+                size = os.path.getsize(path) / 2**20
+                print(f"{report.rows:>12,}  {fmt:<8} {report.rate:>10,.0f} "
+                      f"{size:>8.0f} {peak_rss_mb():>12.0f}")
+                os.remove(path)
+    db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
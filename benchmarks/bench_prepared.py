@@ -0,0 +1,99 @@
+"""Per-call latency with and without the prepared statement cache.
+
+Fills the scratch database with datagen, then runs the hot paths through
+two pools on it, one with DB_PREPARED_STATEMENTS and one with the cache
+off, alternating between them so both see the same server state:
+
+    python benchmarks/bench_prepared.py --books 20000 --calls 2000
+    python benchmarks/bench_prepared.py --sqlite /tmp/prepared.db   # sqlite3's own cache
+
+On MySQL the difference is the parse and plan the server skips for a
+prepared statement; on SQLite it is sqlite3's compiled-statement cache.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import datagen
+import library
+from library.settings import DB_PREPARED_STATEMENTS
+
+
+def pool(args, statements):
+    if args.sqlite:
+        return library.ConnectionPool({"database": args.sqlite}, size=1,
+                                      backend=library.get_backend("sqlite"),
+                                      statements=statements)
+    return library.ConnectionPool(size=1, statements=statements)
+
+
+def paths(db, rng):
+    """``{name: fn(i)}`` for the hot paths; each call is one timed sample."""
+    books   = library.BookService(db)
+    members = library.MemberService(db)
+    circ    = library.CirculationService(db)
+    words   = [rng.choice(datagen.NOUNS) for _ in range(50)]
+    readers = [r[0] for r in db.fetchall(
+        "SELECT id FROM members WHERE status='Active' ORDER BY id LIMIT 200")]
+    shelf   = [r[0] for r in db.fetchall(
+        "SELECT id FROM books WHERE available > 1 ORDER BY id LIMIT 200")]
+    lo, hi  = db.fetchone("SELECT MIN(id), MAX(id) FROM books")
+
+    def issue_return(i):
+        loan_id, _ = circ.issue(shelf[i % len(shelf)], readers[i % len(readers)])
+        circ.return_loan(loan_id)
+
+    return {
+        "issue + return": issue_return,
+        "search":         lambda i: books.search(words[i % len(words)]),
+        "book by id":     lambda i: books.get(rng.randint(lo, hi)),
+        "member lookup":  lambda i: members.lookup(rng.choice(datagen.FIRST)[:3]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    setup = datagen.bench_db(args.sqlite)
+    datagen.generate(setup, args.books, max(100, args.books // 5), 1, args.seed)
+    setup.pool.close()
+
+    runs = {}
+    for label, statements in (("cached", DB_PREPARED_STATEMENTS), ("uncached", 0)):
+        db = library.DatabaseManager(pool=pool(args, statements))
+        runs[label] = (db, paths(db, random.Random(args.seed)))
+
+    latencies = {(label, name): [] for label in runs for name in runs[label][1]}
+    for i in range(args.calls):
+        for label, (db, fns) in runs.items():
+            for name, fn in fns.items():
+                started = time.perf_counter()
+                fn(i)
+                latencies[label, name].append((time.perf_counter() - started) * 1000)
+
+    print(f"{'path':<16} {'uncached p50':>13} {'cached p50':>11} {'change':>8}")
+    for name in runs["cached"][1]:
+        before = statistics.median(latencies["uncached", name])
+        after  = statistics.median(latencies["cached", name])
+        print(f"{name:<16} {before:>11.3f}ms {after:>9.3f}ms {after / before - 1:>+8.0%}")
+    stats = runs["cached"][0].pool.stats()
+    if stats["prepared_misses"]:
+        print(f"\nprepared statements: {stats['prepared']} cached, "
+              f"{stats['prepared_hits']:,} hits, {stats['prepared_misses']:,} misses")
+    for db, _ in runs.values():
+        db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Search latency benchmark: leading-wildcard LIKE vs the indexed search.
+
+Builds a scratch catalogue in the ``library_bench`` database (never the
+live one), grows it to each scale in turn and prints p50/p95 latency of the
+old LIKE query and of ``search_books`` for several kinds of query.
+
+    python benchmarks/bench_search.py --scales 10000 100000 1000000 --runs 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datagen import bench_db
+import library
+
+BATCH = 5000
+
+FIRST  = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael",
+          "Linda", "David", "Elizabeth", "Harper", "George", "Jane", "Agatha"]
+LAST   = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+          "Davis", "Orwell", "Lee", "Austen", "Christie", "Steinbeck", "Tolkien"]
+WORDS  = ["Shadow", "River", "Garden", "Winter", "Silent", "Empire", "Journey",
+          "Secret", "Midnight", "Kingdom", "Ocean", "Fire", "Glass", "Stone",
+          "Memory", "Storm", "Crown", "Forest", "Light", "Wolf", "Harbour"]
+GENRES = ["Fiction", "Classic", "Dystopian", "Mystery", "Fantasy", "History",
+          "Science", "Romance", "Biography", "Poetry"]
+
+OLD_SEARCH = """
+    SELECT id,isbn,title,author,genre,year,available
+    FROM books WHERE title LIKE %s OR author LIKE %s OR isbn LIKE %s OR genre LIKE %s
+"""
+
+
+def book_row(n, rng):
+    title = " ".join(rng.sample(WORDS, rng.randint(1, 4)))
+    author = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+    copies = rng.randint(1, 5)
+    return (f"978-{n:010d}", title, author, rng.choice(GENRES),
+            rng.randint(1900, 2025), copies, copies)
+
+
+def grow(db, target, rng):
+    have = db.fetchone("SELECT COUNT(*) FROM books")[0]
+    while have < target:
+        rows = [book_row(n, rng) for n in range(have, min(target, have + BATCH))]
+        with db.cursor() as cursor:
+            cursor.executemany("""
+                INSERT INTO books (isbn,title,author,genre,year,copies,available)
+                VALUES (%s,%s,%s,%s,%s,%s,%s)
+            """, rows)
+        have += len(rows)
+        print(f"\r  seeded {have:,} books", end="", flush=True)
+    print()
+
+
+def queries(scale, rng):
+    return {
+        "word":        [rng.choice(WORDS) for _ in range(20)],
+        "two words":   [" ".join(rng.sample(WORDS, 2)) for _ in range(20)],
+        "author":      [rng.choice(LAST) for _ in range(20)],
+        "short":       [rng.choice(WORDS)[:2] for _ in range(20)],
+        "isbn exact":  [f"978-{rng.randrange(scale):010d}" for _ in range(20)],
+        "isbn prefix": [f"978-{rng.randrange(scale):010d}"[:9] for _ in range(20)],
+    }
+
+
+def timed(fn, samples, runs):
+    latencies = []
+    for i in range(runs):
+        q = samples[i % len(samples)]
+        started = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - started) * 1000)
+    cuts = statistics.quantiles(latencies, n=20)
+    return statistics.median(latencies), cuts[18]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db = bench_db(args.sqlite)
+    print(f"{'books':>10}  {'query':<12} {'method':<8} {'p50 ms':>9} {'p95 ms':>9}")
+    for scale in sorted(args.scales):
+        grow(db, scale, rng)
+        for kind, samples in queries(scale, rng).items():
+            methods = {
+                "LIKE":    lambda q: db.fetchall(OLD_SEARCH, (f"%{q}%",) * 4),
+                "indexed": lambda q: library.search_books(db, q),
+            }
+            for name, fn in methods.items():
+                p50, p95 = timed(fn, samples, args.runs)
+                print(f"{scale:>10,}  {kind:<12} {name:<8} {p50:>9.2f} {p95:>9.2f}")
+    db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
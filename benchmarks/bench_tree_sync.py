@@ -0,0 +1,109 @@
+"""List refresh benchmark: delete-and-reinsert vs the diffing TreeSync.
+
+Fills a Treeview with synthetic loan rows at each scale and times a refresh
+(until the last idle chunk has been applied) for several kinds of change,
+both the old way (delete every item, insert every row) and with
+``TreeSync``. Also reports the longest single Tk callback, which is how long
+the window stays unresponsive. Needs a display; no database is used.
+
+    python benchmarks/bench_tree_sync.py --scales 1000 10000 100000
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import library_app as app
+
+STATUSES = ["Borrowed", "Returned", "Overdue"]
+
+
+def loan_rows(n, rng):
+    day = datetime.date(2024, 1, 1)
+    return [(i, f"Title {rng.randrange(n)}", f"Member {rng.randrange(n)}",
+             day, day + datetime.timedelta(days=14), None, rng.choice(STATUSES))
+            for i in range(n, 0, -1)]
+
+
+def changes(rows, rng):
+    """Yield ``(name, new_rows)`` for each kind of refresh."""
+    k = max(1, len(rows) // 100)
+    yield "unchanged", list(rows)
+    edited = list(rows)
+    for i in rng.sample(range(len(rows)), k):
+        edited[i] = edited[i][:6] + ("Returned",)
+    yield "1% edited", edited
+    top = len(rows) + 1
+    yield "1% new on top", [(top + i,) + rows[0][1:] for i in range(k)] + rows[:-k]
+    gone = set(rng.sample(range(len(rows)), k))
+    yield "1% removed", [r for i, r in enumerate(rows) if i not in gone]
+
+
+def tagger(row, i):
+    return ({"Overdue": "overdue", "Returned": "returned"}.get(row[6], ""),)
+
+
+def rebuild(tree, rows, on_done):
+    tree.delete(*tree.get_children())
+    for row in rows:
+        tree.insert("", "end", values=row, tags=tagger(row, 0))
+    on_done()
+
+
+def timed(root, tree, refresh, rows):
+    """Run ``refresh`` to completion; return (total_s, longest_callback_s)."""
+    done, blocks = [], []
+    after_idle = tree.after_idle
+
+    def timed_idle(fn, *args):
+        def run(*args):
+            t = time.perf_counter()
+            fn(*args)
+            blocks.append(time.perf_counter() - t)
+        return after_idle(run, *args)
+
+    tree.after_idle = timed_idle
+    start = time.perf_counter()
+    refresh(rows, lambda: done.append(time.perf_counter()))
+    blocks.append(time.perf_counter() - start)
+    while not done:
+        root.update()
+    return done[0] - start, max(blocks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    root = tk.Tk()
+    print(f"{'rows':>8}  {'change':<14} {'method':<8} {'total ms':>10} {'max block ms':>13}")
+    for scale in sorted(args.scales):
+        rows = loan_rows(scale, rng)
+        for name, new_rows in changes(rows, rng):
+            for method in ("rebuild", "sync"):
+                tree = ttk.Treeview(root, columns=tuple(range(7)), show="headings")
+                if method == "rebuild":
+                    rebuild(tree, rows, lambda: None)
+                    refresh = lambda r, done: rebuild(tree, r, done)
+                else:
+                    sync = app.TreeSync(tree, tagger=tagger)
+                    timed(root, tree, sync.sync, rows)
+                    refresh = sync.sync
+                total, block = timed(root, tree, refresh, new_rows)
+                print(f"{scale:>8,}  {name:<14} {method:<8} "
+                      f"{total * 1000:>10.1f} {block * 1000:>13.1f}")
+                tree.destroy()
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Check that every hot query still uses its index, using EXPLAIN.
+
+Runs against the database configured in library/settings.py (migrating
+it first) and exits non-zero if any query in HOT_QUERIES ignores its index.
+On a nearly empty database MySQL may prefer a table scan, so run it against
+realistically sized data.
+
+    python benchmarks/check_plans.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import library
+
+
+def main():
+    db = library.DatabaseManager()
+    failed = 0
+    for name, index, keys, ok in library.check_query_plans(db):
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'}  {name:<32} wants {index:<28} uses {', '.join(keys) or '(none)'}")
+    db.pool.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Deterministic synthetic library: books, members and years of loans.
+
+The same seed and sizes always give the same catalogue, members and loan
+history; dates are laid out backwards from ``today``, so the share of
+loans currently out or overdue does not drift as the calendar moves on.
+
+- Titles are built from word lists drawn with a Zipf distribution, so
+  common words are common. Authors come from a pool where a few names
+  wrote many books.
+- Borrowing favours popular books and heavy readers (both Zipf), with
+  busier Saturdays.
+- Loans due in the last OVERDUE_WINDOW days are still out with
+  probability ``overdue``. Older ones have all been returned, and the
+  most recent LOAN_DAYS of loans are mostly still out. A book never has
+  more loans out than copies.
+
+Used by the benchmarks, or on its own to fill a scratch database:
+
+    python benchmarks/datagen.py --books 100000 --years 5
+    python benchmarks/datagen.py --books 10000 --sqlite /tmp/library.db
+"""
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import mysql.connector
+
+import library
+from library.settings import LOAN_DAYS
+
+BENCH_DB       = "library_bench"
+BATCH          = 5000
+OVERDUE_WINDOW = 90        # days; loans due before then have been returned
+LOANS_PER_YEAR = 6         # per member, on average
+
+ADJECTIVES = ["Silent", "Last", "Lost", "Hidden", "Broken", "Golden", "Dark", "Little",
+              "Secret", "Long", "Final", "Burning", "Forgotten", "Wild", "Quiet",
+              "Crimson", "Distant", "Endless", "Fallen", "Hollow", "Iron", "Northern",
+              "Painted", "Sleeping", "Winter", "Glass", "Shattered", "Summer", "Bitter"]
+NOUNS      = ["House", "River", "Garden", "Night", "Road", "Girl", "King", "Shadow",
+              "City", "Sea", "War", "Heart", "Light", "Storm", "Island", "Empire",
+              "Journey", "Memory", "Daughter", "Forest", "Kingdom", "Promise", "Winter",
+              "Stranger", "Harbour", "Mountain", "Crown", "Letters", "Silence", "Fire",
+              "Orchard", "Wolf", "Bridge", "Station", "Widow", "Dream", "Mirror",
+              "Tide", "Game", "Stone", "Thief", "Voyage", "Secret", "Summer", "Rain"]
+PLACES     = ["Paris", "the North", "the Valley", "Kyoto", "the Moor", "Lisbon",
+              "the Delta", "Prague", "the Coast", "Cairo", "the Highlands", "Havana"]
+FIRST      = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael",
+              "Linda", "David", "Elizabeth", "Harper", "George", "Jane", "Agatha",
+              "Chinua", "Haruki", "Isabel", "Gabriel", "Toni", "Kazuo", "Arundhati",
+              "Leo", "Virginia", "Fyodor", "Zadie", "Orhan", "Margaret", "Salman",
+              "Ursula", "Ngozi", "Yasmin", "Omar", "Priya", "Wei", "Sofia", "Lars"]
+LAST       = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+              "Davis", "Orwell", "Lee", "Austen", "Christie", "Steinbeck", "Tolkien",
+              "Achebe", "Murakami", "Allende", "Marquez", "Morrison", "Ishiguro", "Roy",
+              "Tolstoy", "Woolf", "Dostoevsky", "Pamuk", "Atwood", "Rushdie", "Le Guin",
+              "Adichie", "Perera", "Fernando", "Silva", "Nakamura", "Okafor", "Haddad",
+              "Larsen", "Novak", "Kowalski", "Rossi", "Dubois", "Schmidt", "Kim"]
+GENRES     = [("Fiction", 30), ("Mystery", 12), ("Romance", 10), ("Fantasy", 9),
+              ("Science Fiction", 7), ("History", 7), ("Biography", 6), ("Classic", 6),
+              ("Children", 5), ("Science", 4), ("Poetry", 2), ("Travel", 2)]
+COPIES     = ([1, 2, 3, 4, 5], [60, 20, 10, 6, 4])
+DAY_WEIGHT = [1.0, 1.0, 1.0, 1.1, 1.2, 1.5, 0.6]     # Monday .. Sunday
+
+
+def bench_db(sqlite=None, pool_size=None):
+    """A DatabaseManager on the scratch ``library_bench`` database (or SQLite file)."""
+    size = {"size": pool_size} if pool_size else {}
+    if sqlite:
+        db = library.DatabaseManager(pool=library.ConnectionPool(
+            {"database": sqlite}, backend=library.get_backend("sqlite"), **size))
+        db.migrate()
+        return db
+    config = dict(library.DB_CONFIG)
+    config.pop("database")
+    conn = mysql.connector.connect(**config)
+    conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {BENCH_DB}")
+    conn.close()
+    library.DB_CONFIG["database"] = BENCH_DB
+    db = library.DatabaseManager()
+    if pool_size:
+        db.pool.close()
+        db = library.DatabaseManager(pool=library.ConnectionPool(**size))
+    return db
+
+
+def zipf_weights(n, s):
+    """Cumulative weights for ranks 1..n falling off as 1/rank**s."""
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def isbn13(n):
+    digits = f"979{n:09d}"
+    check = -sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits)) % 10
+    return f"{digits[:3]}-{digits[3:]}{check}"
+
+
+class Generator:
+    """Rows of a synthetic library; every choice comes from ``random.Random(seed)``."""
+    def __init__(self, books, members, years, seed=42, overdue=0.05, today=None):
+        self.books   = books
+        self.members = members
+        self.years   = years
+        self.overdue = overdue
+        self.today   = today or datetime.date.today()
+        self.rng     = random.Random(seed)
+        self.adj_cw  = zipf_weights(len(ADJECTIVES), 1.0)
+        self.noun_cw = zipf_weights(len(NOUNS), 1.0)
+        self.authors = [self._person() for _ in range(max(50, books // 3))]
+        self.author_cw = zipf_weights(len(self.authors), 0.6)
+        self.out     = {}        # book id -> loans still out, filled by loan_rows
+
+    def _person(self):
+        rng = self.rng
+        return f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+
+    def _word(self, words, cum_weights):
+        return self.rng.choices(words, cum_weights=cum_weights)[0]
+
+    def title(self):
+        rng = self.rng
+        adj, noun = self._word(ADJECTIVES, self.adj_cw), self._word(NOUNS, self.noun_cw)
+        pattern = rng.random()
+        if pattern < 0.35:
+            return f"The {adj} {noun}"
+        if pattern < 0.55:
+            return f"{noun} of {self._word(NOUNS, self.noun_cw)}"
+        if pattern < 0.70:
+            return f"A {noun} in {rng.choice(PLACES)}"
+        if pattern < 0.85:
+            return f"{rng.choice(FIRST)}'s {noun}"
+        return f"{noun} and {self._word(NOUNS, self.noun_cw)}"
+
+    def book_rows(self):
+        """``(isbn, title, author, genre, year, copies, available)`` per book."""
+        rng = self.rng
+        genres, weights = zip(*GENRES)
+        for n in range(self.books):
+            copies = rng.choices(*COPIES)[0]
+            year = max(1850, int(self.today.year - rng.expovariate(1 / 25)))
+            yield (isbn13(n), self.title(),
+                   rng.choices(self.authors, cum_weights=self.author_cw)[0],
+                   rng.choices(genres, weights)[0], year, copies, copies)
+
+    def member_rows(self):
+        """``(member_id, name, email, joined_date, status)`` per member."""
+        rng = self.rng
+        for n in range(self.members):
+            joined = self.today - datetime.timedelta(days=rng.randrange(365 * (self.years + 1)))
+            status = "Suspended" if rng.random() < 0.03 else "Active"
+            yield (f"BM{n:07d}", self._person(), f"member{n}@bench.invalid", joined, status)
+
+    def loan_rows(self, book_ids, copies, member_ids):
+        """Loans day by day, oldest first; ``copies`` maps book id to copies."""
+        rng, today = self.rng, self.today
+        books   = list(book_ids)
+        readers = list(member_ids)
+        rng.shuffle(books)       # popularity rank is unrelated to catalogue order
+        rng.shuffle(readers)
+        book_cw   = zipf_weights(len(books), 1.0)
+        reader_cw = zipf_weights(len(readers), 0.8)
+        out       = self.out
+        days      = 365 * self.years
+        per_day   = self.members * LOANS_PER_YEAR / 365 / (sum(DAY_WEIGHT) / 7)
+        loan_days = datetime.timedelta(days=LOAN_DAYS)
+        for back in range(days, -1, -1):
+            day = today - datetime.timedelta(days=back)
+            expected = per_day * DAY_WEIGHT[day.weekday()]
+            count = int(expected) + (rng.random() < expected % 1)
+            for book, member in zip(rng.choices(books, cum_weights=book_cw, k=count),
+                                    rng.choices(readers, cum_weights=reader_cw, k=count)):
+                due = day + loan_days
+                if due >= today:
+                    status = "Borrowed" if rng.random() < 0.7 else "Returned"
+                elif (today - due).days <= OVERDUE_WINDOW and rng.random() < self.overdue:
+                    status = "Overdue"
+                else:
+                    status = "Returned"
+                if status != "Returned" and out.get(book, 0) >= copies[book]:
+                    status = "Returned"
+                if status == "Returned":
+                    returned = min(today, day + datetime.timedelta(
+                        days=rng.randint(1, LOAN_DAYS + 7)))
+                else:
+                    returned = None
+                    out[book] = out.get(book, 0) + 1
+                yield book, member, day, due, returned, status
+
+
+def _insert(db, query, rows, label):
+    done = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH))
+        if not batch:
+            break
+        with db.transaction() as cursor:
+            cursor.executemany(query, batch)
+        done += len(batch)
+        print(f"\r  {label}: {done:,}", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return done
+
+
+def generate(db, books, members, years, seed=42, overdue=0.05, today=None):
+    """Replace the scratch database's contents with a synthetic library.
+
+    Returns ``{"books": n, "members": n, "loans": n, "seconds": s}``.
+    Refuses to touch a MySQL database other than ``library_bench``.
+    """
+    if db.backend.name == "mysql" and db.fetchone("SELECT DATABASE()")[0] != BENCH_DB:
+        raise ValueError(f"datagen only writes to the {BENCH_DB} database")
+    started = time.perf_counter()
+    gen = Generator(books, members, years, seed, overdue, today)
+    for table in ("borrowings_archive", "borrowings", "members", "books", "job_state"):
+        db.execute(f"DELETE FROM {table}")
+    _insert(db, """
+        INSERT INTO books (isbn,title,author,genre,year,copies,available)
+        VALUES (%s,%s,%s,%s,%s,%s,%s)
+    """, gen.book_rows(), "books")
+    _insert(db, """
+        INSERT INTO members (member_id,name,email,joined_date,status)
+        VALUES (%s,%s,%s,%s,%s)
+    """, gen.member_rows(), "members")
+    copies = dict(db.fetchall("SELECT id, copies FROM books"))
+    member_ids = [r[0] for r in db.fetchall("SELECT id FROM members ORDER BY id")]
+    loans = _insert(db, """
+        INSERT INTO borrowings (book_id,member_id,borrow_date,due_date,return_date,status)
+        VALUES (%s,%s,%s,%s,%s,%s)
+    """, gen.loan_rows(sorted(copies), copies, member_ids), "loans")
+    with db.transaction() as cursor:
+        cursor.executemany("UPDATE books SET available = copies - %s WHERE id=%s",
+                           [(n, book) for book, n in gen.out.items()])
+    library.OverdueEngine(db).run(gen.today)     # records the watermark; nothing left to mark
+    return {"books": books, "members": members, "loans": loans,
+            "seconds": round(time.perf_counter() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--members", type=int, help="default: books / 5")
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--overdue", type=float, default=0.05,
+                        help=f"chance a loan due in the last {OVERDUE_WINDOW} days is still out")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="fill an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    db = bench_db(args.sqlite)
+    print(generate(db, args.books, args.members or max(100, args.books // 5),
+                   args.years, args.seed, args.overdue))
+    db.pool.close()
+
+
+if __name__ == "__main__":
+    main()
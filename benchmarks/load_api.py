@@ -0,0 +1,147 @@
+"""HTTP API load test: requests/s and tail latency of `python -m library serve`.
+
+Opens ``--connections`` keep-alive connections (one per simulated desk).
+Each sends ``--pipeline`` requests back to back, reads the responses, and
+repeats for ``--duration`` seconds. The requests are a mix of search,
+catalogue paging, book and member lookups. ``--writes`` is the fraction
+of rounds that also issue a loan and return it, so run it against a
+scratch database. Latency is measured from sending a request to reading
+its response, queueing included.
+
+    python -m library serve &
+    python benchmarks/load_api.py --connections 50 --pipeline 4 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+
+WORDS = ["river", "history", "the", "war", "love", "science", "garden", "night"]
+
+
+class Desk:
+    """One keep-alive connection speaking just enough HTTP/1.1."""
+    def __init__(self, host, port, token):
+        self.host, self.port = host, port
+        self.auth = f"Authorization: Bearer {token}\r\n" if token else ""
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def request(self, method, target, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        return (f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n{self.auth}"
+                f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+    async def response(self):
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def send(self, requests):
+        """Pipeline ``[(kind, method, target, payload)]``; returns (kind, status, body, s)."""
+        started = time.perf_counter()
+        self.writer.write(b"".join(self.request(m, t, p) for _, m, t, p in requests))
+        await self.writer.drain()
+        results = []
+        for kind, *_ in requests:
+            status, body = await self.response()
+            results.append((kind, status, body, time.perf_counter() - started))
+        return results
+
+
+def read_mix(rng, books, members):
+    return rng.choice([
+        ("search", "GET", f"/books/search?q={rng.choice(WORDS)}", None),
+        ("page", "GET", "/books?limit=50", None),
+        ("book", "GET", f"/books/{rng.choice(books)}", None),
+        ("member", "GET", f"/members/{rng.choice(members)}", None),
+        ("lookup", "GET", "/members?q=a&limit=20", None),
+    ])
+
+
+async def desk_loop(args, rng, books, members, until, latencies, statuses):
+    desk = Desk(args.host, args.port, args.token)
+    await desk.open()
+    try:
+        while time.perf_counter() < until:
+            batch = [read_mix(rng, books, members) for _ in range(args.pipeline)]
+            for kind, status, body, seconds in await desk.send(batch):
+                latencies[kind].append(seconds)
+                statuses[status] += 1
+            if rng.random() < args.writes:
+                [(_, status, body, seconds)] = await desk.send([
+                    ("issue", "POST", "/loans",
+                     {"book_id": rng.choice(books), "member_id": rng.choice(members)})])
+                latencies["issue"].append(seconds)
+                statuses[status] += 1
+                if status == 201:
+                    [(_, status, _, seconds)] = await desk.send([
+                        ("return", "POST", f"/loans/{body['loan_id']}/return", None)])
+                    latencies["return"].append(seconds)
+                    statuses[status] += 1
+    finally:
+        desk.writer.close()
+
+
+def summary(name, values):
+    values = sorted(values)
+    p95, p99 = (values[min(len(values) - 1, int(len(values) * p))] for p in (0.95, 0.99))
+    return f"{name:<8} {len(values):>8,} " + " ".join(
+        f"{v * 1000:>8.1f}" for v in (statistics.median(values), p95, p99, values[-1]))
+
+
+async def run(args):
+    probe = Desk(args.host, args.port, args.token)
+    await probe.open()
+    [(_, _, page, _), (_, _, found, _)] = await probe.send([
+        ("page", "GET", "/books?limit=500", None),
+        ("lookup", "GET", "/members?q=&limit=500", None)])
+    probe.writer.close()
+    books   = [b["id"] for b in page["books"]] or [1]
+    members = [m["id"] for m in found["members"] if m["status"] == "Active"] or [1]
+
+    latencies, statuses = defaultdict(list), defaultdict(int)
+    started = time.perf_counter()
+    until = started + args.duration
+    await asyncio.gather(*(
+        desk_loop(args, random.Random(args.seed + i), books, members, until,
+                  latencies, statuses)
+        for i in range(args.connections)))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{args.connections} connections, pipeline {args.pipeline}: "
+          f"{total:,} requests in {elapsed:.1f}s = {total / elapsed:,.0f} req/s")
+    print("status codes: " + ", ".join(f"{k}: {v:,}" for k, v in sorted(statuses.items())))
+    print(f"{'request':<8} {'count':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind in sorted(latencies):
+        print(summary(kind, latencies[kind]))
+    print(summary("all", [v for values in latencies.values() for v in values]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--token")
+    parser.add_argument("--connections", type=int, default=20)
+    parser.add_argument("--pipeline", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
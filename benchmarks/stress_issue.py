@@ -0,0 +1,132 @@
+"""Circulation stress test: many desks issuing the last copies of one title.
+
+Creates a title with ``--copies`` copies in the ``library_bench`` database
+(never the live one), then has ``--threads`` workers, each with its own
+member, try to borrow it at the same moment. Exactly ``--copies`` issues
+must succeed and ``available`` must end at zero; all loans are then
+returned concurrently and ``available`` must be back to ``--copies``.
+
+    python benchmarks/stress_issue.py --threads 50 --copies 3 --rounds 20
+
+``--legacy`` runs the old read-then-write issue path instead, which shows
+the over-issue it used to allow.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from datagen import bench_db
+import library
+
+ISBN = "978-STRESS-0001"
+
+
+def setup(db, threads, copies):
+    db.execute("DELETE FROM borrowings WHERE book_id IN "
+               "(SELECT id FROM (SELECT id FROM books WHERE isbn=%s) AS b)", (ISBN,))
+    db.execute("DELETE FROM books WHERE isbn=%s", (ISBN,))
+    book_id = db.insert("""
+        INSERT INTO books (isbn,title,author,genre,year,copies,available)
+        VALUES (%s,'Stress Test','Bench','Fiction',2024,%s,%s)
+    """, (ISBN, copies, copies))
+    members = []
+    for n in range(threads):
+        email = f"stress{n}@bench.invalid"
+        row = db.fetchone("SELECT id FROM members WHERE email=%s", (email,))
+        members.append(row[0] if row else db.insert(
+            "INSERT INTO members (member_id,name,email,status) VALUES (%s,%s,%s,'Active')",
+            (f"STRESS{n:04d}", f"Stress {n}", email)))
+    return book_id, members
+
+
+def legacy_issue(db, book_id, member_id, due):
+    row = db.fetchone("SELECT available FROM books WHERE id=%s", (book_id,))
+    if row[0] <= 0:
+        raise library.CirculationError("No copies of this book are available.")
+    db.execute("""
+        INSERT INTO borrowings (book_id, member_id, due_date, status)
+        VALUES (%s, %s, %s, 'Borrowed')
+    """, (book_id, member_id, due))
+    db.execute("UPDATE books SET available = available - 1 WHERE id=%s", (book_id,))
+
+
+def race(targets):
+    """Start every target at once; return the exceptions they raised."""
+    barrier = threading.Barrier(len(targets))
+    errors  = [None] * len(targets)
+
+    def run(i, fn):
+        barrier.wait()
+        try:
+            fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, fn)) for i, fn in enumerate(targets)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def one_round(db, book_id, members, copies, legacy):
+    service = library.CirculationService(db)
+    due = "2099-12-31"
+    issue = legacy_issue if legacy else \
+        lambda db, b, m, d: service.issue(b, m, d)
+    errors = race([lambda m=m: issue(db, book_id, m, due) for m in members])
+
+    unexpected = [e for e in errors if e and not isinstance(e, library.CirculationError)]
+    issued = errors.count(None)
+    available = db.fetchone("SELECT available FROM books WHERE id=%s", (book_id,))[0]
+    loans = [r[0] for r in db.fetchall(
+        "SELECT id FROM borrowings WHERE book_id=%s AND status<>'Returned'", (book_id,))]
+    problems = [repr(e) for e in unexpected]
+    if issued != copies or len(loans) != copies:
+        problems.append(f"{issued} issued / {len(loans)} open loans for {copies} copies")
+    if available != 0:
+        problems.append(f"available={available} after issuing")
+
+    # Return every loan twice over, concurrently; only one of each may count.
+    errors = race([lambda l=l: service.return_loan(l) for l in loans * 2])
+    returned = errors.count(None)
+    available = db.fetchone("SELECT available FROM books WHERE id=%s", (book_id,))[0]
+    if returned != len(loans):
+        problems.append(f"{returned} returns accepted for {len(loans)} loans")
+    if not legacy and available != copies:
+        problems.append(f"available={available} after returns")
+    db.execute("UPDATE books SET available=copies WHERE id=%s", (book_id,))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--copies", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--legacy", action="store_true")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    args = parser.parse_args()
+
+    db = bench_db(args.sqlite, pool_size=args.threads + 1)
+    book_id, members = setup(db, args.threads, args.copies)
+    failed = 0
+    start = time.perf_counter()
+    for n in range(1, args.rounds + 1):
+        problems = one_round(db, book_id, members, args.copies, args.legacy)
+        failed += bool(problems)
+        print(f"round {n:>3}: {'FAIL  ' + '; '.join(problems) if problems else 'ok'}")
+    elapsed = time.perf_counter() - start
+    print(f"{args.rounds - failed}/{args.rounds} rounds consistent in {elapsed:.1f}s")
+    db.pool.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Benchmark suite: hot queries and window load paths at several scales.
+
+For each scale (number of books) the scratch database is refilled by
+datagen with scale/5 members and ``--years`` of loans. Every case is then
+run once to warm up and ``--runs`` times for timing. Results go to a JSON
+file named after the current commit, so two commits can be compared:
+
+    python benchmarks/suite.py --scales 10000 100000            # writes suite-<commit>.json
+    python benchmarks/suite.py --scales 10000 100000 --compare suite-abc1234.json
+    python benchmarks/suite.py --scales 1000 10000 --sqlite /tmp/suite.db   # offline
+
+With ``--compare``, any case whose p50 grew by more than ``--threshold``
+is reported and the exit status is 1.
+
+Cases and the window code they stand for:
+
+    books: first page       _load_books (first keyset page)
+    books: deep page        scrolling the catalogue: the page after a random book
+    books: filtered page    _load_books with a search filter
+    members: all            _load_members
+    borrowings: open page   _load_borrowings (open loans, newest first)
+    borrowings: history     _load_borrowings showing all loans, sorted by title
+    borrowings: count       the Borrow/Return total over all loans (capped)
+    search: <kind>          _do_search through SQL
+    search: index           _do_search through the in-memory SearchIndex
+    search index: build     loading the SearchIndex at startup
+    dashboard               show_dashboard re-count (StatsCache.fetch)
+    issue + return          issue_book_dialog then return_book (issue, return_loan)
+    query: <name>           each HOT_QUERIES entry (MySQL only)
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+REPO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPO)
+
+import datagen
+import library
+from library.schema import HOT_QUERIES
+
+PAGE       = 200    # library_app.TREE_PAGE_SIZE
+HEAVY_RUNS = 5      # cap for cases that read whole tables
+
+
+def git_commit():
+    """``(short hash, has uncommitted changes)``, or (None, None) outside git."""
+    try:
+        head = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=REPO, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return head, bool(dirty)
+
+
+def book_keys(db, rng, count):
+    lo, hi = db.fetchone("SELECT MIN(id), MAX(id) FROM books")
+    return [db.fetchone("SELECT title, id FROM books WHERE id >= %s ORDER BY id LIMIT 1",
+                        (rng.randint(lo, hi),)) for _ in range(count)]
+
+
+def cases(db, rng, scale, index):
+    """``{name: (fn, heavy)}``; each fn takes a sample index and returns rows."""
+    books   = library.BookService(db)
+    members = library.MemberService(db)
+    circ    = library.CirculationService(db)
+    keys    = book_keys(db, rng, 20)
+    words   = [rng.choice(datagen.NOUNS) for _ in range(20)]
+    pairs   = [f"{rng.choice(datagen.ADJECTIVES)} {rng.choice(datagen.NOUNS)}" for _ in range(20)]
+    authors = [rng.choice(datagen.LAST) for _ in range(20)]
+    isbns   = [datagen.isbn13(rng.randrange(scale)) for _ in range(20)]
+    readers = [r[0] for r in db.fetchall(
+        "SELECT id FROM members WHERE status='Active' ORDER BY id LIMIT 200")]
+    shelf   = [r[0] for r in db.fetchall(
+        "SELECT id FROM books WHERE available > 1 ORDER BY id LIMIT 200")]
+
+    def issue_return(i):
+        loan_id, _ = circ.issue(shelf[i % len(shelf)], readers[i % len(readers)])
+        circ.return_loan(loan_id)
+        return [loan_id]
+
+    found = {
+        "books: first page":    (lambda i: books.page(limit=PAGE), False),
+        "books: deep page":     (lambda i: books.page(after=keys[i % 20], limit=PAGE), False),
+        "books: filtered page": (lambda i: books.page(words[i % 20], limit=PAGE), False),
+        "members: all":         (lambda i: members.all(), True),
+        "borrowings: open page": (lambda i: circ.ledger(limit=PAGE), False),
+        "borrowings: history":  (lambda i: circ.ledger(None, sort="title", limit=PAGE), False),
+        "borrowings: count":    (lambda i: [circ.ledger_count(None)], False),
+        "search: word":         (lambda i: books.search(words[i % 20]), False),
+        "search: two words":    (lambda i: books.search(pairs[i % 20]), False),
+        "search: author":       (lambda i: books.search(authors[i % 20]), False),
+        "search: short":        (lambda i: books.search(words[i % 20][:2]), False),
+        "search: isbn":         (lambda i: books.search(isbns[i % 20]), False),
+        "search index: build":  (lambda i: [len(library.load_search_index(db))], True),
+        "dashboard":            (lambda i: library.StatsCache.fetch(db)[1], False),
+        "issue + return":       (issue_return, False),
+    }
+    if index is not None:      # None above SEARCH_INDEX_MAX_BOOKS
+        found["search: index"] = (lambda i: index.search(pairs[i % 20]), False)
+    if db.backend.name == "mysql":
+        for name, query, _ in HOT_QUERIES:
+            found[f"query: {name}"] = (lambda i, q=query: db.fetchall(q), False)
+    return found
+
+
+def timed(fn, runs):
+    fn(0)                                   # warm-up
+    latencies = []
+    for i in range(runs):
+        started = time.perf_counter()
+        rows = fn(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, rows
+
+
+def summary(latencies):
+    p95 = statistics.quantiles(latencies, n=20)[18] if len(latencies) > 1 else latencies[0]
+    return {"p50_ms": round(statistics.median(latencies), 3), "p95_ms": round(p95, 3),
+            "min_ms": round(min(latencies), 3), "mean_ms": round(statistics.fmean(latencies), 3)}
+
+
+def run_scale(db, scale, args):
+    members = max(100, scale // 5)
+    seeded = datagen.generate(db, scale, members, args.years, args.seed)
+    rng = random.Random(args.seed)
+    index = library.load_search_index(db)
+    results = []
+    for name, (fn, heavy) in cases(db, rng, scale, index).items():
+        runs = min(args.runs, HEAVY_RUNS) if heavy else args.runs
+        latencies, rows = timed(fn, runs)
+        result = dict(scale=scale, case=name, runs=runs,
+                      rows=len(rows) if rows is not None else None, **summary(latencies))
+        results.append(result)
+        print(f"{scale:>10,}  {name:<36} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f}")
+    return seeded, results
+
+
+def compare(results, baseline_path, threshold):
+    """Print p50 changes against a previous run; returns the regressed cases."""
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["case"]): r for r in json.load(f)["results"]}
+    print(f"\n{'books':>10}  {'case':<36} {'was p50':>10} {'now p50':>10} {'change':>8}")
+    regressed = []
+    for r in results:
+        old = baseline.get((r["scale"], r["case"]))
+        if not old:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 1.0
+        flag = "  SLOWER" if ratio > threshold else ""
+        print(f"{r['scale']:>10,}  {r['case']:<36} {old['p50_ms']:>10.2f} "
+              f"{r['p50_ms']:>10.2f} {ratio - 1:>+8.0%}{flag}")
+        if flag:
+            regressed.append(r)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="run against an embedded SQLite file instead of MySQL")
+    parser.add_argument("--output", help="results file (default: suite-<commit>.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="p50 ratio above which a case counts as a regression")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    db = datagen.bench_db(args.sqlite)
+    report = {"commit": commit, "dirty": dirty,
+              "created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "backend": db.backend.name, "python": platform.python_version(),
+              "seed": args.seed, "years": args.years, "seeding": [], "results": []}
+    print(f"{'books':>10}  {'case':<36} {'p50 ms':>10} {'p95 ms':>10}")
+    for scale in sorted(args.scales):
+        seeded, results = run_scale(db, scale, args)
+        report["seeding"].append(seeded)
+        report["results"] += results
+    db.pool.close()
+
+    output = args.output or f"suite-{commit or 'worktree'}{'-dirty' if dirty else ''}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output}")
+    if args.compare and compare(report["results"], args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
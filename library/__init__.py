@@ -0,0 +1,36 @@
+"""LibraryOS core: everything except the window.
+
+The Tk app (library_app.py), the command line (``python -m library``) and
+scripts all work through these modules:
+
+    from library import DatabaseManager, CirculationService
+    db = DatabaseManager()                 # connects and migrates the schema
+    CirculationService(db).issue(book_id=12, member_id=3)
+"""
+from .archive import LoanArchiver
+from .backends import get_backend
+from .cache import EntityCache
+from .changes import ChangeFeed
+from .circulation import (OPEN_STATUSES, CirculationError, CirculationReport,
+                          CirculationService)
+from .db import ConnectionPool, DatabaseManager, keyset_where
+from .export import LOAN_STATUSES, ExportReport, export_loans
+from .importer import ImportReport, import_books, isbn_key, normalize_isbn
+from .overdue import OverdueEngine
+from .profiler import QueryProfiler
+from .schema import check_query_plans, migrate
+from .search import SEARCH_COLS, SearchIndex, load_search_index, search_books
+from .server import ApiServer, serve
+from .services import BookService, MemberService, authenticate
+from .settings import DB_CONFIG
+from .stats import StatsCache
+
+__all__ = [
+    "ApiServer", "BookService", "ChangeFeed", "CirculationError", "CirculationReport",
+    "CirculationService", "ConnectionPool", "DB_CONFIG", "DatabaseManager", "EntityCache",
+    "ExportReport", "ImportReport", "LOAN_STATUSES", "LoanArchiver", "MemberService",
+    "OPEN_STATUSES", "OverdueEngine", "QueryProfiler", "SEARCH_COLS", "SearchIndex",
+    "StatsCache", "authenticate", "check_query_plans", "export_loans", "get_backend",
+    "import_books", "isbn_key", "keyset_where", "load_search_index", "migrate",
+    "normalize_isbn", "search_books", "serve",
+]
@@ -0,0 +1,91 @@
+"""Moving old returned loans out of the hot borrowings table."""
+import datetime
+import heapq
+import time
+
+from mysql.connector import Error
+
+from .settings import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH, ARCHIVE_PAUSE
+
+LOAN_TABLES  = ("borrowings", "borrowings_archive")     # hot table first
+LOAN_COLUMNS = "id, book_id, member_id, borrow_date, due_date, return_date, status"
+
+
+def loan_tables(statuses=None):
+    """The tables that can hold loans with ``statuses`` (None: any status).
+
+    Only returned loans are archived, so lists of open loans never touch
+    the archive.
+    """
+    return LOAN_TABLES if not statuses or "Returned" in statuses else LOAN_TABLES[:1]
+
+
+def merged_rows(db, queries, key, batch_size):
+    """Stream several ``(query, params)`` results, each sorted by ``key``,
+    as one sorted stream; each query holds a connection until it is done."""
+    streams = [db.iter_rows(query, params, batch_size) for query, params in queries]
+    try:
+        yield from heapq.merge(*streams, key=key)
+    finally:
+        for stream in streams:
+            stream.close()
+
+
+class LoanArchiver:
+    """Moves returned loans older than ``age_days`` to borrowings_archive.
+
+    Loans returned (and so also borrowed) before the cutoff are found in
+    borrow-date order through the (status, borrow_date) index and moved
+    ``batch_size`` at a time, each batch copied and deleted in one short
+    transaction, with ``pause`` seconds between batches so issues and
+    returns at the desks never queue behind the job. Returned loans never
+    change again, so two archivers at once only split the work; a batch
+    that loses a deadlock to the other is simply picked up again. The
+    ledger, its count and the export read both tables.
+    """
+    def __init__(self, db, age_days=ARCHIVE_AFTER_DAYS, batch_size=ARCHIVE_BATCH,
+                 pause=ARCHIVE_PAUSE):
+        self.db         = db
+        self.age_days   = age_days
+        self.batch_size = batch_size
+        self.pause      = pause
+
+    def cutoff(self, today=None):
+        return (today or datetime.date.today()) - datetime.timedelta(days=self.age_days)
+
+    def run(self, today=None, progress=None):
+        """Archive everything past the cutoff; returns the loans moved.
+
+        ``progress(moved)`` is called after every batch.
+        """
+        cutoff = self.cutoff(today)
+        moved = 0
+        while True:
+            ids = [row[0] for row in self.db.fetchall("""
+                SELECT id FROM borrowings
+                WHERE status='Returned' AND borrow_date < %s AND return_date < %s
+                ORDER BY borrow_date LIMIT %s
+            """, (cutoff, cutoff, self.batch_size))]
+            if not ids:
+                return moved
+            marks = ",".join(["%s"] * len(ids))
+            try:
+                with self.db.transaction() as cursor:
+                    cursor.execute(f"""
+                        INSERT INTO borrowings_archive ({LOAN_COLUMNS})
+                        SELECT {LOAN_COLUMNS} FROM borrowings
+                        WHERE id IN ({marks}) AND status='Returned'
+                    """, ids)
+                    cursor.execute(f"DELETE FROM borrowings WHERE id IN ({marks}) "
+                                   "AND status='Returned'", ids)
+                    batch = cursor.rowcount
+            except Error as e:
+                if not self.db.backend.is_deadlock(e):
+                    raise
+            else:
+                moved += batch          # counted once the batch has committed
+            if progress:
+                progress(moved)
+            if len(ids) < self.batch_size:
+                return moved
+            time.sleep(self.pause)
@@ -0,0 +1,222 @@
+"""Storage backends: a MySQL server, or an embedded SQLite file.
+
+Everything above this module writes MySQL SQL with ``%s`` placeholders and
+talks to connections through the part of the mysql.connector API that
+ConnectionPool and DatabaseManager use. The SQLite backend wraps sqlite3 in
+that API and rewrites each statement on its way through (``translate``), so
+small branches, CI and offline benchmarks run without a server. Its
+differences from MySQL:
+
+- sqlite3 caches compiled statements itself (``cached_statements``), so
+  ``prepares`` is False and the pool's statement cache is not used.
+- Transactions are ``BEGIN IMMEDIATE``: writers queue up on the database
+  lock instead of locking rows, which also covers ``SELECT ... FOR UPDATE``.
+- Search uses LIKE instead of the FULLTEXT index (``fulltext`` is False).
+- sqlite3 errors are re-raised as the matching mysql.connector error, with
+  SQLite's result code as ``errno``, so ``except Error`` handlers need not
+  know which backend is in use.
+- The schema has its own DDL per migration (see schema.SQLITE_MIGRATIONS),
+  with CHECK constraints standing in for ENUMs.
+"""
+from contextlib import contextmanager
+import datetime
+from functools import lru_cache
+import re
+import sqlite3
+
+import mysql.connector
+from mysql.connector import errors
+
+from .settings import DB_BACKEND, DB_CONFIG, DB_POOL_TIMEOUT, SQLITE_PATH
+
+
+class MySQLBackend:
+    name     = "mysql"
+    fulltext = True
+    explain  = "EXPLAIN "
+    prepares = True                   # ConnectionPool keeps server-side statements
+    DEADLOCK_ERRNOS = {1205, 1213}    # lock wait timeout, deadlock
+
+    def default_config(self):
+        return dict(DB_CONFIG)
+
+    def connect(self, config, statements=0):
+        return mysql.connector.connect(**dict(config, autocommit=True))
+
+    def is_deadlock(self, error):
+        return getattr(error, "errno", None) in self.DEADLOCK_ERRNOS
+
+
+class SQLiteBackend:
+    name     = "sqlite"
+    fulltext = False
+    explain  = "EXPLAIN QUERY PLAN "
+    prepares = False                  # sqlite3 caches ``statements`` per connection
+    BUSY_CODES = {5, 6}               # SQLITE_BUSY, SQLITE_LOCKED
+
+    def default_config(self):
+        return {"database": SQLITE_PATH}
+
+    def connect(self, config, statements=0):
+        path = config["database"]
+        with mysql_errors():
+            conn = sqlite3.connect(path, timeout=config.get("timeout", DB_POOL_TIMEOUT),
+                                   isolation_level=None, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES,
+                                   cached_statements=statements,
+                                   uri=path.startswith("file:"))
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+        return SQLiteConnection(conn)
+
+    def is_deadlock(self, error):
+        # the primary result code is the low byte of an extended one
+        return (getattr(error, "errno", None) or 0) & 0xFF in self.BUSY_CODES
+
+
+MYSQL    = MySQLBackend()
+SQLITE   = SQLiteBackend()
+BACKENDS = {b.name: b for b in (MYSQL, SQLITE)}
+
+
+def get_backend(name=None):
+    """The backend called ``name`` (default: DB_BACKEND)."""
+    try:
+        return BACKENDS[name or DB_BACKEND]
+    except KeyError:
+        raise ValueError(f"Unknown database backend {name or DB_BACKEND!r}; "
+                         f"use {' or '.join(BACKENDS)}.")
+
+
+# ─────────────────────────────────────────────
+#  SQLITE
+# ─────────────────────────────────────────────
+sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+sqlite3.register_adapter(datetime.datetime, lambda v: v.isoformat(" "))
+sqlite3.register_converter("DATE", lambda b: datetime.date.fromisoformat(b.decode()))
+sqlite3.register_converter("DATETIME", lambda b: datetime.datetime.fromisoformat(b.decode()))
+
+REWRITES = [
+    (re.compile(r"\bINSERT IGNORE\b"), "INSERT OR IGNORE"),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\bGREATEST\("), "MAX("),
+    (re.compile(r"\bLEAST\("), "MIN("),
+    (re.compile(r"\bCURDATE\(\)"), "date('now', 'localtime')"),
+    (re.compile(r"\bNOW\(\)"), "datetime('now', 'localtime')"),
+    (re.compile(r"\s+FOR UPDATE\b"), ""),
+    (re.compile(r"\bLIKE %s"), r"LIKE %s ESCAPE '\\'"),   # MySQL's default escape
+    (re.compile(r"%([s%])"), lambda m: "?" if m.group(1) == "s" else "%"),
+]
+# SQLite has no UPDATE ... ORDER BY ... LIMIT; pick the rows by rowid instead.
+UPDATE_LIMIT = re.compile(
+    r"^\s*UPDATE\s+(\w+)\s+SET\s+(.*?)\s+WHERE\s+(.*?)\s+(ORDER BY\s+.*?\s+LIMIT\s+\?)\s*$",
+    re.S)
+
+
+@lru_cache(maxsize=256)
+def translate(query):
+    """Rewrite a MySQL statement for SQLite."""
+    for pattern, replacement in REWRITES:
+        query = pattern.sub(replacement, query)
+    return UPDATE_LIMIT.sub(r"UPDATE \1 SET \2 WHERE rowid IN "
+                            r"(SELECT rowid FROM \1 WHERE \3 \4)", query)
+
+
+ERROR_TYPES = [
+    (sqlite3.IntegrityError,    errors.IntegrityError),
+    (sqlite3.OperationalError,  errors.OperationalError),
+    (sqlite3.ProgrammingError,  errors.ProgrammingError),
+    (sqlite3.DataError,         errors.DataError),
+    (sqlite3.NotSupportedError, errors.NotSupportedError),
+    (sqlite3.Error,             errors.DatabaseError),
+]
+
+
+@contextmanager
+def mysql_errors():
+    """Re-raise sqlite3 errors as their mysql.connector counterparts."""
+    try:
+        yield
+    except sqlite3.Error as e:
+        code = getattr(e, "sqlite_errorcode", None)     # Python 3.11+
+        if code is None:
+            code = 5 if "locked" in str(e) else 1
+        for sqlite_type, mysql_type in ERROR_TYPES:
+            if isinstance(e, sqlite_type):
+                raise mysql_type(msg=str(e), errno=code) from e
+
+
+class SQLiteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, query, params=()):
+        with mysql_errors():
+            self.cursor.execute(translate(query), tuple(params))
+
+    def executemany(self, query, rows):
+        with mysql_errors():
+            self.cursor.executemany(translate(query), rows)
+
+    def fetchone(self):
+        with mysql_errors():
+            return self.cursor.fetchone()
+
+    def fetchall(self):
+        with mysql_errors():
+            return self.cursor.fetchall()
+
+    def fetchmany(self, size):
+        with mysql_errors():
+            return self.cursor.fetchmany(size)
+
+    def close(self):
+        self.cursor.close()
+
+    @property
+    def rowcount(self):
+        return self.cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self.cursor.description or ())
+
+
+class SQLiteConnection:
+    """A sqlite3 connection behind the mysql.connector calls the pool makes."""
+    def __init__(self, conn):
+        self.conn = conn
+
+    @property
+    def in_transaction(self):
+        return self.conn.in_transaction
+
+    def cursor(self, buffered=True):
+        return SQLiteCursor(self.conn.cursor())
+
+    def start_transaction(self):
+        with mysql_errors():
+            self.conn.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        with mysql_errors():
+            self.conn.commit()
+
+    def rollback(self):
+        with mysql_errors():
+            self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    def is_connected(self):
+        return True
+
+    def reconnect(self, attempts=1, delay=0):
+        pass
@@ -0,0 +1,74 @@
+"""Read-through cache of book and member records."""
+from collections import OrderedDict
+import threading
+import time
+
+from .settings import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL
+
+class EntityCache:
+    """Bounded LRU of records by ``(kind, id)``, each kept for ``ttl`` seconds.
+
+    Every DatabaseManager has one, shared with its ``background()``
+    managers, and the services read through it: ``get(key, load)`` returns
+    the cached value or calls ``load()`` and keeps a truthy result. Write
+    paths ``invalidate`` what they changed once it is committed; the TTL
+    bounds how long changes made by other desks can go unseen. A load that
+    races with an invalidation is not kept, so an old row read before a
+    write can never be cached after it. Thread-safe; ``size`` 0 turns
+    caching off.
+    """
+    def __init__(self, size=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL):
+        self.size     = size
+        self.ttl      = ttl
+        self._lock    = threading.Lock()
+        self._entries = OrderedDict()     # key -> (value, expires_at)
+        self._version = 0                 # bumped by every invalidation
+        self._counters = {"hits": 0, "misses": 0, "expired": 0,
+                          "evictions": 0, "invalidations": 0}
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return entry[0]
+                del self._entries[key]
+                self._counters["expired"] += 1
+            self._counters["misses"] += 1
+            version = self._version
+        value = load()
+        if value and self.size > 0:
+            with self._lock:
+                if version == self._version:
+                    self._entries[key] = (value, now + self.ttl)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.size:
+                        self._entries.popitem(last=False)
+                        self._counters["evictions"] += 1
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self._counters["invalidations"] += 1
+
+    def clear(self, kind=None):
+        """Forget everything, or every entry whose key starts with ``kind``."""
+        with self._lock:
+            self._version += 1
+            keys = [k for k in self._entries if kind is None or k[0] == kind]
+            for key in keys:
+                del self._entries[key]
+            self._counters["invalidations"] += len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return dict(self._counters, size=len(self._entries), capacity=self.size,
+                        ttl=self.ttl, hit_rate=round(self._counters["hits"] / lookups, 3)
+                        if lookups else None)
@@ -0,0 +1,96 @@
+"""Change feed: committed writes, in order, for other desks to follow."""
+import datetime
+import time
+import uuid
+
+from .settings import CHANGE_FEED_BATCH, CHANGE_GAP_WAIT, CHANGE_LOG_DAYS
+
+# Written with every change this process makes, so its own feed can skip them.
+ORIGIN = uuid.uuid4().hex[:12]
+GAP_LIMIT = 1000        # missing sequence numbers tracked at once; more are skipped
+
+
+RECORD_SQL = """
+    INSERT INTO change_log (entity, entity_id, action, detail, origin)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+
+def record(cursor, entity, entity_id, action, detail=None):
+    """Log a change inside the writing transaction.
+
+    ``entity`` is "book", "member" or "loan"; ``action`` is "insert",
+    "update" or "delete", "import" for a batch of imported books, or for
+    loans "issue", "return" or "overdue". ``detail`` is the loan status for
+    issue/return (before the return). The bulk changes, "import" and
+    "overdue", have no ``entity_id`` (None) and ``detail`` is the number
+    of books added or loans marked overdue; followers reload whatever
+    such a change may cover.
+    """
+    cursor.execute(RECORD_SQL, (entity, entity_id, action,
+                                None if detail is None else str(detail), ORIGIN))
+
+
+def record_many(cursor, changes):
+    """Log several ``(entity, entity_id, action, detail)`` changes at once."""
+    rows = [(entity, entity_id, action, None if detail is None else str(detail), ORIGIN)
+            for entity, entity_id, action, detail in changes]
+    if rows:
+        cursor.executemany(RECORD_SQL, rows)
+
+
+def prune_changes(db, days=CHANGE_LOG_DAYS):
+    """Delete changes older than ``days``; returns the rows deleted."""
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    return db.execute("DELETE FROM change_log WHERE changed_at < %s", (cutoff,))
+
+
+class ChangeFeed:
+    """Reads ``change_log`` forward from a sequence number.
+
+    ``poll(db)`` returns the changes other processes committed since the
+    last poll as ``(seq, entity, entity_id, action, detail)``, oldest first.
+    A sequence number is taken when the row is inserted but only becomes
+    visible when its transaction commits, so seq 12 can show up before 11.
+    Numbers missing below the newest seen are looked for again on every
+    poll until they turn up or ``gap_wait`` seconds pass (a rolled-back
+    write leaves its gap for good). One poller at a time.
+    """
+    def __init__(self, batch=CHANGE_FEED_BATCH, gap_wait=CHANGE_GAP_WAIT):
+        self.batch    = batch
+        self.gap_wait = gap_wait
+        self.seq      = None     # newest sequence number read
+        self.gaps     = {}       # missing seq -> time.monotonic() first missed
+        self.behind   = False    # the last poll stopped at ``batch`` rows
+
+    def start(self, db):
+        """Begin after the newest change; history is not replayed."""
+        self.seq = db.fetchone("SELECT COALESCE(MAX(seq), 0) FROM change_log")[0]
+        self.gaps.clear()
+        return self.seq
+
+    def poll(self, db):
+        if self.seq is None:
+            self.start(db)
+            return []
+        now  = time.monotonic()
+        late = []
+        if self.gaps:
+            marks = ",".join(["%s"] * len(self.gaps))
+            late = db.fetchall(f"""
+                SELECT seq, entity, entity_id, action, detail, origin
+                FROM change_log WHERE seq IN ({marks}) ORDER BY seq
+            """, tuple(self.gaps))
+            for row in late:
+                del self.gaps[row[0]]
+            self.gaps = {seq: t for seq, t in self.gaps.items() if now - t < self.gap_wait}
+        fresh = db.fetchall("""
+            SELECT seq, entity, entity_id, action, detail, origin
+            FROM change_log WHERE seq > %s ORDER BY seq LIMIT %s
+        """, (self.seq, self.batch))
+        for row in fresh:
+            if row[0] - self.seq - 1 <= GAP_LIMIT - len(self.gaps):
+                self.gaps.update(dict.fromkeys(range(self.seq + 1, row[0]), now))
+            self.seq = row[0]
+        self.behind = len(fresh) == self.batch
+        return [row[:5] for row in late + fresh if row[5] != ORIGIN]
@@ -0,0 +1,455 @@
+"""Issuing and returning books."""
+from collections import Counter, defaultdict, deque
+import datetime
+import random
+import time
+
+from mysql.connector import Error
+
+from .archive import loan_tables
+from .changes import record, record_many
+from .db import keyset_where
+from .importer import isbn_key
+from .export import LOAN_STATUSES
+from .settings import (CIRCULATION_BATCH, CIRCULATION_RETRIES, LEDGER_COUNT_CAP, LOAN_DAYS,
+                       SEARCH_PAGE_SIZE)
+
+OPEN_STATUSES = ("Borrowed", "Overdue")
+# Ledger sort orders: name -> (column, position in a ledger row). Ties are
+# broken by the loan id, so every order is a usable keyset.
+LEDGER_SORTS = {
+    "id":          ("br.id", 0),
+    "title":       ("b.title", 1),
+    "member":      ("m.name", 2),
+    "borrow_date": ("br.borrow_date", 3),
+    "due_date":    ("br.due_date", 4),
+    "status":      ("br.status", 6),
+}
+LEDGER_COLUMNS = ("id", "title", "member", "borrow_date", "due_date", "return_date", "status")
+
+
+class CirculationError(Exception):
+    """A loan cannot be issued or returned; the message is shown to the clerk."""
+
+
+class CirculationReport:
+    """Per-item results of a batch issue or return, passed to progress callbacks.
+
+    ``results`` holds ``(item, loan_id, book_id, status, error)`` for every
+    item in the order given: ``status`` is the new loan's status for an
+    issue and the status before the return for a return; ``error`` is None
+    unless the item failed, and then says why.
+    """
+    def __init__(self, action):
+        self.action  = action       # "issued" or "returned"
+        self.results = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def succeeded(self):
+        return sum(1 for r in self.results if r[4] is None)
+
+    @property
+    def failed(self):
+        return len(self.results) - self.succeeded
+
+    @property
+    def rate(self):
+        return len(self.results) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.succeeded:,} {self.action}, {self.failed:,} failed "
+                f"in {self.elapsed:.1f}s ({self.rate:,.0f} items/s)")
+
+
+def _marks(values):
+    return ",".join(["%s"] * len(values))
+
+
+def _by_id(amounts):
+    """``CASE id WHEN ... END`` giving each book id its amount, and its params."""
+    return ("CASE id " + "WHEN %s THEN %s " * len(amounts) + "END",
+            [v for pair in amounts.items() for v in pair])
+
+
+def _book_ids(cursor, items):
+    """Map each item (a book id, an ISBN or its barcode) to a book id or None.
+
+    A code shaped like an ISBN that matches no book is taken as a book id
+    when it is all digits. Ids are taken as given; callers find out whether
+    they exist.
+    """
+    codes = {}
+    for item in items:
+        text   = str(item).strip()
+        digits = isbn_key(text)
+        isbn   = digits if len(digits) in (10, 13) and digits[:9].isdigit() else None
+        codes[item] = (isbn, int(text) if text.isdigit() else None)
+    isbns = sorted({isbn for isbn, _ in codes.values() if isbn})
+    found = {}
+    if isbns:
+        cursor.execute(f"""
+            SELECT REPLACE(isbn, '-', ''), MIN(id) FROM books
+            WHERE REPLACE(isbn, '-', '') IN ({_marks(isbns)})
+            GROUP BY REPLACE(isbn, '-', '')
+        """, isbns)
+        found = dict(cursor.fetchall())
+    return {item: found.get(isbn, book_id) for item, (isbn, book_id) in codes.items()}
+
+
+class CirculationService:
+    """Issue and return books, each in a single transaction.
+
+    Issuing takes a copy with a conditional decrement
+    (``available = available - 1 WHERE available > 0``) and records the loan
+    in the same transaction, so concurrent desks can never lend the last
+    copy twice or drive ``available`` negative. Returning locks the loan row
+    with ``SELECT ... FOR UPDATE`` first, so a loan is only ever returned
+    once. Transactions that hit a deadlock or lock wait timeout are retried
+    with a short randomised backoff. Errors are raised, never shown. Each
+    transaction logs the loan and the book to the change feed, and the
+    book's cached record is invalidated after commit.
+
+    ``issue_many`` and ``return_many`` do the same for a stack of books at
+    a time, ``batch_size`` items per transaction: the rows are locked with
+    one ``SELECT ... FOR UPDATE``, then changed and logged with a handful
+    of multi-row statements; new loans are inserted one by one, to read
+    each id. Items that cannot be lent or returned are reported, not
+    raised, and the rest of their batch goes ahead.
+    """
+    def __init__(self, db, retries=CIRCULATION_RETRIES):
+        self.db      = db
+        self.retries = retries
+
+    @staticmethod
+    def default_due():
+        return datetime.date.today() + datetime.timedelta(days=LOAN_DAYS)
+
+    def ledger(self, statuses=OPEN_STATUSES, start=None, end=None, member_id=None,
+               book_id=None, sort="borrow_date", descending=True,
+               after=None, before=None, limit=SEARCH_PAGE_SIZE, ids=None):
+        """One keyset page of the loan ledger for the Borrow/Return list.
+
+        Rows are ``(id, title, member, borrow_date, due_date, return_date,
+        status)`` in ``sort`` order (a LEDGER_SORTS name, then loan id).
+        Returns up to ``limit`` rows following the ``ledger_key`` ``after``,
+        or immediately preceding ``before``, in display order either way.
+        Filters are as for ``ledger_count``; ``ids`` also limits the page to
+        those loans. When archived loans can match, each table is paged on
+        its own indexes and the two pages are merged.
+        """
+        column, position = LEDGER_SORTS[sort]
+        columns = (column,) if position == 0 else (column, "br.id")
+        names   = LEDGER_COLUMNS[:1] if position == 0 else (LEDGER_COLUMNS[position], "id")
+        where, params = self._ledger_where(statuses, start, end, member_id, book_id)
+        if ids:
+            where.append(f"br.id IN ({','.join(['%s'] * len(ids))})")
+            params += ids
+        ascending = not descending
+        if before:
+            ascending = not ascending   # walk back from the first row shown
+        if after or before:
+            cond, p = keyset_where(columns, after or before, ">" if ascending else "<")
+            where.append(cond)
+            params += p
+        direction = "" if ascending else " DESC"
+        pages = []
+        for table in loan_tables(statuses):
+            query = f"""
+                SELECT br.id AS id, b.title AS title, m.name AS member,
+                       br.borrow_date AS borrow_date, br.due_date AS due_date,
+                       br.return_date AS return_date, br.status AS status
+                FROM {table} br
+                JOIN books b   ON br.book_id   = b.id
+                JOIN members m ON br.member_id = m.id
+            """
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            pages.append(query + " ORDER BY " + ", ".join(c + direction for c in columns)
+                         + " LIMIT %s")
+        if len(pages) == 1:
+            query, params = pages[0], tuple(params) + (limit,)
+        else:
+            query = " UNION ALL ".join(f"SELECT * FROM ({page}) part{i}"
+                                       for i, page in enumerate(pages))
+            query += " ORDER BY " + ", ".join(n + direction for n in names) + " LIMIT %s"
+            params = (tuple(params) + (limit,)) * len(pages) + (limit,)
+        rows = self.db.fetchall(query, params)
+        return rows[::-1] if before else rows
+
+    @staticmethod
+    def ledger_key(row, sort="borrow_date"):
+        """The keyset of a ledger row under ``sort``."""
+        position = LEDGER_SORTS[sort][1]
+        return (row[0],) if position == 0 else (row[position], row[0])
+
+    def ledger_count(self, statuses=OPEN_STATUSES, start=None, end=None, member_id=None,
+                     book_id=None, cap=LEDGER_COUNT_CAP):
+        """Count the loans matching the filters, stopping at ``cap``.
+
+        ``statuses`` (None for all) and ``member_id``/``book_id`` narrow the
+        loans; ``start``/``end`` bound ``borrow_date`` (inclusive). Returns
+        ``(count, exact)``: the server reads at most ``cap + 1`` index
+        entries, so a long history costs no more than ``cap`` loans and is
+        reported as ``(cap, False)``. Archived loans are counted too.
+        """
+        where, params = self._ledger_where(statuses, start, end, member_id, book_id)
+        count = 0
+        for table in loan_tables(statuses):
+            if count > cap:
+                break
+            query = f"SELECT 1 FROM {table} br"
+            if where:
+                query += " WHERE " + " AND ".join(where)
+            count += self.db.fetchone(f"SELECT COUNT(*) FROM ({query} LIMIT %s) capped",
+                                      tuple(params) + (cap + 1 - count,))[0]
+        return min(count, cap), count <= cap
+
+    @staticmethod
+    def _ledger_where(statuses, start, end, member_id, book_id):
+        where, params = [], []
+        if statuses:
+            unknown = set(statuses) - set(LOAN_STATUSES)
+            if unknown:
+                raise ValueError(f"Unknown loan status: {', '.join(sorted(unknown))}")
+            where.append(f"br.status IN ({','.join(['%s'] * len(statuses))})")
+            params += statuses
+        if start:
+            where.append("br.borrow_date >= %s")
+            params.append(start)
+        if end:
+            where.append("br.borrow_date <= %s")
+            params.append(end)
+        if member_id is not None:
+            where.append("br.member_id = %s")
+            params.append(member_id)
+        if book_id is not None:
+            where.append("br.book_id = %s")
+            params.append(book_id)
+        return where, params
+
+    def issue(self, book_id, member_id, due_date=None):
+        """Lend one copy (for LOAN_DAYS by default); returns ``(loan_id, status)``."""
+        due, status = self._due(due_date)
+
+        def work(cursor):
+            cursor.execute("SELECT status FROM members WHERE id=%s", (member_id,))
+            member = cursor.fetchone()
+            if not member or member[0] != "Active":
+                raise CirculationError("This member cannot borrow books.")
+            cursor.execute(
+                "UPDATE books SET available = available - 1 WHERE id=%s AND available > 0",
+                (book_id,))
+            if cursor.rowcount == 0:
+                raise CirculationError("No copies of this book are available.")
+            cursor.execute("""
+                INSERT INTO borrowings (book_id, member_id, due_date, status)
+                VALUES (%s, %s, %s, %s)
+            """, (book_id, member_id, due, status))
+            loan_id = cursor.lastrowid
+            record(cursor, "book", book_id, "update")
+            record(cursor, "loan", loan_id, "issue", status)
+            return loan_id, status
+
+        loan = self._run(work)
+        self.db.cache.invalidate(("books", book_id))
+        return loan
+
+    def return_loan(self, loan_id):
+        """Return a loan; returns ``(book_id, status_before_return)``."""
+        def work(cursor):
+            cursor.execute(
+                "SELECT book_id, status FROM borrowings WHERE id=%s FOR UPDATE", (loan_id,))
+            loan = cursor.fetchone()
+            if not loan:
+                raise CirculationError("This loan no longer exists.")
+            if loan[1] == "Returned":
+                raise CirculationError("This book has already been returned.")
+            cursor.execute("""
+                UPDATE borrowings SET status='Returned', return_date=CURDATE()
+                WHERE id=%s
+            """, (loan_id,))
+            cursor.execute(
+                "UPDATE books SET available = LEAST(available + 1, copies) WHERE id=%s",
+                (loan[0],))
+            record(cursor, "book", loan[0], "update")
+            record(cursor, "loan", loan_id, "return", loan[1])
+            return loan[0], loan[1]
+
+        returned = self._run(work)
+        self.db.cache.invalidate(("books", returned[0]))
+        return returned
+
+    def issue_many(self, member_id, books, due_date=None, batch_size=CIRCULATION_BATCH,
+                   progress=None):
+        """Lend one copy of each of ``books`` to a member, e.g. a class set.
+
+        ``books`` are book ids, ISBNs or scanned ISBN barcodes; a book
+        listed twice takes two copies. Returns a CirculationReport, and
+        ``progress(report)`` is called after every batch.
+        """
+        due, status = self._due(due_date)
+        insert = """
+            INSERT INTO borrowings (book_id, member_id, due_date, status)
+            VALUES (%s, %s, %s, %s)
+        """
+
+        def work(cursor, batch):
+            cursor.execute("SELECT status FROM members WHERE id=%s", (member_id,))
+            member = cursor.fetchone()
+            if not member or member[0] != "Active":
+                raise CirculationError("This member cannot borrow books.")
+            book_ids = _book_ids(cursor, batch)
+            wanted = sorted({b for b in book_ids.values() if b is not None})
+            left = {}
+            if wanted:
+                cursor.execute(f"SELECT id, available FROM books WHERE id IN ({_marks(wanted)}) "
+                               "FOR UPDATE", wanted)
+                left = dict(cursor.fetchall())
+            taken, results = Counter(), []
+            for item in batch:
+                book_id = book_ids[item]
+                if book_id not in left:
+                    results.append((item, None, None, None, "No such book."))
+                elif left[book_id] <= 0:
+                    results.append((item, None, book_id, None,
+                                    "No copies of this book are available."))
+                else:
+                    left[book_id] -= 1
+                    taken[book_id] += 1
+                    results.append((item, None, book_id, status, None))
+            if not taken:
+                return results
+            case, params = _by_id(taken)
+            cursor.execute(f"UPDATE books SET available = available - {case} "
+                           f"WHERE id IN ({_marks(taken)})", params + list(taken))
+            # One INSERT per loan: lastrowid is the only id the backends
+            # guarantee belongs to this transaction's row
+            issued = []
+            for r in results:
+                if r[4] is None:
+                    cursor.execute(insert, (r[2], member_id, due, status))
+                    r = (r[0], cursor.lastrowid) + r[2:]
+                issued.append(r)
+            results = issued
+            record_many(cursor, [("book", b, "update", None) for b in taken] +
+                        [("loan", r[1], "issue", status) for r in results if r[4] is None])
+            return results
+
+        return self._batches(CirculationReport("issued"), books, batch_size, work, progress)
+
+    def return_many(self, items, by="loan", batch_size=CIRCULATION_BATCH, progress=None):
+        """Return a stack of loans, e.g. the morning's book-drop.
+
+        ``items`` are loan ids (``by="loan"``) or books (``by="book"``: ids,
+        ISBNs or scanned barcodes), each book closing its oldest open loan.
+        Returns a CirculationReport, and ``progress(report)`` is called
+        after every batch.
+        """
+        if by not in ("loan", "book"):
+            raise ValueError("by must be 'loan' or 'book'")
+
+        def loans_by_id(cursor, batch):
+            ids = {}
+            for item in batch:
+                text = str(item).strip()
+                ids[item] = int(text) if text.isdigit() else None
+            wanted = sorted({i for i in ids.values() if i is not None})
+            found = {}
+            if wanted:
+                cursor.execute(f"SELECT id, book_id, status FROM borrowings "
+                               f"WHERE id IN ({_marks(wanted)}) FOR UPDATE", wanted)
+                found = {row[0]: row for row in cursor.fetchall()}
+            picked, results = set(), []
+            for item in batch:
+                loan = found.get(ids[item])
+                if loan is None:
+                    results.append((item, ids[item], None, None, "This loan no longer exists."))
+                elif loan[2] == "Returned" or loan[0] in picked:
+                    results.append((item, loan[0], loan[1], None,
+                                    "This book has already been returned."))
+                else:
+                    picked.add(loan[0])
+                    results.append((item,) + tuple(loan) + (None,))
+            return results
+
+        def loans_by_book(cursor, batch):
+            book_ids = _book_ids(cursor, batch)
+            wanted = sorted({b for b in book_ids.values() if b is not None})
+            open_loans = defaultdict(deque)
+            if wanted:
+                cursor.execute(f"""
+                    SELECT id, book_id, status FROM borrowings
+                    WHERE book_id IN ({_marks(wanted)}) AND status IN ('Borrowed', 'Overdue')
+                    ORDER BY borrow_date, id FOR UPDATE
+                """, wanted)
+                for row in cursor.fetchall():
+                    open_loans[row[1]].append(tuple(row))
+            results = []
+            for item in batch:
+                book_id = book_ids[item]
+                if book_id is None:
+                    results.append((item, None, None, None, "No such book."))
+                elif not open_loans[book_id]:
+                    results.append((item, None, book_id, None, "This book is not on loan."))
+                else:
+                    results.append((item,) + open_loans[book_id].popleft() + (None,))
+            return results
+
+        def work(cursor, batch):
+            results = (loans_by_id if by == "loan" else loans_by_book)(cursor, batch)
+            returned = [r for r in results if r[4] is None]
+            if not returned:
+                return results
+            ids = [r[1] for r in returned]
+            cursor.execute("UPDATE borrowings SET status='Returned', return_date=CURDATE() "
+                           f"WHERE id IN ({_marks(ids)})", ids)
+            books = Counter(r[2] for r in returned)
+            case, params = _by_id(books)
+            cursor.execute(f"UPDATE books SET available = LEAST(available + {case}, copies) "
+                           f"WHERE id IN ({_marks(books)})", params + list(books))
+            record_many(cursor, [("book", b, "update", None) for b in books] +
+                        [("loan", r[1], "return", r[3]) for r in returned])
+            return results
+
+        return self._batches(CirculationReport("returned"), items, batch_size, work, progress)
+
+    def _due(self, due_date):
+        """``(due_date, status)`` for a new loan; raises CirculationError."""
+        try:
+            due = datetime.date.fromisoformat(str(due_date or self.default_due()))
+        except ValueError:
+            raise CirculationError("Due date must be a valid date (YYYY-MM-DD).")
+        # A loan issued already past due goes straight to Overdue, since the
+        # overdue job only looks at loans falling due after its last run.
+        return due, "Overdue" if due < datetime.date.today() else "Borrowed"
+
+    def _batches(self, report, items, batch_size, work, progress):
+        """Run ``work(cursor, batch)`` on ``batch_size`` items at a time and
+        collect the results; a CirculationError fails its whole batch."""
+        items = list(items)
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            try:
+                results = self._run(lambda cursor: work(cursor, batch))
+            except CirculationError as e:
+                results = [(item, None, None, None, str(e)) for item in batch]
+            report.results += results
+            changed = {r[2] for r in results if r[4] is None}
+            if changed:
+                self.db.cache.invalidate(*[("books", b) for b in changed])
+            report.elapsed = time.perf_counter() - report.started
+            if progress:
+                progress(report)
+        return report
+
+    def _run(self, work):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.db.transaction() as cursor:
+                    return work(cursor)
+            except Error as e:
+                if not self.db.backend.is_deadlock(e) or attempt == self.retries:
+                    raise
+                time.sleep(random.uniform(0.005, 0.02) * 2 ** attempt)
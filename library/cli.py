@@ -0,0 +1,240 @@
+"""Command line for scripted and nightly work, no window needed.
+
+    python -m library search "orwell 1984"
+    python -m library issue BOOK_ID MEMBER_ID [--due 2025-07-01]
+    python -m library return LOAN_ID
+    python -m library checkout MEMBER_ID ISBN... [--due 2025-07-01]
+    python -m library checkin [--loans] < book-drop.txt
+    python -m library overdue
+    python -m library archive [--days 365]
+    python -m library import branch.csv [--on-duplicate upsert]
+    python -m library export loans.csv [--from 2024-01-01] [--status Overdue]
+    python -m library migrate
+    python -m library serve [--host 0.0.0.0] [--port 8080]
+    python -m library --sqlite branch.db search "orwell"
+    python -m library --profile metrics.json overdue
+
+Results go to stdout (tab-separated), progress and errors to stderr. The
+exit status is 0 on success and 1 on any error, so commands can be chained
+in cron jobs; several may run at once. ``--profile`` times every statement
+and writes the metrics (see library.profiler) to a JSON file on exit.
+"""
+import argparse
+import datetime
+import sys
+
+from mysql.connector import Error
+
+from .archive import LoanArchiver
+from .backends import SQLITE
+from .circulation import CirculationError, CirculationService
+from .db import ConnectionPool, DatabaseManager
+from .export import LOAN_STATUSES, export_loans
+from .importer import IMPORT_SQL, import_books
+from .overdue import OverdueEngine
+from .server import serve
+from .services import BookService
+from .profiler import QueryProfiler
+from .settings import (API_HOST, API_PORT, API_TOKEN, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH,
+                       CIRCULATION_BATCH, EXPORT_BATCH, IMPORT_BATCH, OVERDUE_BATCH,
+                       SEARCH_PAGE_SIZE)
+
+# Back to the start of the line and erase it, so a shorter report leaves no tail
+CLEAR_LINE = "\r\x1b[K"
+
+
+def iso_date(text):
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text!r} is not a date (YYYY-MM-DD)")
+
+
+def show_progress(report):
+    print(f"{CLEAR_LINE}{report}", end="", file=sys.stderr, flush=True)
+
+
+def show_report(report):
+    """The final report, in place of the progress line."""
+    print(f"{CLEAR_LINE}{report}", file=sys.stderr)
+
+
+def print_rows(rows):
+    for row in rows:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+def cmd_search(db, args):
+    print_rows(BookService(db).search(args.query, args.limit, args.offset))
+
+
+def cmd_issue(db, args):
+    print_rows([CirculationService(db).issue(args.book_id, args.member_id, args.due)])
+
+
+def cmd_return(db, args):
+    book_id, was = CirculationService(db).return_loan(args.loan_id)
+    print_rows([(args.loan_id, book_id, was)])
+
+
+def scanned(items):
+    """``items``, or one per line from stdin (a scanner's file) when none are given."""
+    return items or [line.strip() for line in sys.stdin if line.strip()]
+
+
+def show_batch(report):
+    print(CLEAR_LINE, end="", file=sys.stderr, flush=True)
+    print_rows(report.results)
+    show_report(report)
+    if report.failed:
+        raise CirculationError(f"{report.failed:,} of {len(report.results):,} items failed")
+
+
+def cmd_checkout(db, args):
+    show_batch(CirculationService(db).issue_many(args.member_id, scanned(args.books), args.due,
+                                                 args.batch_size, progress=show_progress))
+
+
+def cmd_checkin(db, args):
+    show_batch(CirculationService(db).return_many(scanned(args.items),
+                                                  "loan" if args.loans else "book",
+                                                  args.batch_size, progress=show_progress))
+
+
+def cmd_overdue(db, args):
+    print(OverdueEngine(db, args.batch_size).run())
+
+
+def cmd_archive(db, args):
+    archiver = LoanArchiver(db, args.days, args.batch_size)
+    moved = archiver.run(progress=lambda n: show_progress(f"{n:,} loans archived"))
+    show_report(f"{moved:,} loans returned before {archiver.cutoff()} archived")
+    print(moved)
+
+
+def cmd_import(db, args):
+    report = import_books(db, args.path, args.format, args.on_duplicate,
+                          args.batch_size, progress=show_progress)
+    show_report(report)
+    for where, msg in report.errors:
+        print(f"  rejected {where}: {msg}", file=sys.stderr)
+
+
+def cmd_export(db, args):
+    report = export_loans(db, args.path, args.format, args.start, args.end,
+                          args.status, args.batch_size, progress=show_progress)
+    show_report(report)
+
+
+def cmd_migrate(db, args):
+    print("schema is up to date", file=sys.stderr)    # connecting migrates
+
+
+def cmd_serve(db, args):
+    serve(db, args.host, args.port, args.token)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m library",
+                                     description="LibraryOS without the window.")
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="use the embedded SQLite database PATH instead of DB_BACKEND")
+    parser.add_argument("--profile", metavar="JSON",
+                        help="time every query and write the metrics to JSON on exit")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("search", help="search the catalogue")
+    cmd.add_argument("query")
+    cmd.add_argument("--limit", type=int, default=SEARCH_PAGE_SIZE)
+    cmd.add_argument("--offset", type=int, default=0)
+    cmd.set_defaults(run=cmd_search)
+
+    cmd = commands.add_parser("issue", help="lend a book; prints the loan id and status")
+    cmd.add_argument("book_id", type=int)
+    cmd.add_argument("member_id", type=int)
+    cmd.add_argument("--due", type=iso_date, help="due date (default: the loan period)")
+    cmd.set_defaults(run=cmd_issue)
+
+    cmd = commands.add_parser("return", help="return a loan; prints loan, book and old status")
+    cmd.add_argument("loan_id", type=int)
+    cmd.set_defaults(run=cmd_return)
+
+    cmd = commands.add_parser("checkout", help="lend several books to one member; "
+                              "prints item, loan id, book id, status and error per book")
+    cmd.add_argument("member_id", type=int)
+    cmd.add_argument("books", nargs="*", help="book ids or ISBNs (default: one per line on stdin)")
+    cmd.add_argument("--due", type=iso_date, help="due date (default: the loan period)")
+    cmd.add_argument("--batch-size", type=int, default=CIRCULATION_BATCH)
+    cmd.set_defaults(run=cmd_checkout)
+
+    cmd = commands.add_parser("checkin", help="return a stack of books, e.g. the book-drop; "
+                              "each closes the book's oldest open loan")
+    cmd.add_argument("items", nargs="*",
+                     help="book ids or ISBNs (default: one per line on stdin)")
+    cmd.add_argument("--loans", action="store_true", help="the items are loan ids")
+    cmd.add_argument("--batch-size", type=int, default=CIRCULATION_BATCH)
+    cmd.set_defaults(run=cmd_checkin)
+
+    cmd = commands.add_parser("overdue", help="mark loans past their due date overdue")
+    cmd.add_argument("--batch-size", type=int, default=OVERDUE_BATCH)
+    cmd.set_defaults(run=cmd_overdue)
+
+    cmd = commands.add_parser("archive", help="move old returned loans to borrowings_archive")
+    cmd.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                     help="archive loans returned more than DAYS ago")
+    cmd.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    cmd.set_defaults(run=cmd_archive)
+
+    cmd = commands.add_parser("import", help="bulk-import a CSV or MARC 21 catalogue file")
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=("csv", "marc"),
+                     help="default: from the file extension")
+    cmd.add_argument("--on-duplicate", choices=tuple(IMPORT_SQL), default="skip",
+                     help="what to do with a book whose ISBN is already catalogued")
+    cmd.add_argument("--batch-size", type=int, default=IMPORT_BATCH)
+    cmd.set_defaults(run=cmd_import)
+
+    cmd = commands.add_parser("export", help="stream loan history to CSV, JSON Lines or Parquet")
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=("csv", "jsonl", "parquet"),
+                     help="default: from the file extension")
+    cmd.add_argument("--from", dest="start", type=iso_date, help="first borrow date")
+    cmd.add_argument("--to", dest="end", type=iso_date, help="last borrow date")
+    cmd.add_argument("--status", action="append", choices=LOAN_STATUSES,
+                     help="repeat to export several statuses; default: all")
+    cmd.add_argument("--batch-size", type=int, default=EXPORT_BATCH)
+    cmd.set_defaults(run=cmd_export)
+
+    cmd = commands.add_parser("migrate", help="bring the database schema up to date")
+    cmd.set_defaults(run=cmd_migrate)
+
+    cmd = commands.add_parser("serve", help="run the HTTP/JSON API for front desks")
+    cmd.add_argument("--host", default=API_HOST)
+    cmd.add_argument("--port", type=int, default=API_PORT)
+    cmd.add_argument("--token", default=API_TOKEN,
+                     help="require 'Authorization: Bearer TOKEN' on every request")
+    cmd.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db = None
+    profiler = QueryProfiler(enabled=True) if args.profile else None
+    try:
+        pool = ConnectionPool({"database": args.sqlite} if args.sqlite else None,
+                              backend=SQLITE if args.sqlite else None, profiler=profiler)
+        db = DatabaseManager(pool=pool)
+        db.migrate()
+        args.run(db, args)
+    except (CirculationError, Error, OSError, ValueError) as e:
+        print(f"\n{args.command} failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if db is not None:
+            db.pool.close()
+            if profiler:
+                profiler.dump(args.profile, command=args.command, pool=db.pool.stats(),
+                              cache=db.cache.stats())
+                print(f"query metrics written to {args.profile}", file=sys.stderr)
+    return 0
@@ -0,0 +1,502 @@
+"""Database access: a bounded connection pool and the DatabaseManager on top."""
+from collections import OrderedDict
+from contextlib import contextmanager
+import re
+import threading
+import time
+
+from mysql.connector import Error
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+from .backends import get_backend
+from .cache import EntityCache
+from .profiler import ProfiledCursor, QueryProfiler
+from .schema import migrate
+from .settings import (DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_PREPARED_STATEMENTS,
+                       DB_READ_RETRIES, DB_STREAM_BATCH, DB_VALIDATE_AFTER)
+
+
+# Client errors meaning the server connection is gone: "server has gone
+# away", "lost connection during query" and "lost connection (system error)".
+DISCONNECT_ERRNOS = {2006, 2013, 2055}
+
+
+def is_disconnect(error):
+    return (isinstance(error, (InterfaceError, OperationalError))
+            and (error.errno in DISCONNECT_ERRNOS or error.errno is None
+                 or error.errno == -1))
+
+
+# Statements worth preparing; DDL and the like go through the text protocol.
+PREPARABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b", re.I)
+UNKNOWN_STATEMENT = 1243    # the server no longer has the statement handle
+
+
+class StatementCache:
+    """LRU of server-side prepared statements on one connection.
+
+    Each entry is a ``cursor(prepared=True)`` that has prepared one SQL
+    text, so running the same text again skips parsing and planning.
+    Evicted cursors are closed, which deallocates the statement on the
+    server. Statements belong to the session: the pool drops the cache
+    when the connection is reconnected, discarded or closed.
+    """
+    def __init__(self, conn, size):
+        self.conn      = conn
+        self.size      = size
+        self.cursors   = OrderedDict()    # SQL text -> prepared cursor
+        self.hits      = 0
+        self.misses    = 0
+        self.evictions = 0
+
+    def get(self, query):
+        cursor = self.cursors.get(query)
+        if cursor is not None:
+            self.cursors.move_to_end(query)
+            self.hits += 1
+            return cursor
+        self.misses += 1
+        cursor = self.cursors[query] = self.conn.cursor(prepared=True)
+        if len(self.cursors) > self.size:
+            _, evicted = self.cursors.popitem(last=False)
+            self.evictions += 1
+            try:
+                evicted.close()
+            except Error:
+                pass
+        return cursor
+
+    def forget(self, query):
+        self.cursors.pop(query, None)
+
+
+class PreparedCursor:
+    """A buffered cursor that runs statements through a StatementCache.
+
+    Results are read in full as soon as a statement runs, like the buffered
+    cursors the rest of the code expects, so the cached cursor is ready for
+    its next execution. ``executemany`` and statements PREPARABLE does not
+    match use a plain buffered cursor: batched INSERTs are rewritten into
+    one multi-row statement by the text protocol, which beats re-executing
+    a prepared one per row.
+    """
+    def __init__(self, conn, cache):
+        self.conn      = conn
+        self.cache     = cache
+        self._plain    = None
+        self._rows     = []
+        self._pos      = 0
+        self.rowcount  = -1
+        self.lastrowid = None
+        self.column_names = ()
+
+    def execute(self, query, params=()):
+        if not PREPARABLE.match(query):
+            return self._run_plain(lambda cursor: cursor.execute(query, params))
+        for attempt in range(2):
+            cursor = self.cache.get(query)
+            try:
+                cursor.execute(query, tuple(params))
+                rows = cursor.fetchall() if cursor.description else None
+                break
+            except Error as e:
+                if attempt or e.errno != UNKNOWN_STATEMENT:
+                    raise
+                self.cache.forget(query)      # re-prepare once
+        self._result(cursor, rows)
+
+    def executemany(self, query, rows):
+        self._run_plain(lambda cursor: cursor.executemany(query, rows))
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchmany(self, size):
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._rows[self._pos:]
+        self._pos = len(self._rows)
+        return rows
+
+    def close(self):
+        self._rows = []
+        if self._plain is not None:
+            self._plain.close()
+
+    def _run_plain(self, run):
+        if self._plain is None:
+            self._plain = self.conn.cursor(buffered=True)
+        run(self._plain)
+        rows = self._plain.fetchall() if self._plain.description else None
+        self._result(self._plain, rows)
+
+    def _result(self, cursor, rows):
+        self._rows, self._pos = rows or [], 0
+        self.rowcount  = len(rows) if rows is not None else cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        self.column_names = tuple(cursor.column_names or ())
+
+
+class ConnectionPool:
+    """Bounded pool of database connections shared by the UI and background work.
+
+    Connections are opened on demand up to ``size`` and reused LIFO, so the
+    warmest connection is handed out first. A connection that sat idle longer
+    than ``DB_VALIDATE_AFTER`` is pinged before use and reconnected if the
+    server dropped it (``wait_timeout``, restarts). Callers that see a
+    disconnect release the connection with ``discard=True``. ``backend``
+    defaults to DB_BACKEND and ``config`` to that backend's settings.
+    ``profiler`` collects statement timings for every manager on the pool,
+    and up to ``statements`` prepared statements are kept per connection.
+    """
+    def __init__(self, config=None, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 backend=None, profiler=None, statements=DB_PREPARED_STATEMENTS):
+        self.backend  = backend or get_backend()
+        self.config   = self.backend.default_config() if config is None else dict(config)
+        self.size     = size
+        self.timeout  = timeout
+        self.profiler = profiler or QueryProfiler()
+        self.statements = statements
+        self._caches  = {}      # connection -> StatementCache
+        self._cond   = threading.Condition()
+        self._idle   = []       # [(connection, released_at)]
+        self._open   = 0        # idle + in use
+        self._in_use = 0
+        self._counters = {"acquired": 0, "waits": 0, "wait_time": 0.0,
+                          "max_wait": 0.0, "reconnects": 0, "discarded": 0,
+                          "timeouts": 0}
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            waited = False
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolError(
+                        f"No free database connection after {self.timeout}s "
+                        f"({self.size} in use)")
+                waited = True
+                self._cond.wait(remaining)
+            conn, idle_since = self._idle.pop() if self._idle else (None, None)
+            if conn is None:
+                self._open += 1
+            self._in_use += 1
+            wait = time.monotonic() - started
+            self._counters["acquired"] += 1
+            if waited:
+                self._counters["waits"] += 1
+                self._counters["wait_time"] += wait
+                self._counters["max_wait"] = max(self._counters["max_wait"], wait)
+        try:
+            if conn is None:
+                conn = self.backend.connect(self.config, self.statements)
+            elif time.monotonic() - idle_since > DB_VALIDATE_AFTER:
+                self._validate(conn)
+        except Exception:
+            self._forget()
+            raise
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Error:
+                discard = True
+        if discard:
+            self._drop_cache(conn)
+            try:
+                conn.close()
+            except Error:
+                pass
+            self._forget(discarded=True)
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Error as e:
+            discard = is_disconnect(e)
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def statement_cache(self, conn):
+        """The StatementCache of ``conn``, or None if statements are not prepared."""
+        if not (self.backend.prepares and self.statements):
+            return None
+        cache = self._caches.get(conn)
+        if cache is None:
+            with self._cond:
+                cache = self._caches[conn] = StatementCache(conn, self.statements)
+        return cache
+
+    def stats(self):
+        with self._cond:
+            caches = list(self._caches.values())
+            return dict(self._counters, size=self.size, open=self._open,
+                        in_use=self._in_use, idle=len(self._idle),
+                        prepared=sum(len(c.cursors) for c in caches),
+                        prepared_hits=sum(c.hits for c in caches),
+                        prepared_misses=sum(c.misses for c in caches),
+                        prepared_evictions=sum(c.evictions for c in caches))
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._drop_cache(conn)
+            try:
+                conn.close()
+            except Error:
+                pass
+
+    def _validate(self, conn):
+        if conn.is_connected():
+            return
+        with self._cond:
+            self._counters["reconnects"] += 1
+        # The new session has none of the old statements; their handles
+        # must not be closed on it either.
+        self._drop_cache(conn)
+        conn.reconnect(attempts=2, delay=1)
+
+    def _drop_cache(self, conn):
+        # Closing or reconnecting the connection frees its statements.
+        with self._cond:
+            self._caches.pop(conn, None)
+
+    def _forget(self, discarded=False):
+        with self._cond:
+            self._open   -= 1
+            self._in_use -= 1
+            if discarded:
+                self._counters["discarded"] += 1
+            self._cond.notify()
+
+
+class DatabaseManager:
+    """Database access on top of a shared ConnectionPool.
+
+    Errors are raised to the caller unless an ``on_error(error)`` handler is
+    given (the window shows errors in a messagebox), in which case the
+    helpers below report through it and return an empty result. Connecting
+    migrates the schema. ``background()`` returns a manager on the same pool
+    and EntityCache that always raises, for worker threads. Reads are retried on a fresh
+    connection if the old one was lost.
+
+    Every cursor is closed when its statement is done: use ``cursor()`` for
+    anything the helpers below do not cover, and ``iter_rows()`` to stream
+    large result sets without materialising them. While the pool's profiler
+    is enabled, every statement run through these cursors is timed.
+    """
+    def __init__(self, on_error=None, pool=None, cache=None):
+        self.on_error = on_error
+        self.pool     = pool
+        self.cache    = cache if cache is not None else EntityCache()
+        if pool is None:
+            self.connect()
+
+    @property
+    def backend(self):
+        return self.pool.backend
+
+    @property
+    def profiler(self):
+        return self.pool.profiler
+
+    def connect(self):
+        self.pool = ConnectionPool()
+        self.migrate()
+
+    def background(self):
+        return DatabaseManager(pool=self.pool, cache=self.cache)
+
+    def migrate(self):
+        """Bring the schema up to date; see MIGRATIONS."""
+        with self.cursor() as cursor:
+            migrate(cursor, self.backend.name)
+
+    @contextmanager
+    def transaction(self):
+        """Yield a buffered cursor whose statements form one transaction.
+
+        Commits when the block exits normally and rolls back if it raises.
+        Errors are always raised.
+        """
+        with self.pool.connection() as conn:
+            conn.start_transaction()
+            cursor = self._cursor(conn)
+            try:
+                yield cursor
+                conn.commit()
+            except BaseException:
+                try:
+                    conn.rollback()
+                except Error:
+                    pass          # the connection died; the pool discards it
+                raise
+            finally:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+
+    def write(self, work):
+        """Run ``work(cursor)`` in one transaction and return its result.
+
+        Errors are reported like ``execute()``'s: through ``on_error`` when
+        one is given (returning None), raised otherwise.
+        """
+        try:
+            with self.transaction() as cursor:
+                return work(cursor)
+        except Error as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return None
+
+    @contextmanager
+    def cursor(self):
+        """Yield a buffered cursor on a pooled connection, closing it afterwards."""
+        with self.pool.connection() as conn:
+            cursor = self._cursor(conn)
+            try:
+                yield cursor
+            finally:
+                try:
+                    cursor.close()
+                except Error:
+                    pass          # the connection died; the pool discards it
+
+    def _cursor(self, conn, buffered=True):
+        cache = self.pool.statement_cache(conn) if buffered else None
+        if cache is not None:
+            cursor = PreparedCursor(conn, cache)
+        else:
+            cursor = conn.cursor(buffered=buffered)
+        if self.pool.profiler.enabled:
+            cursor = ProfiledCursor(cursor, conn, self.pool.profiler, self.backend.explain)
+        return cursor
+
+    def execute(self, query, params=None):
+        """Run a single autocommitted write; returns the affected row count."""
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return cursor.rowcount
+        except Error as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return None
+
+    def insert(self, query, params=None):
+        """Run an INSERT; returns the new row's AUTO_INCREMENT id."""
+        try:
+            with self.cursor() as cursor:
+                cursor.execute(query, params or ())
+                return cursor.lastrowid
+        except Error as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return None
+
+    def fetchall(self, query, params=None):
+        try:
+            return self._read(query, params, lambda cursor: cursor.fetchall())
+        except Error as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return []
+
+    def fetchone(self, query, params=None):
+        try:
+            return self._read(query, params, lambda cursor: cursor.fetchone())
+        except Error as e:
+            if self.on_error is None:
+                raise
+            self.on_error(e)
+            return None
+
+    def _read(self, query, params, fetch):
+        # Reads are idempotent, so a connection lost mid-query is simply
+        # retried on a fresh one from the pool.
+        for attempt in range(DB_READ_RETRIES + 1):
+            try:
+                with self.cursor() as cursor:
+                    cursor.execute(query, params or ())
+                    return fetch(cursor)
+            except Error as e:
+                if attempt == DB_READ_RETRIES or not is_disconnect(e):
+                    raise
+
+    def iter_rows(self, query, params=None, batch_size=DB_STREAM_BATCH):
+        """Stream rows from an unbuffered (server-side) cursor.
+
+        Rows are pulled ``batch_size`` at a time with ``fetchmany``, so only
+        one batch is held in memory. Errors are always raised, and the pooled
+        connection stays checked out until the generator is exhausted or
+        closed.
+        """
+        for batch in self.iter_batches(query, params, batch_size):
+            yield from batch
+
+    def iter_batches(self, query, params=None, batch_size=DB_STREAM_BATCH):
+        """Like ``iter_rows`` but yields lists of up to ``batch_size`` rows."""
+        conn = self.pool.acquire()
+        finished = False
+        try:
+            cursor = self._cursor(conn, buffered=False)
+            try:
+                cursor.execute(query, params or ())
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+                finished = True
+            finally:
+                if finished:
+                    cursor.close()
+        finally:
+            # Abandoning a stream early leaves unread rows on the wire;
+            # dropping the connection is cheaper than draining them.
+            self.pool.release(conn, discard=not finished)
+
+
+def keyset_where(columns, key, op=">"):
+    """Keyset condition ``(c1, c2, ...) op key`` spelled out column by column.
+
+    MySQL does not use an index for row-value comparisons, so
+    ``(title, id) > (%s, %s)`` is expanded to
+    ``title > %s OR (title = %s AND id > %s)``.
+    Returns the SQL fragment and its parameters.
+    """
+    terms, params = [], []
+    for i, col in enumerate(columns):
+        eq = [f"{c} = %s" for c in columns[:i]]
+        terms.append("(" + " AND ".join(eq + [f"{col} {op} %s"]) + ")")
+        params += list(key[:i]) + [key[i]]
+    return "(" + " OR ".join(terms) + ")", params
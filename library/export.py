@@ -0,0 +1,174 @@
+"""Streaming export of the loan history."""
+from contextlib import closing, contextmanager
+import csv
+import json
+import os
+import time
+
+from .archive import loan_tables, merged_rows
+from .settings import EXPORT_BATCH
+
+
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl",
+                  ".parquet": "parquet"}
+LOAN_STATUSES  = ("Borrowed", "Returned", "Overdue")
+LOAN_EXPORT_COLUMNS = ("loan_id", "book_id", "isbn", "title", "member_id",
+                       "member", "borrow_date", "due_date", "return_date", "status")
+
+
+def loan_export_query(start=None, end=None, statuses=None, table="borrowings"):
+    """The loan history join behind the Borrow/Return list, with filters.
+
+    ``start``/``end`` bound ``borrow_date`` (inclusive) and walk the
+    table's borrow_date index in order, so the server can stream rows
+    without sorting them first. ``table`` is borrowings or its archive.
+    """
+    where, params = [], []
+    if start:
+        where.append("br.borrow_date >= %s")
+        params.append(start)
+    if end:
+        where.append("br.borrow_date <= %s")
+        params.append(end)
+    if statuses:
+        unknown = set(statuses) - set(LOAN_STATUSES)
+        if unknown:
+            raise ValueError(f"Unknown loan status: {', '.join(sorted(unknown))}")
+        where.append(f"br.status IN ({','.join(['%s'] * len(statuses))})")
+        params += statuses
+    query = f"""
+        SELECT br.id, b.id, b.isbn, b.title, m.member_id, m.name,
+               br.borrow_date, br.due_date, br.return_date, br.status
+        FROM {table} br
+        JOIN books b   ON br.book_id   = b.id
+        JOIN members m ON br.member_id = m.id
+    """
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    return query + " ORDER BY br.borrow_date, br.id", params
+
+
+def _csv_sink(f, columns):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    return writer.writerows
+
+
+def _jsonl_sink(f, columns):
+    def write(rows):
+        f.write("".join(json.dumps(dict(zip(columns, row)), default=str) + "\n"
+                        for row in rows))
+    return write
+
+
+def _parquet_sink(path, columns):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow).")
+    types = {"loan_id": pa.int32(), "book_id": pa.int32(), "borrow_date": pa.date32(),
+             "due_date": pa.date32(), "return_date": pa.date32()}
+    schema = pa.schema([(c, types.get(c, pa.string())) for c in columns])
+    writer = pq.ParquetWriter(path, schema)
+
+    def write(rows):
+        # One row group per batch: only the current batch is ever in memory
+        writer.write_table(pa.Table.from_pydict(
+            {c: list(col) for c, col in zip(columns, zip(*rows))}, schema=schema))
+    return write, writer.close
+
+
+@contextmanager
+def open_export(path, columns, fmt=None):
+    """Yield ``write(rows)`` for an export file; it appears at ``path`` only
+    once the block completes, so a failed or cancelled export leaves no
+    half-written file behind."""
+    fmt = fmt or EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in ("csv", "jsonl", "parquet"):
+        raise ValueError(f"Unknown export format for {path!r}; use .csv, .jsonl or .parquet.")
+    part = path + ".part"
+    try:
+        if fmt == "parquet":
+            write, close = _parquet_sink(part, columns)
+            try:
+                yield write
+            finally:
+                close()
+        else:
+            with open(part, "w", newline="", encoding="utf-8") as f:
+                yield (_csv_sink if fmt == "csv" else _jsonl_sink)(f, columns)
+        os.replace(part, path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+
+
+def loan_batches(db, start=None, end=None, statuses=None, batch_size=EXPORT_BATCH):
+    """Stream the filtered loan history in (borrow_date, id) order, in lists
+    of ``batch_size`` rows, from borrowings and (when it can match) its
+    archive."""
+    queries = [loan_export_query(start, end, statuses, table)
+               for table in loan_tables(statuses)]
+    if len(queries) == 1:
+        yield from db.iter_batches(*queries[0], batch_size)
+        return
+    batch = []
+    with closing(merged_rows(db, queries, lambda row: (row[6], row[0]), batch_size)) as rows:
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class _ExportCancelled(Exception):
+    pass
+
+
+class ExportReport:
+    """Running totals of an export, passed to progress callbacks."""
+    def __init__(self, path):
+        self.path      = path
+        self.rows      = 0
+        self.started   = time.perf_counter()
+        self.elapsed   = 0.0
+        self.cancelled = False
+
+    @property
+    def rate(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return f"{self.rows:,} rows in {self.elapsed:.1f}s ({self.rate:,.0f} rows/s)"
+
+
+def export_loans(db, path, fmt=None, start=None, end=None, statuses=None,
+                 batch_size=EXPORT_BATCH, progress=None, cancelled=None):
+    """Stream loan history to a CSV, JSON Lines or Parquet file.
+
+    Rows come from a server-side cursor ``batch_size`` at a time and each
+    batch is written before the next is fetched, so memory stays flat however
+    many loans are exported. ``progress(report)`` is called after every
+    batch; ``cancelled()`` stops the export (and discards the file) between
+    batches. Archived loans are merged in borrow-date order. Returns an
+    ExportReport; errors are raised.
+    """
+    report = ExportReport(path)
+    try:
+        with open_export(path, LOAN_EXPORT_COLUMNS, fmt) as write, \
+                closing(loan_batches(db, start, end, statuses, batch_size)) as batches:
+            for rows in batches:
+                write(rows)
+                report.rows += len(rows)
+                report.elapsed = time.perf_counter() - report.started
+                if progress:
+                    progress(report)
+                if cancelled and cancelled():
+                    raise _ExportCancelled
+    except _ExportCancelled:
+        report.cancelled = True
+    report.elapsed = time.perf_counter() - report.started
+    return report
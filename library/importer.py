@@ -0,0 +1,281 @@
+"""Bulk catalogue import from CSV and MARC 21 (ISO 2709) files."""
+from contextlib import contextmanager
+import csv
+import os
+import re
+import time
+
+from .changes import record
+from .settings import IMPORT_BATCH, IMPORT_MAX_ERRORS
+
+
+IMPORT_FORMATS = {".csv": "csv", ".mrc": "marc", ".marc": "marc",
+                  ".iso": "marc", ".iso2709": "marc"}
+CSV_COLUMNS = {"isbn": "isbn", "title": "title", "author": "author",
+               "genre": "genre", "year": "year", "copies": "copies",
+               "total copies": "copies"}
+IMPORT_COLS = "isbn,title,author,genre,year,copies,available"
+IMPORT_SQL  = {
+    "skip": f"INSERT IGNORE INTO books ({IMPORT_COLS}) VALUES (%s,%s,%s,%s,%s,%s,%s)",
+    # available moves with copies so that loans already out stay accounted for
+    "upsert": f"""
+        INSERT INTO books ({IMPORT_COLS}) VALUES (%s,%s,%s,%s,%s,%s,%s)
+        ON DUPLICATE KEY UPDATE
+            title=VALUES(title), author=VALUES(author), genre=VALUES(genre),
+            year=VALUES(year),
+            available=GREATEST(0, available + VALUES(copies) - copies),
+            copies=VALUES(copies)
+    """,
+}
+# "upsert" for books already catalogued under another spelling of the ISBN
+UPDATE_SQL = """
+    UPDATE books SET title=%s, author=%s, genre=%s, year=%s,
+        available=GREATEST(0, available + %s - copies), copies=%s
+    WHERE id=%s
+"""
+
+
+def isbn_key(raw):
+    """An ISBN as stored and matched: hyphens and spaces dropped, upper case.
+
+    >>> isbn_key(" 0-306-40615-x ")
+    '030640615X'
+    """
+    return str(raw).strip().upper().replace("-", "").replace(" ", "")
+
+
+def normalize_isbn(raw):
+    """Return the ``isbn_key`` of a valid ISBN-10/13, else raise ValueError.
+
+    >>> normalize_isbn("978-0-06-112008-4") == normalize_isbn("9780061120084")
+    True
+    """
+    isbn = str(raw).strip().upper()
+    digits = isbn_key(isbn)
+    if len(digits) == 10 and digits[:9].isdigit() and digits[9] in "0123456789X":
+        valid = sum((10 - i) * (10 if c == "X" else int(c))
+                    for i, c in enumerate(digits)) % 11 == 0
+    elif len(digits) == 13 and digits.isdigit():
+        valid = sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(digits)) % 10 == 0
+    else:
+        valid = False
+    if not valid:
+        raise ValueError(f"invalid ISBN {isbn!r}")
+    return digits
+
+
+def book_record(rec):
+    """Validate one imported record; returns the row for IMPORT_SQL."""
+    isbn   = normalize_isbn(rec.get("isbn") or "")
+    title  = (rec.get("title") or "").strip()
+    author = (rec.get("author") or "").strip()
+    genre  = (rec.get("genre") or "").strip()
+    if not title or not author:
+        raise ValueError("title and author are required")
+    for name, value, limit in (("ISBN", isbn, 20), ("title", title, 200),
+                               ("author", author, 100), ("genre", genre, 50)):
+        if len(value) > limit:
+            raise ValueError(f"{name} is longer than {limit} characters")
+    try:
+        year = int(rec["year"]) if (rec.get("year") or "").strip() else None
+    except ValueError:
+        raise ValueError(f"year {rec['year']!r} is not a whole number")
+    try:
+        copies = int(rec["copies"]) if (rec.get("copies") or "").strip() else 1
+    except ValueError:
+        copies = 0
+    if copies < 1:
+        raise ValueError(f"copies {rec['copies']!r} is not a positive whole number")
+    return (isbn, title, author, genre or None, year, copies, copies)
+
+
+def read_csv(stream):
+    """Yield ``(line_no, record)`` from a CSV file with a header row."""
+    reader = csv.DictReader(stream)
+    columns = {name: CSV_COLUMNS.get(name.strip().lower())
+               for name in reader.fieldnames or ()}
+    missing = {"isbn", "title", "author"} - set(columns.values())
+    if missing:
+        raise ValueError(f"CSV header has no {', '.join(sorted(missing))} column")
+    for rec in reader:
+        yield reader.line_num, {columns[k]: v for k, v in rec.items() if columns.get(k)}
+
+
+def _marc_subfields(field):
+    # Indicators, then "\x1f" + code + value for each subfield; first wins
+    return {part[0]: part[1:].strip()
+            for part in reversed(field.split("\x1f")[1:]) if part}
+
+
+def marc_book(fields):
+    """Map MARC21 bibliographic fields (``{tag: [data]}``) to a book record."""
+    def sub(tags, code):
+        for tag in tags:
+            for field in fields.get(tag, ()):
+                value = _marc_subfields(field).get(code)
+                if value:
+                    return value
+        return ""
+
+    title    = sub(("245",), "a").rstrip(" /:;,.")
+    subtitle = sub(("245",), "b").rstrip(" /:;,.")
+    fixed    = (fields.get("008") or [""])[0]
+    year     = fixed[7:11] if fixed[7:11].isdigit() else ""
+    if not year:
+        found = re.search(r"\d{4}", sub(("264", "260"), "c"))
+        year = found.group() if found else ""
+    return {"isbn":   sub(("020",), "a").split(" ")[0],
+            "title":  f"{title}: {subtitle}" if subtitle else title,
+            "author": sub(("100", "110", "700"), "a").rstrip(" ,."),
+            "genre":  sub(("655", "650"), "a").rstrip(" ."),
+            "year":   year}
+
+
+def read_marc(stream):
+    """Yield ``(record_no, record)`` from an ISO 2709 (MARC21) byte stream."""
+    n = 0
+    while True:
+        leader = stream.read(24)
+        if not leader.strip():
+            return
+        n += 1
+        try:
+            length, base = int(leader[:5]), int(leader[12:17])
+        except ValueError:
+            raise ValueError(f"record {n}: not a MARC record (bad leader)")
+        body = stream.read(length - 24)
+        if len(body) < length - 24:
+            raise ValueError(f"record {n}: file ends mid-record")
+        encoding = "utf-8" if leader[9:10] == b"a" else "latin-1"
+        data = body[base - 24:]
+        directory = body[:base - 25]
+        fields = {}
+        for i in range(0, len(directory) - 11, 12):
+            tag = directory[i:i + 3].decode("ascii", "replace")
+            size, start = int(directory[i + 3:i + 7]), int(directory[i + 7:i + 12])
+            value = data[start:start + size].rstrip(b"\x1e\x1d")
+            fields.setdefault(tag, []).append(value.decode(encoding, "replace"))
+        yield n, marc_book(fields)
+
+
+@contextmanager
+def open_import(path, fmt=None):
+    """Open ``path`` and yield a stream of ``(position, record)`` pairs."""
+    fmt = fmt or IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield read_csv(f)
+    elif fmt == "marc":
+        with open(path, "rb") as f:
+            yield read_marc(f)
+    else:
+        raise ValueError(f"Unknown import format for {path!r}; use CSV or MARC (.mrc).")
+
+
+class ImportReport:
+    """Running totals of a catalogue import, passed to progress callbacks."""
+    def __init__(self):
+        self.read     = 0
+        self.inserted = 0
+        self.updated  = 0
+        self.skipped  = 0
+        self.rejected = 0
+        self.errors   = []      # (position, message) of the first rejected rows
+        self.started  = time.perf_counter()
+        self.elapsed  = 0.0
+        self.cancelled = False
+
+    def reject(self, where, error):
+        self.rejected += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append((where, str(error)))
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.read:,} read, {self.inserted:,} added, {self.updated:,} updated, "
+                f"{self.skipped:,} skipped, {self.rejected:,} rejected "
+                f"in {self.elapsed:.1f}s ({self.rate:,.0f} rows/s)")
+
+
+def import_books(db, path, fmt=None, on_duplicate="skip", batch_size=IMPORT_BATCH,
+                 progress=None, cancelled=None):
+    """Stream a CSV or MARC file into ``books``; returns an ImportReport.
+
+    Records are validated one by one (bad rows are counted and reported, not
+    fatal) and written ``batch_size`` at a time with ``executemany``, one
+    transaction per batch. ISBNs are stored as digits only, and a book whose
+    ISBN is already catalogued, with or without hyphens, is left alone
+    (``on_duplicate="skip"``) or overwritten (``"upsert"``).
+    ``progress(report)`` is called after every batch and ``cancelled()``,
+    if given, stops the import between batches. Runs on any thread; errors
+    other than bad rows are raised.
+    """
+    if on_duplicate not in IMPORT_SQL:
+        raise ValueError(f"on_duplicate must be one of {', '.join(IMPORT_SQL)}")
+    report = ImportReport()
+    batch  = {}
+
+    def flush():
+        _write_import_batch(db, list(batch.values()), on_duplicate, report)
+        batch.clear()
+        report.elapsed = time.perf_counter() - report.started
+        if progress:
+            progress(report)
+
+    with open_import(path, fmt) as records:
+        for where, rec in records:
+            report.read += 1
+            try:
+                row = book_record(rec)
+            except ValueError as e:
+                report.reject(where, e)
+                continue
+            if row[0] in batch:
+                if on_duplicate == "skip":
+                    report.skipped += 1
+                    continue
+            # An upsert keeps the file's last record for a book; it is written,
+            # and counted, once
+            batch[row[0]] = row
+            if len(batch) >= batch_size:
+                flush()
+                if cancelled and cancelled():
+                    report.cancelled = True
+                    break
+        else:
+            if batch:
+                flush()
+    report.elapsed = time.perf_counter() - report.started
+    return report
+
+
+def _write_import_batch(db, rows, on_duplicate, report):
+    if not rows:
+        return
+    with db.transaction() as cursor:
+        # Catalogued books match on the ISBN digits, however they were hyphenated
+        marks = ",".join(["%s"] * len(rows))
+        cursor.execute(f"SELECT REPLACE(isbn, '-', ''), id FROM books "
+                       f"WHERE REPLACE(isbn, '-', '') IN ({marks})", [row[0] for row in rows])
+        existing = dict(cursor.fetchall())
+        new = [row for row in rows if row[0] not in existing]
+        inserted = len(new)
+        if new:
+            cursor.executemany(IMPORT_SQL[on_duplicate], new)
+            if on_duplicate == "skip":
+                # INSERT IGNORE writes nothing for a book another desk has
+                # just added, so count what it actually wrote
+                inserted = cursor.rowcount
+        if on_duplicate == "upsert" and existing:
+            cursor.executemany(UPDATE_SQL, [row[1:5] + (row[5], row[5], existing[row[0]])
+                                            for row in rows if row[0] in existing])
+        record(cursor, "book", None, "import", inserted)
+    db.cache.clear("books")
+    report.inserted += inserted
+    if on_duplicate == "skip":
+        report.skipped += len(rows) - inserted
+    else:
+        report.updated += len(existing)
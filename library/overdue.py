@@ -0,0 +1,59 @@
+"""The daily job that marks loans overdue."""
+import datetime
+
+from .changes import record
+from .settings import OVERDUE_BATCH
+
+
+class OverdueEngine:
+    """Marks borrowed loans overdue once their due date has passed.
+
+    Each run only looks at loans that fell due since the previous run's
+    watermark, through the (status, due_date) index. It updates them in
+    batches of ``batch_size``, each committed on its own, so clerks issuing
+    books never wait long on row locks. The watermark, time of the last run
+    and rows changed are kept in ``job_state``. A second run on the same day
+    is a no-op, so several desks can share the job.
+    """
+    JOB = "overdue"
+
+    def __init__(self, db, batch_size=OVERDUE_BATCH):
+        self.db         = db
+        self.batch_size = batch_size
+
+    def state(self):
+        row = self.db.fetchone(
+            "SELECT watermark, last_run, rows_changed FROM job_state WHERE job=%s",
+            (self.JOB,))
+        watermark, last_run, rows_changed = row or (None, None, 0)
+        return {"watermark": watermark, "last_run": last_run, "rows_changed": rows_changed}
+
+    def run(self, today=None):
+        """Flag loans that fell due before ``today``; returns rows changed."""
+        today = today or datetime.date.today()
+        watermark = self.state()["watermark"]   # loans due before it are done
+        if watermark is not None and watermark >= today:
+            return 0
+        query  = "UPDATE borrowings SET status='Overdue' WHERE status='Borrowed' AND due_date < %s"
+        params = (today,)
+        if watermark is not None:
+            query  += " AND due_date >= %s"
+            params += (watermark,)
+        query += " ORDER BY due_date LIMIT %s"
+        changed = 0
+        while True:
+            with self.db.transaction() as cursor:
+                cursor.execute(query, params + (self.batch_size,))
+                batch = cursor.rowcount
+                if batch:
+                    record(cursor, "loan", None, "overdue", batch)
+            changed += batch
+            if batch < self.batch_size:
+                break
+        self.db.execute("""
+            INSERT INTO job_state (job, watermark, last_run, rows_changed)
+            VALUES (%s, %s, NOW(), %s)
+            ON DUPLICATE KEY UPDATE watermark=VALUES(watermark),
+                last_run=VALUES(last_run), rows_changed=VALUES(rows_changed)
+        """, (self.JOB, today, changed))
+        return changed
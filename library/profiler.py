@@ -0,0 +1,268 @@
+"""Per-statement query instrumentation and the slow-query log.
+
+Every ConnectionPool owns a QueryProfiler, off unless PROFILE_QUERIES is
+set. While it is off, DatabaseManager hands out plain cursors and the
+only cost is one attribute check per cursor. While it is on, cursors are
+wrapped in ProfiledCursor, which records for each distinct SQL text:
+
+- calls, errors and rows returned or affected
+- a latency histogram (HISTOGRAM_MS buckets) for percentiles
+- the call sites it ran from: the first frame outside the database layer
+
+A statement slower than PROFILE_SLOW_MS is logged to the
+``library.queries`` logger with its EXPLAIN plan (read once per statement)
+and kept in a short in-memory log. Plans are read for queries, UPDATE,
+DELETE and INSERT ... SELECT; an ``executemany`` is explained with the
+values of its first row. ``snapshot()`` feeds the window's Diagnostics
+page and ``dump(path)`` writes everything as JSON.
+"""
+from bisect import bisect_left
+from collections import Counter, deque
+import datetime
+import json
+import logging
+import re
+import sys
+import threading
+import time
+
+from mysql.connector import Error
+
+from .settings import PROFILE_QUERIES, PROFILE_SLOW_LOG, PROFILE_SLOW_MS
+
+log = logging.getLogger("library.queries")
+
+HISTOGRAM_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                1000, 2500, 5000, 10_000)      # upper bounds; one more bucket above
+CALL_SITES   = 5        # call sites kept per statement in snapshots
+# Statements EXPLAIN accepts; INSERT ... VALUES has no plan worth reading.
+PLANNED      = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE|(INSERT|REPLACE)\b.*\bSELECT)\b",
+                          re.I | re.S)
+WHITESPACE   = re.compile(r"\s+")
+# Frames in these modules are the database plumbing, not the caller.
+PLUMBING     = {"library.db", "library.profiler", "library.backends", "contextlib"}
+
+
+def normalize(query):
+    return WHITESPACE.sub(" ", query).strip()
+
+
+def call_site():
+    """``module:line function`` of the nearest caller outside the database layer."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module not in PLUMBING:
+            return f"{module}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class StatementStats:
+    def __init__(self, sql):
+        self.sql     = sql
+        self.calls   = 0
+        self.errors  = 0
+        self.rows    = 0
+        self.total   = 0.0      # seconds
+        self.max     = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_MS) + 1)
+        self.sites   = Counter()
+        self.plan    = None     # EXPLAIN rows, once a run was slow
+
+    def percentile(self, p):
+        """Upper bound (ms) of the bucket holding the ``p``-th percentile."""
+        rank = p / 100 * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return HISTOGRAM_MS[i] if i < len(HISTOGRAM_MS) else round(self.max * 1000, 3)
+        return 0.0
+
+    def as_dict(self):
+        calls = self.calls or 1
+        return {"sql": self.sql, "calls": self.calls, "errors": self.errors,
+                "rows": self.rows, "total_ms": round(self.total * 1000, 3),
+                "mean_ms": round(self.total * 1000 / calls, 3),
+                "p50_ms": self.percentile(50), "p95_ms": self.percentile(95),
+                "p99_ms": self.percentile(99), "max_ms": round(self.max * 1000, 3),
+                "histogram": dict(zip([f"<={b}" for b in HISTOGRAM_MS] + ["more"],
+                                      self.buckets)),
+                "call_sites": dict(self.sites.most_common(CALL_SITES)),
+                "plan": self.plan}
+
+
+class QueryProfiler:
+    """Thread-safe statement statistics shared by every user of a pool."""
+    def __init__(self, enabled=PROFILE_QUERIES, slow_ms=PROFILE_SLOW_MS,
+                 slow_log=PROFILE_SLOW_LOG):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.slow    = deque(maxlen=slow_log)
+        self.started = time.time()
+        self._lock   = threading.Lock()
+        self._stats  = {}       # normalized SQL -> StatementStats
+
+    def record(self, query, seconds, rows, site, error=False, explain=None):
+        """Count one run; ``explain()`` is called for the plan if it was slow."""
+        sql = normalize(query)
+        with self._lock:
+            stats = self._stats.get(sql)
+            if stats is None:
+                stats = self._stats[sql] = StatementStats(sql)
+            stats.calls  += 1
+            stats.errors += error
+            stats.rows   += max(rows, 0)
+            stats.total  += seconds
+            stats.max     = max(stats.max, seconds)
+            stats.buckets[bisect_left(HISTOGRAM_MS, seconds * 1000)] += 1
+            stats.sites[site] += 1
+            slow = seconds * 1000 >= self.slow_ms and not error
+            need_plan = slow and stats.plan is None and explain is not None
+        if not slow:
+            return
+        plan = explain() if need_plan else None
+        with self._lock:
+            if plan is not None:
+                stats.plan = plan
+            entry = {"at": datetime.datetime.now().isoformat(timespec="seconds"),
+                     "ms": round(seconds * 1000, 1), "rows": rows, "site": site,
+                     "sql": sql, "plan": stats.plan}
+            self.slow.append(entry)
+        log.warning("slow query (%.0f ms, %d rows) at %s: %s%s", entry["ms"], rows,
+                    site, sql, "".join(f"\n    {step}" for step in entry["plan"] or ()))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.slow.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Statement statistics, slowest total first, and the slow-query log."""
+        with self._lock:
+            statements = [s.as_dict() for s in self._stats.values()]
+            slow = list(self.slow)
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return statements, slow
+
+    def dump(self, path, **extra):
+        """Write the snapshot (plus ``extra``, e.g. pool stats) to ``path`` as JSON."""
+        statements, slow = self.snapshot()
+        report = dict(extra, created=datetime.datetime.now().isoformat(timespec="seconds"),
+                      since=datetime.datetime.fromtimestamp(self.started)
+                                    .isoformat(timespec="seconds"),
+                      enabled=self.enabled, slow_ms=self.slow_ms,
+                      statements=statements, slow=slow)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, default=str)
+        return path
+
+
+class ProfiledCursor:
+    """A cursor that reports each statement to a QueryProfiler.
+
+    A statement's time and row count run from ``execute`` until the next
+    ``execute`` or ``close``, so rows fetched afterwards are included.
+    """
+    def __init__(self, cursor, conn, profiler, explain):
+        self.cursor   = cursor
+        self.conn     = conn
+        self.profiler = profiler
+        self.explain  = explain     # backend's EXPLAIN prefix
+        self._query   = None        # statement being timed
+        self._params  = ()
+        self._elapsed = 0.0
+        self._rows    = 0
+        self._fetched = 0
+
+    def execute(self, query, params=()):
+        self._finish()
+        self._start(query, params)
+        try:
+            self.cursor.execute(query, params)
+        except Error:
+            self._finish(error=True)
+            raise
+        self._elapsed += time.perf_counter() - self._started
+        self._rows = self.cursor.rowcount
+
+    def executemany(self, query, rows):
+        rows = list(rows)
+        self._finish()
+        self._start(query, rows[0] if rows else ())
+        try:
+            self.cursor.executemany(query, rows)
+        except Error:
+            self._finish(error=True)
+            raise
+        self._elapsed += time.perf_counter() - self._started
+        self._rows = self.cursor.rowcount
+        self._finish()
+
+    def fetchone(self):
+        row = self._fetch(self.cursor.fetchone)
+        self._fetched += row is not None
+        return row
+
+    def fetchall(self):
+        rows = self._fetch(self.cursor.fetchall)
+        self._fetched += len(rows)
+        return rows
+
+    def fetchmany(self, size):
+        rows = self._fetch(self.cursor.fetchmany, size)
+        self._fetched += len(rows)
+        return rows
+
+    def close(self):
+        self._finish()
+        self.cursor.close()
+
+    def __getattr__(self, name):          # rowcount, lastrowid, column_names, ...
+        return getattr(self.cursor, name)
+
+    def _start(self, query, params=()):
+        self._query   = query
+        self._params  = params
+        self._site    = call_site()
+        self._elapsed = 0.0
+        self._rows    = 0
+        self._fetched = 0
+        self._started = time.perf_counter()
+
+    def _fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._query is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def _finish(self, error=False):
+        query, self._query = self._query, None
+        if query is None:
+            return
+        if error:
+            self._elapsed += time.perf_counter() - self._started
+        rows = max(self._rows, self._fetched)
+        params = self._params
+        explain = (lambda: self._plan(query, params)) if PLANNED.match(query) else None
+        self.profiler.record(query, self._elapsed, rows, self._site, error, explain)
+
+    def _plan(self, query, params):
+        # The parameters are used for EXPLAIN only; the log shows the SQL text.
+        cursor = self.conn.cursor(buffered=True)
+        try:
+            cursor.execute(self.explain + query, params)
+            names = cursor.column_names
+            return [", ".join(f"{k}={v}" for k, v in zip(names, row) if v is not None)
+                    for row in cursor.fetchall()]
+        except Error as e:
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                pass
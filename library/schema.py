@@ -0,0 +1,388 @@
+"""Versioned schema migrations and EXPLAIN checks of the hot queries."""
+from contextlib import contextmanager
+import hashlib
+
+from mysql.connector.errors import OperationalError
+
+
+def ensure_index(table, name, ddl):
+    """Migration step running ``ddl`` unless ``table`` already has index ``name``.
+
+    MySQL DDL is not transactional, so index steps must be safe to repeat
+    after a migration that failed half way.
+    """
+    def step(cursor):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+            LIMIT 1
+        """, (table, name))
+        if not cursor.fetchall():
+            cursor.execute(ddl)
+    return step
+
+
+def seed_admin(cursor):
+    # Default admin: admin / admin123
+    pw = hashlib.sha256("admin123".encode()).hexdigest()
+    cursor.execute("""
+        INSERT IGNORE INTO admins (username, password) VALUES (%s, %s)
+    """, ("admin", pw))
+
+
+# Ordered (version, description, steps); a step is SQL or a callable taking
+# a cursor. Released migrations are never edited: add a new one instead.
+# Version 1 is the original schema, so databases that predate the
+# schema_version table adopt it without changes.
+MIGRATIONS = [
+    (1, "Base tables", [
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id          INT AUTO_INCREMENT PRIMARY KEY,
+            isbn        VARCHAR(20)  UNIQUE NOT NULL,
+            title       VARCHAR(200) NOT NULL,
+            author      VARCHAR(100) NOT NULL,
+            genre       VARCHAR(50),
+            year        INT,
+            copies      INT DEFAULT 1,
+            available   INT DEFAULT 1,
+            added_date  DATE DEFAULT (CURDATE())
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS members (
+            id           INT AUTO_INCREMENT PRIMARY KEY,
+            member_id    VARCHAR(20) UNIQUE NOT NULL,
+            name         VARCHAR(100) NOT NULL,
+            email        VARCHAR(100) UNIQUE NOT NULL,
+            phone        VARCHAR(20),
+            joined_date  DATE DEFAULT (CURDATE()),
+            status       ENUM('Active','Suspended') DEFAULT 'Active'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS borrowings (
+            id            INT AUTO_INCREMENT PRIMARY KEY,
+            book_id       INT NOT NULL,
+            member_id     INT NOT NULL,
+            borrow_date   DATE DEFAULT (CURDATE()),
+            due_date      DATE,
+            return_date   DATE,
+            status        ENUM('Borrowed','Returned','Overdue') DEFAULT 'Borrowed',
+            FOREIGN KEY (book_id)   REFERENCES books(id),
+            FOREIGN KEY (member_id) REFERENCES members(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+            id       INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(64) NOT NULL
+        )
+        """,
+        seed_admin,
+    ]),
+    (2, "Catalogue paging and search indexes", [
+        ensure_index("books", "idx_books_title",
+                     "CREATE INDEX idx_books_title ON books (title)"),
+        ensure_index("books", "ft_books_text",
+                     "CREATE FULLTEXT INDEX ft_books_text ON books (title, author, genre)"),
+    ]),
+    (3, "Borrowings status/due date and borrow date indexes", [
+        ensure_index("borrowings", "idx_borrowings_status_due",
+                     "CREATE INDEX idx_borrowings_status_due ON borrowings (status, due_date)"),
+        ensure_index("borrowings", "idx_borrowings_borrow_date",
+                     "CREATE INDEX idx_borrowings_borrow_date ON borrowings (borrow_date)"),
+    ]),
+    (4, "Background job state", [
+        """
+        CREATE TABLE IF NOT EXISTS job_state (
+            job           VARCHAR(50) PRIMARY KEY,
+            watermark     DATE,
+            last_run      DATETIME,
+            rows_changed  INT DEFAULT 0
+        )
+        """,
+    ]),
+    (5, "Member name index", [
+        ensure_index("members", "idx_members_name",
+                     "CREATE INDEX idx_members_name ON members (name)"),
+    ]),
+    (6, "ISBN index for barcode lookup", [
+        ensure_index("books", "idx_books_isbn_digits",
+                     "CREATE INDEX idx_books_isbn_digits ON books ((REPLACE(isbn, '-', '')))"),
+    ]),
+    (7, "Loan ledger index by status and borrow date", [
+        ensure_index("borrowings", "idx_borrowings_status_borrow",
+                     "CREATE INDEX idx_borrowings_status_borrow "
+                     "ON borrowings (status, borrow_date)"),
+    ]),
+    (8, "Change log for live refresh across desks", [
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq         BIGINT AUTO_INCREMENT PRIMARY KEY,
+            entity      VARCHAR(10) NOT NULL,
+            entity_id   INT,
+            action      VARCHAR(10) NOT NULL,
+            detail      VARCHAR(20),
+            origin      CHAR(12),
+            changed_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        ensure_index("change_log", "idx_change_log_changed_at",
+                     "CREATE INDEX idx_change_log_changed_at ON change_log (changed_at)"),
+    ]),
+    (9, "Archive table for old returned loans", [
+        """
+        CREATE TABLE IF NOT EXISTS borrowings_archive (
+            id            INT PRIMARY KEY,
+            book_id       INT NOT NULL,
+            member_id     INT NOT NULL,
+            borrow_date   DATE,
+            due_date      DATE,
+            return_date   DATE,
+            status        ENUM('Borrowed','Returned','Overdue') DEFAULT 'Returned',
+            FOREIGN KEY (book_id)   REFERENCES books(id),
+            FOREIGN KEY (member_id) REFERENCES members(id),
+            INDEX idx_archive_status_borrow (status, borrow_date),
+            INDEX idx_archive_borrow_date (borrow_date)
+        )
+        """,
+        """
+        CREATE OR REPLACE VIEW loan_history AS
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date, status
+            FROM borrowings
+            UNION ALL
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date, status
+            FROM borrowings_archive
+        """,
+    ]),
+    (10, "Open loans by book for book-drop returns", [
+        ensure_index("borrowings", "idx_borrowings_book_status",
+                     "CREATE INDEX idx_borrowings_book_status ON borrowings (book_id, status)"),
+    ]),
+]
+
+# The same versions for the embedded SQLite backend: version -> steps.
+# Every MySQL migration needs its SQLite counterpart here.
+SQLITE_MIGRATIONS = {
+    1: [
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            isbn        VARCHAR(20)  UNIQUE NOT NULL,
+            title       VARCHAR(200) NOT NULL COLLATE NOCASE,
+            author      VARCHAR(100) NOT NULL COLLATE NOCASE,
+            genre       VARCHAR(50) COLLATE NOCASE,
+            year        INT,
+            copies      INT DEFAULT 1,
+            available   INT DEFAULT 1,
+            added_date  DATE DEFAULT (date('now', 'localtime'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS members (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id    VARCHAR(20) UNIQUE NOT NULL,
+            name         VARCHAR(100) NOT NULL COLLATE NOCASE,
+            email        VARCHAR(100) UNIQUE NOT NULL COLLATE NOCASE,
+            phone        VARCHAR(20),
+            joined_date  DATE DEFAULT (date('now', 'localtime')),
+            status       TEXT DEFAULT 'Active' CHECK (status IN ('Active','Suspended'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS borrowings (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id       INT NOT NULL REFERENCES books(id),
+            member_id     INT NOT NULL REFERENCES members(id),
+            borrow_date   DATE DEFAULT (date('now', 'localtime')),
+            due_date      DATE,
+            return_date   DATE,
+            status        TEXT DEFAULT 'Borrowed'
+                          CHECK (status IN ('Borrowed','Returned','Overdue'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS admins (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(64) NOT NULL
+        )
+        """,
+        seed_admin,
+    ],
+    2: ["CREATE INDEX IF NOT EXISTS idx_books_title ON books (title)"],   # no FULLTEXT
+    3: ["CREATE INDEX IF NOT EXISTS idx_borrowings_status_due ON borrowings (status, due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_borrowings_borrow_date ON borrowings (borrow_date)"],
+    4: [
+        """
+        CREATE TABLE IF NOT EXISTS job_state (
+            job           VARCHAR(50) PRIMARY KEY,
+            watermark     DATE,
+            last_run      DATETIME,
+            rows_changed  INT DEFAULT 0
+        )
+        """,
+    ],
+    5: ["CREATE INDEX IF NOT EXISTS idx_members_name ON members (name)"],
+    6: ["CREATE INDEX IF NOT EXISTS idx_books_isbn_digits ON books (REPLACE(isbn, '-', ''))"],
+    7: ["CREATE INDEX IF NOT EXISTS idx_borrowings_status_borrow "
+        "ON borrowings (status, borrow_date)"],
+    8: [
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity      VARCHAR(10) NOT NULL,
+            entity_id   INT,
+            action      VARCHAR(10) NOT NULL,
+            detail      VARCHAR(20),
+            origin      CHAR(12),
+            changed_at  DATETIME DEFAULT (datetime('now', 'localtime'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_change_log_changed_at ON change_log (changed_at)",
+    ],
+    9: [
+        """
+        CREATE TABLE IF NOT EXISTS borrowings_archive (
+            id            INTEGER PRIMARY KEY,
+            book_id       INT NOT NULL REFERENCES books(id),
+            member_id     INT NOT NULL REFERENCES members(id),
+            borrow_date   DATE,
+            due_date      DATE,
+            return_date   DATE,
+            status        TEXT DEFAULT 'Returned'
+                          CHECK (status IN ('Borrowed','Returned','Overdue'))
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_archive_status_borrow "
+        "ON borrowings_archive (status, borrow_date)",
+        "CREATE INDEX IF NOT EXISTS idx_archive_borrow_date ON borrowings_archive (borrow_date)",
+        """
+        CREATE VIEW IF NOT EXISTS loan_history AS
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date, status
+            FROM borrowings
+            UNION ALL
+            SELECT id, book_id, member_id, borrow_date, due_date, return_date, status
+            FROM borrowings_archive
+        """,
+    ],
+    10: ["CREATE INDEX IF NOT EXISTS idx_borrowings_book_status "
+         "ON borrowings (book_id, status)"],
+}
+
+
+@contextmanager
+def migration_lock(cursor, backend):
+    """Serialise desks that start at the same time.
+
+    MySQL takes a named lock and each version is recorded as soon as its
+    steps succeed. SQLite DDL is transactional, so there the whole upgrade
+    is one write transaction.
+    """
+    if backend == "sqlite":
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+        return
+    cursor.execute("SELECT GET_LOCK('library_schema_migration', 60)")
+    if cursor.fetchone()[0] != 1:
+        raise OperationalError("Timed out waiting for another desk to migrate the schema")
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('library_schema_migration')")
+        cursor.fetchall()
+
+
+def migrate(cursor, backend="mysql"):
+    """Apply every migration newer than the recorded schema version."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version     INT PRIMARY KEY,
+            description VARCHAR(200) NOT NULL,
+            applied_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    with migration_lock(cursor, backend):
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        current = cursor.fetchone()[0]
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            if backend == "sqlite":
+                steps = SQLITE_MIGRATIONS[version]
+            for step in steps:
+                if callable(step):
+                    step(cursor)
+                else:
+                    cursor.execute(step)
+            cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                           (version, description))
+
+
+# Hot queries and the index each one must use; check_query_plans() runs
+# EXPLAIN on them so a missing or ignored index shows up before users do.
+HOT_QUERIES = [
+    ("Overdue sweep",
+     "SELECT id FROM borrowings WHERE status='Borrowed' AND due_date < CURDATE()",
+     "idx_borrowings_status_due"),
+    ("Dashboard: borrowed count",
+     "SELECT COUNT(*) FROM borrowings WHERE status='Borrowed'",
+     "idx_borrowings_status_due"),
+    ("Dashboard: overdue count",
+     "SELECT COUNT(*) FROM borrowings WHERE status='Overdue'",
+     "idx_borrowings_status_due"),
+    ("Dashboard: recent borrowings", """
+        SELECT b.title, m.name, br.borrow_date, br.due_date, br.status
+        FROM borrowings br
+        JOIN books b   ON br.book_id   = b.id
+        JOIN members m ON br.member_id = m.id
+        ORDER BY br.borrow_date DESC LIMIT 10
+     """, "idx_borrowings_borrow_date"),
+    ("Catalogue page",
+     "SELECT id,isbn,title,author,genre,year,copies,available FROM books "
+     "ORDER BY title, id LIMIT 200",
+     "idx_books_title"),
+    ("Search",
+     "SELECT id,isbn,title,author,genre,year,available FROM books "
+     "WHERE MATCH(title, author, genre) AGAINST ('+river*' IN BOOLEAN MODE)",
+     "ft_books_text"),
+    ("Member lookup",
+     "SELECT id,member_id,name FROM members WHERE name LIKE 'Sm%' ORDER BY name, id LIMIT 50",
+     "idx_members_name"),
+    ("Book barcode lookup",
+     "SELECT id,isbn,title FROM books WHERE REPLACE(isbn, '-', '') = '9780061120084'",
+     "idx_books_isbn_digits"),
+    ("Borrow/Return ledger page",
+     "SELECT id FROM borrowings WHERE status='Returned' "
+     "ORDER BY borrow_date DESC, id DESC LIMIT 200",
+     "idx_borrowings_status_borrow"),
+    ("Borrow/Return ledger page (archive)",
+     "SELECT id FROM borrowings_archive WHERE status='Returned' "
+     "ORDER BY borrow_date DESC, id DESC LIMIT 200",
+     "idx_archive_status_borrow"),
+    ("Book-drop return lookup",
+     "SELECT id, book_id, status FROM borrowings "
+     "WHERE book_id IN (1, 2, 3) AND status IN ('Borrowed', 'Overdue')",
+     "idx_borrowings_book_status"),
+]
+
+
+def check_query_plans(db):
+    """EXPLAIN each HOT_QUERIES entry; returns ``[(name, index, keys, ok)]``."""
+    if db.backend.name != "mysql":
+        raise ValueError("Query plan checks need the MySQL backend.")
+    results = []
+    for name, query, index in HOT_QUERIES:
+        with db.cursor() as cursor:
+            cursor.execute("EXPLAIN " + query)
+            key = cursor.column_names.index("key")
+            keys = [row[key] for row in cursor.fetchall() if row[key]]
+        results.append((name, index, keys, index in keys))
+    return results
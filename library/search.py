@@ -0,0 +1,262 @@
+"""Book search: indexed SQL search and the in-memory SearchIndex."""
+from array import array
+from bisect import bisect_left
+import heapq
+import re
+
+from .settings import FT_MIN_TOKEN, SEARCH_INDEX_MAX_BOOKS, SEARCH_PAGE_SIZE
+
+
+BOOK_TEXT   = "MATCH(title, author, genre) AGAINST (%s IN BOOLEAN MODE)"
+ISBN_QUERY  = re.compile(r"[0-9][0-9Xx-]*")
+SEARCH_COLS = "id,isbn,title,author,genre,year,available"
+# InnoDB's default FULLTEXT stopwords; requiring one (+the*) matches nothing
+FT_STOPWORDS = {"a", "about", "an", "are", "as", "at", "be", "by", "com", "de",
+                "en", "for", "from", "how", "i", "in", "is", "it", "la", "of",
+                "on", "or", "that", "the", "this", "to", "was", "what", "when",
+                "where", "who", "will", "with", "und", "www"}
+
+
+def like_escape(text):
+    """``text`` with LIKE's wildcards and escape character made literal."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def like_prefix(text):
+    """A LIKE pattern matching values that start with ``text`` literally."""
+    return like_escape(text) + "%"
+
+
+def like_contains(text):
+    """A LIKE pattern matching values that contain ``text`` literally."""
+    return f"%{like_escape(text)}%"
+
+
+def is_isbn_query(q):
+    digits = sum(c.isdigit() for c in q)
+    return bool(ISBN_QUERY.fullmatch(q)) and (digits >= 10 or "-" in q)
+
+
+def book_search_clause(q, fulltext=True):
+    """Indexed WHERE condition for books matching the search string ``q``.
+
+    ISBN-looking input is a prefix range on the unique isbn index. Other
+    input goes through the FULLTEXT index on (title, author, genre): every
+    word must match, as a prefix, and rows rank by relevance. Stopwords and
+    words shorter than the server's FULLTEXT minimum only filter the
+    FULLTEXT hits, and a query made only of such words becomes a
+    title-prefix range scan. Without ``fulltext`` (the SQLite backend)
+    every word must appear somewhere in the title, author or genre.
+    Returns ``(where, params, order_by, order_params)``.
+    """
+    q = q.strip()
+    if is_isbn_query(q):
+        return "isbn LIKE %s", [like_prefix(q)], "isbn", []
+    words = re.findall(r"\w+", q)
+    if not fulltext and words:
+        where = " AND ".join(["(title LIKE %s OR author LIKE %s OR genre LIKE %s)"] * len(words))
+        return where, [like_contains(w) for w in words for _ in range(3)], "title, id", []
+    indexed     = lambda w: len(w) >= FT_MIN_TOKEN and w.lower() not in FT_STOPWORDS
+    long_words  = [w for w in words if indexed(w)]
+    short_words = [w for w in words if not indexed(w)]
+    if not long_words:
+        return "title LIKE %s", [like_prefix(q)], "title, id", []
+    against = " ".join(f"+{w}*" for w in long_words)
+    where, params = BOOK_TEXT, [against]
+    for w in short_words:
+        where += " AND (title LIKE %s OR author LIKE %s)"
+        params += [like_contains(w)] * 2
+    return where, params, BOOK_TEXT + " DESC, id", [against]
+
+
+def search_books(db, q, limit=SEARCH_PAGE_SIZE, offset=0):
+    """One page of books matching ``q``, best matches first.
+
+    A complete ISBN is looked up exactly before falling back to a prefix
+    search; everything else uses ``book_search_clause``.
+    """
+    q = q.strip()
+    if not q:
+        return []
+    if is_isbn_query(q) and offset == 0:
+        exact = db.fetchall(f"SELECT {SEARCH_COLS} FROM books WHERE isbn = %s", (q,))
+        if exact:
+            return exact
+    where, params, order, order_params = book_search_clause(q, db.backend.fulltext)
+    return db.fetchall(
+        f"SELECT {SEARCH_COLS} FROM books WHERE {where} ORDER BY {order} LIMIT %s OFFSET %s",
+        tuple(params + order_params) + (limit, offset))
+
+
+class SearchIndex:
+    """Trigram + sorted prefix index over the catalogue, held in memory.
+
+    Every book occupies a slot. Posting lists are ``array('I')`` of slot
+    numbers keyed by trigram; each distinct word, and separately every ISBN
+    without hyphens, sits in a sorted list searched with ``bisect`` for
+    prefixes.
+    Words of three or more letters are found anywhere inside a word through
+    the trigrams; shorter ones must start a word. Editing or removing a book
+    tombstones its old slot, and everything is compacted once a quarter of
+    the slots are dead. Not thread-safe: build it on one thread, then hand
+    it over.
+    """
+    NULL    = "\x00"          # a None text field in ``_rows``
+    NO_YEAR = -2 ** 31        # a None year in ``_years``
+
+    def __init__(self):
+        self._ids     = array("l")
+        self._rows    = []    # isbn, title, author, genre joined with \x1f; None once dead
+        self._years   = array("l")
+        self._available = array("l")
+        self._hays    = []    # normalised text matched against; None once dead
+        self._titles  = []    # lower-case title, the ranking key; None once dead
+        self._slot_of = {}    # book id -> live slot
+        self._grams   = {}    # trigram -> array("I") of slots
+        self._words   = []    # sorted distinct words
+        self._word_slots = {} # word -> array("I") of slots
+        self._isbns   = []    # sorted ISBNs without hyphens ...
+        self._isbn_slots = array("I")   # ... and the slot of each
+        self._dead    = 0
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def load(self, rows):
+        """Bulk-add ``(id, isbn, title, author, genre, year, available)`` rows."""
+        for row in rows:
+            self._add(row, bulk=True)
+        self._words = sorted(self._word_slots)
+        order = sorted(range(len(self._isbns)), key=self._isbns.__getitem__)
+        self._isbns = [self._isbns[i] for i in order]
+        self._isbn_slots = array("I", (self._isbn_slots[i] for i in order))
+
+    def update(self, row):
+        self.remove(row[0])
+        self._add(row)
+
+    def remove(self, book_id):
+        slot = self._slot_of.pop(book_id, None)
+        if slot is None:
+            return
+        self._rows[slot] = self._hays[slot] = self._titles[slot] = None
+        self._dead += 1
+        if self._dead > len(self._rows) // 4:
+            self._compact()
+
+    def stats(self):
+        return {"books": len(self), "slots": len(self._rows), "isbns": len(self._isbns),
+                "trigrams": len(self._grams), "words": len(self._words),
+                "postings": sum(len(a) for a in self._grams.values())}
+
+    def search(self, q, limit=SEARCH_PAGE_SIZE, offset=0):
+        """Rows matching ``q`` in SEARCH_COLS order, title-prefix hits first.
+
+        Every match is ranked, by (title-prefix hit, title, id), so pages
+        never overlap or skip rows; only the first ``offset + limit`` are
+        kept while ranking.
+        """
+        q = q.strip().lower()
+        if not q:
+            return []
+        isbn = is_isbn_query(q)
+        if isbn:
+            long_words, short_words = [], [q.replace("-", "")]
+        else:
+            words = re.findall(r"\w+", q)
+            long_words  = [w for w in words if len(w) >= 3]
+            short_words = [w for w in words if len(w) < 3]
+        needles = long_words + [" " + w for w in short_words]
+        hays, hits = self._hays, {}
+        if isbn:
+            candidates = self._isbn_prefix_slots(short_words[0])
+        else:
+            candidates = self._candidates(long_words, short_words)
+        for slot in candidates:
+            hay = hays[slot]
+            if hay is None:
+                continue
+            for needle in needles:
+                if needle not in hay:
+                    break
+            else:
+                hits[slot] = None         # a set: prefix lists repeat slots
+        titles, ids = self._titles, self._ids
+        page = heapq.nsmallest(offset + limit, ((not titles[slot].startswith(q), titles[slot],
+                                                 ids[slot], slot) for slot in hits))
+        return [self._row(ranked[3]) for ranked in page[offset:]]
+
+    def _candidates(self, long_words, short_words):
+        if long_words:
+            postings = [self._grams.get(g) for w in long_words for g in self._trigrams(w)]
+            if not all(postings):
+                return ()
+            return min(postings, key=len)
+        return self._prefix_slots(short_words[0])
+
+    def _prefix_slots(self, prefix):
+        i = bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            yield from self._word_slots[self._words[i]]
+            i += 1
+
+    def _isbn_prefix_slots(self, prefix):
+        i = bisect_left(self._isbns, prefix)
+        while i < len(self._isbns) and self._isbns[i].startswith(prefix):
+            yield self._isbn_slots[i]
+            i += 1
+
+    def _add(self, row, bulk=False):
+        book_id, isbn, title, author, genre, year, available = row
+        words = re.findall(r"\w+", f"{title} {author} {genre or ''}".lower())
+        isbn_key = str(isbn).replace("-", "").lower()
+        slot = len(self._rows)
+        self._ids.append(book_id)
+        self._slot_of[book_id] = slot
+        self._rows.append("\x1f".join(self.NULL if v is None else v
+                                      for v in (isbn, title, author, genre)))
+        self._years.append(self.NO_YEAR if year is None else year)
+        self._available.append(available)
+        self._hays.append(" " + " ".join(words) + " " + isbn_key)
+        self._titles.append(title.lower())
+        for gram in {g for w in words for g in self._trigrams(w)}:
+            self._grams.setdefault(gram, array("I")).append(slot)
+        if bulk:
+            self._isbns.append(isbn_key)
+            self._isbn_slots.append(slot)
+        else:
+            i = bisect_left(self._isbns, isbn_key)
+            self._isbns.insert(i, isbn_key)
+            self._isbn_slots.insert(i, slot)
+        for word in set(words):
+            slots = self._word_slots.get(word)
+            if slots is None:
+                slots = self._word_slots[word] = array("I")
+                if not bulk:
+                    self._words.insert(bisect_left(self._words, word), word)
+            slots.append(slot)
+
+    def _row(self, slot):
+        text = [None if v == self.NULL else v for v in self._rows[slot].split("\x1f")]
+        year = self._years[slot]
+        return (self._ids[slot], *text, None if year == self.NO_YEAR else year,
+                self._available[slot])
+
+    def _compact(self):
+        live = [self._row(slot) for slot in sorted(self._slot_of.values())]
+        self.__init__()
+        self.load(live)
+
+    @staticmethod
+    def _trigrams(word):
+        return [word[i:i + 3] for i in range(len(word) - 2)]
+
+
+def load_search_index(db, max_books=SEARCH_INDEX_MAX_BOOKS):
+    """Build a SearchIndex of the whole catalogue, or None if it is too big."""
+    total = db.fetchone("SELECT COUNT(*) FROM books")[0]
+    if total > max_books:
+        return None
+    index = SearchIndex()
+    index.load(db.iter_rows(f"SELECT {SEARCH_COLS} FROM books ORDER BY id"))
+    return index
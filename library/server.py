@@ -0,0 +1,396 @@
+"""HTTP/JSON API so many front desks can share one backend.
+
+    python -m library serve [--host 0.0.0.0] [--port 8080]
+
+    GET  /health                                   pool and cache statistics
+    GET  /books/search?q=orwell&limit=50&offset=0  best matches first
+    GET  /books?search=&after=<title>&after_id=<id>&limit=200
+                                                   catalogue page in title order
+    GET  /books/<id>
+    GET  /members?q=<member code, email or start of name>
+    GET  /members/<id>
+    POST /loans              {"book_id": 12, "member_id": 3, "due_date": "2025-07-01"}
+    POST /loans/<id>/return
+    POST /loans/batch        {"member_id": 3, "books": ["978-0-452-28423-4", 12, ...]}
+    POST /returns            {"books": [...]} from the book-drop, or {"loans": [loan ids]}
+
+Connections are HTTP/1.1 keep-alive and may be pipelined: reads on one
+connection run concurrently and their responses are written back in
+order, while a write waits until everything sent before it has been
+answered and nothing sent after it starts until it has finished, so a
+connection always reads its own writes. Database work runs on a thread pool the size of the connection
+pool, so the event loop never blocks on MySQL and the server holds at most
+DB_POOL_SIZE connections however many desks are attached.
+
+Errors come back as ``{"error": message}``: 400 for invalid input, 401
+without the API_TOKEN, 404, 409 when a loan cannot be issued or returned,
+503 when every database connection is busy and 500 for anything else
+(logged to stderr).
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import hmac
+from http import HTTPStatus
+import json
+import re
+import sys
+from urllib.parse import parse_qsl, urlsplit
+
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+from .circulation import CirculationError, CirculationService
+from .search import SEARCH_COLS
+from .services import BOOK_COLS, MEMBER_COLS, BookService, MemberService
+from .settings import (API_HOST, API_KEEPALIVE, API_MAX_BODY, API_MAX_PAGE,
+                       API_PIPELINE_DEPTH, API_PORT, API_TOKEN, SEARCH_PAGE_SIZE)
+
+MAX_HEADERS = 100
+BATCH_COLS  = "item,loan_id,book_id,status,error"
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, target, version, headers, body):
+        url = urlsplit(target)
+        self.method  = method
+        self.path    = url.path.rstrip("/") or "/"
+        self.query   = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body    = body
+        connection   = headers.get("connection", "").lower()
+        self.keep_alive = (connection != "close" if version == "HTTP/1.1"
+                           else connection == "keep-alive")
+
+    def json(self):
+        if not self.body:
+            return {}
+        data = json.loads(self.body)
+        if not isinstance(data, dict):
+            raise ValueError("The request body must be a JSON object.")
+        return data
+
+
+async def read_request(reader):
+    """Parse one request from ``reader``; None when the client hung up."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError(400, "Malformed request line.")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise ApiError(431, "Too many headers.")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        raise ApiError(501, "Chunked request bodies are not supported.")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise ApiError(400, "Invalid Content-Length.")
+    if not 0 <= length <= API_MAX_BODY:
+        raise ApiError(413, f"Request bodies are limited to {API_MAX_BODY} bytes.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, version, headers, body)
+
+
+def encode_response(status, payload, keep_alive):
+    body = json.dumps(payload, default=str).encode()
+    head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+# ─────────────────────────────────────────────
+#  HANDLERS
+# ─────────────────────────────────────────────
+# Each runs on a worker thread as handler(db, query, body, *path_args) and
+# returns (status, payload).
+
+def records(cols, rows):
+    names = cols.split(",")
+    return [dict(zip(names, row)) for row in rows]
+
+
+def whole_number(query, name, default, ceiling=None):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number.")
+    if value < 0:
+        raise ValueError(f"{name} must not be negative.")
+    return min(value, ceiling) if ceiling else value
+
+
+def due_date(body):
+    """The body's ``due_date``, or None for the default loan period."""
+    value = body.get("due_date")
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError("due_date must be a date (YYYY-MM-DD).")
+
+
+def api_health(db, query, body):
+    return 200, {"status": "ok", "pool": db.pool.stats(), "cache": db.cache.stats()}
+
+
+def api_search(db, query, body):
+    limit  = whole_number(query, "limit", SEARCH_PAGE_SIZE, API_MAX_PAGE)
+    offset = whole_number(query, "offset", 0)
+    rows = BookService(db).search(query.get("q", ""), limit, offset)
+    return 200, {"books": records(SEARCH_COLS, rows)}
+
+
+def api_books(db, query, body):
+    limit = whole_number(query, "limit", SEARCH_PAGE_SIZE, API_MAX_PAGE)
+    after = before = None
+    if "after" in query:
+        after = (query["after"], whole_number(query, "after_id", 0))
+    elif "before" in query:
+        before = (query["before"], whole_number(query, "before_id", 0))
+    rows = BookService(db).page(query.get("search", ""), after, before, limit)
+    books = records(BOOK_COLS, rows)
+    last = books[-1] if len(books) == limit else None
+    return 200, {"books": books,
+                 "next": last and {"after": last["title"], "after_id": last["id"]}}
+
+
+def api_book(db, query, body, book_id):
+    row = BookService(db).get(int(book_id))
+    if row is None:
+        raise ApiError(404, "No such book.")
+    return 200, records(BOOK_COLS, [row])[0]
+
+
+def api_members(db, query, body):
+    limit = whole_number(query, "limit", SEARCH_PAGE_SIZE, API_MAX_PAGE)
+    rows = MemberService(db).lookup(query.get("q", ""), limit)
+    return 200, {"members": records(MEMBER_COLS, rows)}
+
+
+def api_member(db, query, body, id_):
+    row = MemberService(db).get(int(id_))
+    if row is None:
+        raise ApiError(404, "No such member.")
+    return 200, records(MEMBER_COLS, [row])[0]
+
+
+def api_issue(db, query, body):
+    try:
+        book_id, member_id = int(body["book_id"]), int(body["member_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("book_id and member_id are required whole numbers.")
+    loan_id, status = CirculationService(db).issue(book_id, member_id, due_date(body))
+    return 201, {"loan_id": loan_id, "status": status}
+
+
+def api_return(db, query, body, loan_id):
+    book_id, was = CirculationService(db).return_loan(int(loan_id))
+    return 200, {"loan_id": int(loan_id), "book_id": book_id, "previous_status": was}
+
+
+def batch_items(body, name):
+    items = body.get(name)
+    if not isinstance(items, list) or not all(
+            isinstance(i, (str, int)) and not isinstance(i, bool) for i in items):
+        raise ValueError(f"{name} must be a list of ids or ISBNs.")
+    return items
+
+
+def batch_result(report):
+    return 200, {report.action: report.succeeded, "failed": report.failed,
+                 "results": records(BATCH_COLS, report.results)}
+
+
+def api_issue_many(db, query, body):
+    try:
+        member_id = int(body["member_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("member_id is a required whole number.")
+    return batch_result(CirculationService(db).issue_many(
+        member_id, batch_items(body, "books"), due_date(body)))
+
+
+def api_return_many(db, query, body):
+    by = "loan" if "loans" in body else "book"
+    return batch_result(CirculationService(db).return_many(batch_items(body, by + "s"), by))
+
+
+ROUTES = [
+    (re.compile(path), method, handler) for path, method, handler in [
+        (r"/health",              "GET",  api_health),
+        (r"/books/search",        "GET",  api_search),
+        (r"/books",               "GET",  api_books),
+        (r"/books/(\d+)",         "GET",  api_book),
+        (r"/members",             "GET",  api_members),
+        (r"/members/(\d+)",       "GET",  api_member),
+        (r"/loans",               "POST", api_issue),
+        (r"/loans/(\d+)/return",  "POST", api_return),
+        (r"/loans/batch",         "POST", api_issue_many),
+        (r"/returns",             "POST", api_return_many),
+    ]
+]
+
+
+def route(method, path):
+    """Return ``(handler, path_args)``; raises ApiError 404/405."""
+    allowed = False
+    for pattern, route_method, handler in ROUTES:
+        match = pattern.fullmatch(path)
+        if match:
+            if route_method == method:
+                return handler, match.groups()
+            allowed = True
+    if allowed:
+        raise ApiError(405, f"{method} is not allowed here.")
+    raise ApiError(404, "Not found.")
+
+
+# ─────────────────────────────────────────────
+#  SERVER
+# ─────────────────────────────────────────────
+class ApiServer:
+    """Serves ROUTES over asyncio streams, running handlers on threads."""
+    def __init__(self, db, host=API_HOST, port=API_PORT, token=API_TOKEN):
+        self.db       = db
+        self.host     = host
+        self.port     = port
+        self.token    = token
+        self.executor = ThreadPoolExecutor(max_workers=db.pool.size,
+                                           thread_name_prefix="api-db")
+        self.server   = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    async def handle(self, reader, writer):
+        # Requests are read ahead into ``pending`` (up to API_PIPELINE_DEPTH)
+        # and started at once; ``_respond`` writes their results in order.
+        pending = asyncio.Queue(API_PIPELINE_DEPTH)
+        respond = asyncio.ensure_future(self._respond(writer, pending))
+        write   = None        # the latest write, which later requests wait for
+        try:
+            while not respond.done():
+                try:
+                    request = await asyncio.wait_for(read_request(reader), API_KEEPALIVE)
+                except ApiError as e:
+                    await pending.put((self._finished(e.status, str(e)), False))
+                    break
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        asyncio.LimitOverrunError, ConnectionError, ValueError):
+                    break
+                if request is None:
+                    break
+                if request.method != "GET":
+                    await pending.join()
+                elif write is not None and not write.done():
+                    await asyncio.wait({write})
+                task = asyncio.ensure_future(self.dispatch(request))
+                if request.method != "GET":
+                    write = task
+                await pending.put((task, request.keep_alive))
+                if not request.keep_alive:
+                    break
+        finally:
+            try:
+                # The writer may have died with the queue full, so never wait
+                # on the put alone
+                closing = asyncio.ensure_future(pending.put(None))
+                await asyncio.wait({closing, respond}, return_when=asyncio.FIRST_COMPLETED)
+                closing.cancel()
+                await respond
+            finally:
+                writer.close()
+
+    async def _respond(self, writer, pending):
+        broken = False
+        while True:
+            item = await pending.get()
+            try:
+                if item is None:
+                    return
+                task, keep_alive = item
+                status, payload = await task
+                if not broken:
+                    writer.write(encode_response(status, payload, keep_alive))
+                    await writer.drain()
+            except (ConnectionError, OSError):
+                broken = True         # keep draining so the reader never blocks
+            finally:
+                pending.task_done()
+
+    async def dispatch(self, request):
+        """Run one request to ``(status, payload)``; never raises."""
+        try:
+            # Headers were decoded as latin-1, which gives back the bytes sent
+            if self.token and not hmac.compare_digest(
+                    request.headers.get("authorization", "").encode("latin-1"),
+                    f"Bearer {self.token}".encode()):
+                raise ApiError(401, "A valid API token is required.")
+            handler, args = route(request.method, request.path)
+            body = request.json()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, handler, self.db, request.query, body, *args)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except CirculationError as e:
+            return 409, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except PoolError:
+            return 503, {"error": "The server is busy; try again."}
+        except Error as e:
+            print(f"{request.method} {request.path} failed: {e}", file=sys.stderr)
+            return 500, {"error": "Database error."}
+        except Exception as e:
+            print(f"{request.method} {request.path} failed: {e!r}", file=sys.stderr)
+            return 500, {"error": "Internal server error."}
+
+    @staticmethod
+    def _finished(status, message):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result((status, {"error": message}))
+        return future
+
+
+def serve(db, host=API_HOST, port=API_PORT, token=API_TOKEN):
+    """Run the API until interrupted."""
+    async def main():
+        server = ApiServer(db, host, port, token)
+        await server.start()
+        print(f"Serving on http://{host}:{port}", file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,218 @@
+"""Catalogue, membership and login operations.
+
+Each service wraps a DatabaseManager and knows nothing about the window:
+database errors are raised (or go to the manager's ``on_error``) and
+invalid input raises ValueError with a message fit for the user. Single
+records are read through the manager's EntityCache, which every write here
+invalidates; writes are also logged to the change feed in their own
+transaction.
+"""
+import hashlib
+
+from .changes import record
+from .db import keyset_where
+from .importer import isbn_key
+from .search import book_search_clause, like_prefix, search_books
+from .settings import SEARCH_PAGE_SIZE
+
+BOOK_COLS       = "id,isbn,title,author,genre,year,copies,available"
+MEMBER_COLS     = "id,member_id,name,email,phone,joined_date,status"
+MEMBER_STATUSES = ("Active", "Suspended")
+
+
+def password_hash(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def authenticate(db, username, password):
+    """True if ``username``/``password`` belong to an admin account."""
+    row = db.fetchone("SELECT id FROM admins WHERE username=%s AND password=%s",
+                      (username, password_hash(password)))
+    return row is not None
+
+
+def _exact_first(exact, rows, limit):
+    """``exact`` rows, then ``rows`` not among them, up to ``limit``."""
+    seen = {row[0] for row in exact}
+    return (list(exact) + [row for row in rows if row[0] not in seen])[:limit]
+
+
+def _logged(db, entity, action, query, params, id_=None):
+    """Run one write and its change_log entry in a single transaction.
+
+    Returns the new id for an insert, otherwise the rows affected; nothing
+    is logged when no row changed.
+    """
+    def work(cursor):
+        cursor.execute(query, params)
+        if action == "insert":
+            result = target = cursor.lastrowid
+        else:
+            result, target = cursor.rowcount, id_
+        if result:
+            record(cursor, entity, target, action)
+        return result
+    return db.write(work)
+
+
+def _whole_number(name, value, default):
+    if value is None or str(value).strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a whole number.")
+
+
+class BookService:
+    """The catalogue."""
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, book_id):
+        return self.db.cache.get(("books", book_id), lambda: self.db.fetchone(
+            f"SELECT {BOOK_COLS} FROM books WHERE id=%s", (book_id,)))
+
+    def search(self, q, limit=SEARCH_PAGE_SIZE, offset=0):
+        return search_books(self.db, q, limit, offset)
+
+    def lookup(self, text, limit=SEARCH_PAGE_SIZE):
+        """Books whose id or ISBN is ``text``, then titles starting with it.
+
+        ISBNs match with or without hyphens, so a scanned barcode finds the
+        book; every branch is an indexed lookup.
+        """
+        text = text.strip()
+        exact = []
+        digits = isbn_key(text)
+        if len(digits) in (10, 13) and digits[:9].isdigit():
+            exact += self.db.fetchall(
+                f"SELECT {BOOK_COLS} FROM books WHERE REPLACE(isbn, '-', '') = %s", (digits,))
+        if not exact and text.isdigit():       # a book id
+            row = self.get(int(text))
+            exact += [row] if row else []
+        rows = self.db.fetchall(
+            f"SELECT {BOOK_COLS} FROM books WHERE title LIKE %s ORDER BY title, id LIMIT %s",
+            (like_prefix(text), limit))
+        return _exact_first(exact, rows, limit)
+
+    def page(self, search="", after=None, before=None, limit=SEARCH_PAGE_SIZE):
+        """One keyset page of the catalogue in (title, id) order.
+
+        Returns up to ``limit`` rows sorting after the key ``after``, or
+        immediately before ``before``, optionally narrowed by ``search``.
+        """
+        where, params = [], []
+        if search:
+            cond, p, _, _ = book_search_clause(search, self.db.backend.fulltext)
+            where.append(f"({cond})")
+            params += p
+        order = "title, id"
+        if after:
+            cond, p = keyset_where(("title", "id"), after, ">")
+            where.append(cond)
+            params += p
+        elif before:
+            cond, p = keyset_where(("title", "id"), before, "<")
+            where.append(cond)
+            params += p
+            order = "title DESC, id DESC"
+        query = f"SELECT {BOOK_COLS} FROM books"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += f" ORDER BY {order} LIMIT %s"
+        rows = self.db.fetchall(query, tuple(params) + (limit,))
+        return rows[::-1] if before else rows
+
+    def add(self, isbn, title, author, genre=None, year=None, copies=1):
+        """Catalogue a book; returns its id."""
+        row = self._fields(isbn, title, author, genre, year, copies)
+        book_id = _logged(self.db, "book", "insert", """
+            INSERT INTO books (isbn,title,author,genre,year,copies,available)
+            VALUES (%s,%s,%s,%s,%s,%s,%s)
+        """, row + (row[-1],))
+        return book_id
+
+    def update(self, book_id, isbn, title, author, genre=None, year=None, copies=1):
+        """Edit a book; ``available`` moves with ``copies`` so loans stay counted."""
+        row = self._fields(isbn, title, author, genre, year, copies)
+        changed = _logged(self.db, "book", "update", """
+            UPDATE books SET isbn=%s,title=%s,author=%s,genre=%s,year=%s,
+                   available=GREATEST(0, available + %s - copies), copies=%s
+            WHERE id=%s
+        """, row[:5] + (row[5], row[5], book_id), book_id)
+        self.db.cache.invalidate(("books", book_id))
+        return changed
+
+    def remove(self, book_id):
+        removed = _logged(self.db, "book", "delete",
+                          "DELETE FROM books WHERE id=%s", (book_id,), book_id)
+        self.db.cache.invalidate(("books", book_id))
+        return removed
+
+    @staticmethod
+    def _fields(isbn, title, author, genre, year, copies):
+        isbn = isbn_key(isbn or "")
+        title, author = (str(v or "").strip() for v in (title, author))
+        if not all([isbn, title, author]):
+            raise ValueError("ISBN, Title and Author are required.")
+        copies = _whole_number("Total Copies", copies, 1)
+        if copies < 1:
+            raise ValueError("Total Copies must be at least 1.")
+        return (isbn, title, author, (genre or "").strip() or None,
+                _whole_number("Year", year, None), copies)
+
+
+class MemberService:
+    """Library members."""
+    def __init__(self, db):
+        self.db = db
+
+    def all(self):
+        return self.db.fetchall(f"SELECT {MEMBER_COLS} FROM members ORDER BY name, id")
+
+    def get(self, id_):
+        return self.db.cache.get(("members", id_), lambda: self.db.fetchone(
+            f"SELECT {MEMBER_COLS} FROM members WHERE id=%s", (id_,)))
+
+    def lookup(self, text, limit=SEARCH_PAGE_SIZE):
+        """Members whose code or email is ``text``, then names starting with it."""
+        text = text.strip()
+        exact = self.db.fetchall(
+            f"SELECT {MEMBER_COLS} FROM members WHERE member_id=%s OR email=%s",
+            (text, text)) if text else []
+        rows = self.db.fetchall(
+            f"SELECT {MEMBER_COLS} FROM members WHERE name LIKE %s ORDER BY name, id LIMIT %s",
+            (like_prefix(text), limit))
+        return _exact_first(exact, rows, limit)
+
+    def register(self, member_id, name, email, phone=None, status="Active"):
+        """Add a member; returns their id."""
+        id_ = _logged(self.db, "member", "insert", """
+            INSERT INTO members (member_id,name,email,phone,status)
+            VALUES (%s,%s,%s,%s,%s)
+        """, self._fields(member_id, name, email, phone, status))
+        return id_
+
+    def update(self, id_, member_id, name, email, phone=None, status="Active"):
+        changed = _logged(self.db, "member", "update", """
+            UPDATE members SET member_id=%s,name=%s,email=%s,phone=%s,status=%s
+            WHERE id=%s
+        """, self._fields(member_id, name, email, phone, status) + (id_,), id_)
+        self.db.cache.invalidate(("members", id_))
+        return changed
+
+    def remove(self, id_):
+        removed = _logged(self.db, "member", "delete",
+                          "DELETE FROM members WHERE id=%s", (id_,), id_)
+        self.db.cache.invalidate(("members", id_))
+        return removed
+
+    @staticmethod
+    def _fields(member_id, name, email, phone, status):
+        member_id, name, email = (str(v or "").strip() for v in (member_id, name, email))
+        if not all([member_id, name, email]):
+            raise ValueError("Member ID, Name and Email are required.")
+        if status not in MEMBER_STATUSES:
+            raise ValueError(f"Status must be one of {', '.join(MEMBER_STATUSES)}.")
+        return (member_id, name, email, (phone or "").strip() or None, status)
@@ -0,0 +1,49 @@
+"""Settings shared by the window, the command line and scripts.
+
+Window-only settings (paging, polling, debouncing) live in library_app.py.
+"""
+DB_BACKEND = "mysql"      # or "sqlite": an embedded database file, no server needed
+SQLITE_PATH = "library.sqlite3"  # database file for the sqlite backend
+DB_CONFIG = {
+    "host":     "localhost",
+    "user":     "root",
+    "password": "",           # ← change to your MySQL password
+    "database": "library_db",
+}
+DB_POOL_SIZE    = 5       # connections shared by the UI, workers and jobs
+DB_POOL_TIMEOUT = 10      # seconds to wait for a free connection
+DB_VALIDATE_AFTER = 30    # ping connections idle longer than this (seconds)
+DB_READ_RETRIES = 1       # transparent retries of reads after a lost connection
+DB_STREAM_BATCH = 1000    # rows per fetchmany() when streaming large results
+DB_PREPARED_STATEMENTS = 64  # prepared statements cached per connection (0: off)
+PROFILE_QUERIES = False   # time every statement (also toggled on the Diagnostics page)
+PROFILE_SLOW_MS = 200     # statements slower than this are logged with their EXPLAIN plan
+PROFILE_SLOW_LOG = 100    # slow queries kept in memory for the Diagnostics page
+PROFILE_DUMP    = "query-metrics.json"  # where profiler metrics are dumped
+SEARCH_PAGE_SIZE = 50     # search results shown per page
+FT_MIN_TOKEN    = 3       # innodb_ft_min_token_size on the server
+SEARCH_INDEX_MAX_BOOKS = 1_000_000  # ~0.5 GB per million; larger catalogues use SQL
+CIRCULATION_RETRIES = 3    # retries of an issue/return hit by a deadlock
+CIRCULATION_BATCH = 200    # books issued or returned per transaction by batch checkout/return
+LOAN_DAYS        = 14      # default loan period when no due date is given
+LEDGER_COUNT_CAP = 10_000  # loans counted for the Borrow/Return total before "10,000+"
+IMPORT_BATCH     = 2000    # catalogue import rows written per transaction
+IMPORT_MAX_ERRORS = 100    # rejected import rows reported individually
+EXPORT_BATCH     = 10_000  # rows streamed per fetch (and per Parquet row group)
+OVERDUE_BATCH    = 1000    # loans marked overdue per UPDATE (one commit each)
+STATS_MAX_AGE    = 60      # seconds before dashboard counters are re-counted
+ENTITY_CACHE_SIZE = 10_000  # book/member records cached in memory (0: off)
+ENTITY_CACHE_TTL = 300     # seconds a cached record may be served without re-reading
+CHANGE_FEED_BATCH = 500    # change_log rows read per poll
+CHANGE_GAP_WAIT  = 30      # seconds a missing change number is waited for
+CHANGE_LOG_DAYS  = 7       # days of change_log kept
+ARCHIVE_AFTER_DAYS = 365   # returned loans older than this move to borrowings_archive
+ARCHIVE_BATCH    = 1000    # loans moved per archive transaction
+ARCHIVE_PAUSE    = 0.1     # seconds between archive batches, to leave the desks room
+API_HOST         = "127.0.0.1"  # address `python -m library serve` listens on
+API_PORT         = 8080
+API_TOKEN        = None    # when set, requests need "Authorization: Bearer <token>"
+API_KEEPALIVE    = 15      # seconds an idle keep-alive connection stays open
+API_PIPELINE_DEPTH = 16    # requests in flight per connection before reading pauses
+API_MAX_BODY     = 64 * 1024  # largest request body accepted (bytes)
+API_MAX_PAGE     = 500     # largest ``limit`` a client may ask for
@@ -0,0 +1,71 @@
+"""Dashboard totals, kept in memory between re-counts."""
+import time
+
+from .settings import STATS_MAX_AGE
+
+
+class StatsCache:
+    """Dashboard totals and Recent Borrowings, kept in memory.
+
+    Write paths adjust the counters with ``bump()`` as they commit, so the
+    Dashboard renders from memory however large the tables are. Counters
+    are re-counted against the base tables once older than ``max_age``
+    seconds, which also bounds how stale other desks' changes can look, and
+    Recent Borrowings is re-read only after a loan changes. Tk thread only.
+    """
+    KEYS = ("books", "members", "borrowed", "overdue")
+
+    def __init__(self, max_age=STATS_MAX_AGE):
+        self.max_age    = max_age
+        self.counts     = None    # key -> int, None until first counted
+        self.counted_at = 0.0     # time.monotonic() of the last recount
+        self.recent     = None    # Recent Borrowings rows, None when stale
+
+    def is_stale(self):
+        return self.counts is None or time.monotonic() - self.counted_at > self.max_age
+
+    def bump(self, key, delta=1):
+        if self.counts is not None:
+            self.counts[key] += delta
+
+    def loan_changed(self):
+        self.recent = None
+
+    def overdue_marked(self, changed):
+        if changed:
+            self.bump("borrowed", -changed)
+            self.bump("overdue", changed)
+            self.recent = None
+
+    def apply(self, result):
+        counts, recent = result
+        if counts is not None:
+            self.counts = counts
+            self.counted_at = time.monotonic()
+        if recent is not None:
+            self.recent = recent
+
+    @staticmethod
+    def fetch(db, counts=True, recent=True):
+        """Worker side: re-count (and/or re-read recent loans) for ``apply``."""
+        if counts:
+            row = db.fetchone("""
+                SELECT (SELECT COUNT(*) FROM books),
+                       (SELECT COUNT(*) FROM members),
+                       (SELECT COUNT(*) FROM borrowings WHERE status='Borrowed'),
+                       (SELECT COUNT(*) FROM borrowings WHERE status='Overdue')
+            """)
+            counts = dict(zip(StatsCache.KEYS, row))
+        else:
+            counts = None
+        if recent:
+            recent = db.fetchall("""
+                SELECT b.title, m.name, br.borrow_date, br.due_date, br.status
+                FROM borrowings br
+                JOIN books b   ON br.book_id   = b.id
+                JOIN members m ON br.member_id = m.id
+                ORDER BY br.borrow_date DESC LIMIT 10
+            """)
+        else:
+            recent = None
+        return counts, recent
@@ -1,10 +1,21 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, font
-import mysql.connector
+from tkinter import ttk, messagebox, font, filedialog
 from mysql.connector import Error
+from concurrent.futures import ThreadPoolExecutor
 import datetime
-import hashlib
-import re
+import os
+import queue
+import sys
+import threading
+
+from library import (BookService, ChangeFeed, CirculationError, CirculationService,
+                     ConnectionPool, DatabaseManager, LOAN_STATUSES, MemberService,
+                     OPEN_STATUSES, OverdueEngine, SEARCH_COLS, StatsCache, authenticate,
+                     export_loans, import_books, load_search_index, search_books)
+from library.changes import prune_changes
+from library.services import MEMBER_STATUSES
+from library.settings import PROFILE_DUMP, SEARCH_PAGE_SIZE
+
 
 # ─────────────────────────────────────────────
 #  COLOUR PALETTE & THEME
@@ -24,108 +35,658 @@ BORDER       = "#1E3045"
 ROW_ODD      = "#131E2B"
 ROW_EVEN     = "#0F1923"
 
+
 # ─────────────────────────────────────────────
-#  DATABASE MANAGER
+#  SETTINGS
 # ─────────────────────────────────────────────
-class DatabaseManager:
-    def __init__(self):
-        self.connection = None
-        self.connect()
+# Database, import/export and job settings are in library/settings.py
+SEARCH_INDEX_ENABLED = True    # answer searches from memory when possible
+SEARCH_DEBOUNCE_MS   = 300     # typing pause before an SQL search runs
+DB_WORKERS      = 2       # background threads running queries off the Tk loop
+DB_POLL_MS      = 30      # how often finished queries are handed back to Tk
+OVERDUE_CHECK_MS = 60_000  # how often the app checks whether the date rolled over
+CHANGE_POLL_MS  = 2000    # how often other desks' changes are fetched from the change feed
+TREE_PAGE_SIZE  = 200     # rows fetched per page by virtual (paged) trees
+TREE_MAX_PAGES  = 3       # pages kept alive in a virtual tree at once
+TREE_SCROLL_EDGE = 0.1    # fetch the next/previous page this close to an edge
+TREE_SYNC_CHUNK = 500     # rows applied per idle callback when refreshing a list
+LOOKUP_DEBOUNCE_MS = 200  # typing pause before a book/member lookup runs
+LOOKUP_LIMIT    = 20      # matches listed under a lookup field
+DIAGNOSTICS_KEY = "<Control-D>"   # Ctrl+Shift+D opens the hidden Diagnostics page
+DIAGNOSTICS_REFRESH_MS = 2000    # how often the Diagnostics page re-reads the profiler
+
+# Borrow/Return ledger: the SHOW choices, and for each sortable heading
+# its LEDGER_SORTS order and whether the first click sorts descending.
+LEDGER_VIEWS = {"Open loans": OPEN_STATUSES, "Borrowed": ("Borrowed",),
+                "Overdue": ("Overdue",), "Returned": ("Returned",), "All loans": None}
+LEDGER_HEADINGS = {"ID": ("id", True), "Book Title": ("title", False),
+                   "Member": ("member", False), "Borrow Date": ("borrow_date", True),
+                   "Due Date": ("due_date", False), "Status": ("status", False)}
 
-    def connect(self):
-        try:
-            self.connection = mysql.connector.connect(
-                host="localhost",
-                user="root",
-                password="",        # ← change to your MySQL password
-                database="library_db"
-            )
-            self.create_tables()
-        except Error as e:
-            messagebox.showerror("Database Error",
-                f"Could not connect to MySQL.\n\n{e}\n\n"
-                "Please ensure MySQL is running and update credentials in library_app.py")
-
-    def create_tables(self):
-        cursor = self.connection.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS books (
-                id          INT AUTO_INCREMENT PRIMARY KEY,
-                isbn        VARCHAR(20)  UNIQUE NOT NULL,
-                title       VARCHAR(200) NOT NULL,
-                author      VARCHAR(100) NOT NULL,
-                genre       VARCHAR(50),
-                year        INT,
-                copies      INT DEFAULT 1,
-                available   INT DEFAULT 1,
-                added_date  DATE DEFAULT (CURDATE())
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS members (
-                id           INT AUTO_INCREMENT PRIMARY KEY,
-                member_id    VARCHAR(20) UNIQUE NOT NULL,
-                name         VARCHAR(100) NOT NULL,
-                email        VARCHAR(100) UNIQUE NOT NULL,
-                phone        VARCHAR(20),
-                joined_date  DATE DEFAULT (CURDATE()),
-                status       ENUM('Active','Suspended') DEFAULT 'Active'
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS borrowings (
-                id            INT AUTO_INCREMENT PRIMARY KEY,
-                book_id       INT NOT NULL,
-                member_id     INT NOT NULL,
-                borrow_date   DATE DEFAULT (CURDATE()),
-                due_date      DATE,
-                return_date   DATE,
-                status        ENUM('Borrowed','Returned','Overdue') DEFAULT 'Borrowed',
-                FOREIGN KEY (book_id)   REFERENCES books(id),
-                FOREIGN KEY (member_id) REFERENCES members(id)
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admins (
-                id       INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(64) NOT NULL
-            )
-        """)
-        # Default admin: admin / admin123
-        pw = hashlib.sha256("admin123".encode()).hexdigest()
-        cursor.execute("""
-            INSERT IGNORE INTO admins (username, password) VALUES (%s, %s)
-        """, ("admin", pw))
-        self.connection.commit()
-        cursor.close()
-
-    def execute(self, query, params=None):
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params or ())
-            self.connection.commit()
-            return cursor
-        except Error as e:
-            messagebox.showerror("DB Error", str(e))
-            return None
-
-    def fetchall(self, query, params=None):
-        try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchall()
-        except Error as e:
-            messagebox.showerror("DB Error", str(e))
-            return []
-
-    def fetchone(self, query, params=None):
+
+# ─────────────────────────────────────────────
+#  BACKGROUND QUERY EXECUTOR
+# ─────────────────────────────────────────────
+class QueryExecutor:
+    """Runs database work on background threads, off the Tk main loop.
+
+    Workers share the app's connection pool through a DatabaseManager with
+    no error handler, so their errors are raised rather than shown. Results
+    are handed back to the Tk thread through a queue drained with
+    ``root.after``, so callbacks may touch widgets. Work is submitted under a
+    ``tag`` (the app uses one per page visit); ``cancel(tag)`` drops
+    everything still pending for it, and results that arrive later are
+    discarded.
+    """
+    def __init__(self, root, db, workers=DB_WORKERS):
+        self.root     = root
+        self.db       = db.background()
+        self._pool    = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix="db-worker")
+        self._done    = queue.Queue()
+        self._pending = {}        # tag -> set of futures (Tk thread only)
+        self._poll()
+
+    def submit(self, fn, *args, on_done=None, on_error=None, tag=None):
+        """Run ``fn(db, *args)`` on a worker; callbacks run on the Tk thread."""
+        future = self._pool.submit(self._run, fn, args)
+        self._pending.setdefault(tag, set()).add(future)
+        future.add_done_callback(
+            lambda f: self._done.put((f, tag, on_done, on_error)))
+        return future
+
+    def cancel(self, tag):
+        for future in self._pending.pop(tag, ()):
+            future.cancel()       # queued work never runs; running work is ignored
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, args):
+        return fn(self.db, *args)
+
+    def _poll(self):
+        while True:
+            try:
+                future, tag, on_done, on_error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            futures = self._pending.get(tag)
+            if not futures or future not in futures:
+                continue          # cancelled or stale
+            futures.discard(future)
+            if not futures:
+                del self._pending[tag]
+            if future.cancelled():
+                continue
+            try:
+                error = future.exception()
+                if error is not None:
+                    if on_error:
+                        on_error(error)
+                    else:
+                        messagebox.showerror("DB Error", str(error))
+                elif on_done:
+                    on_done(future.result())
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        self.root.after(DB_POLL_MS, self._poll)
+
+
+# ─────────────────────────────────────────────
+#  SEARCH INDEX
+# ─────────────────────────────────────────────
+class LiveSearchIndex:
+    """The app's SearchIndex, loaded in the background and kept current.
+
+    ``ready`` is False while loading, when disabled and when the catalogue
+    exceeds SEARCH_INDEX_MAX_BOOKS; callers then search with SQL. Write paths
+    call ``refresh(book_id)`` after adding, editing, removing, issuing or
+    returning a book, and ``reload()`` after bulk changes; changes made while
+    loading are replayed.
+    """
+    def __init__(self, jobs, enabled=SEARCH_INDEX_ENABLED):
+        self.jobs    = jobs
+        self.enabled = enabled
+        self.index   = None
+        self.backlog = None
+        self._again  = False
+        self.reload()
+
+    def reload(self):
+        """Rebuild from the database; the current index serves until then."""
+        if not self.enabled:
+            return
+        if self.backlog is not None:
+            self._again = True    # a load is running and may have missed rows
+            return
+        self.backlog = set()
+        self.jobs.submit(load_search_index, on_done=self._loaded,
+                         on_error=self._failed, tag=self)
+
+    @property
+    def ready(self):
+        return self.index is not None
+
+    def search(self, q, limit=SEARCH_PAGE_SIZE, offset=0):
+        return self.index.search(q, limit, offset)
+
+    def refresh(self, book_id):
+        if self.backlog is not None:
+            self.backlog.add(book_id)
+        elif self.index is not None:
+            self.jobs.submit(
+                lambda db: db.fetchone(f"SELECT {SEARCH_COLS} FROM books WHERE id=%s",
+                                       (book_id,)),
+                on_done=lambda row: self._apply(book_id, row), tag=self)
+
+    def _loaded(self, index):
+        backlog, self.backlog = self.backlog, None
+        self.index = index
+        for book_id in backlog:
+            self.refresh(book_id)
+        if self._again:
+            self._again = False
+            self.reload()
+
+    def _failed(self, error):
+        self.backlog = None       # stay on SQL search
+        self._again  = False
+
+    def _apply(self, book_id, row):
+        if self.index is None:
+            return
+        if row:
+            self.index.update(row)
+        else:
+            self.index.remove(book_id)
+
+
+# ─────────────────────────────────────────────
+#  OVERDUE SCHEDULER
+# ─────────────────────────────────────────────
+class OverdueScheduler:
+    """Runs the OverdueEngine on a DB worker at startup and again whenever
+    the date rolls over while the app is open. ``listeners`` are called on
+    the Tk thread with the number of loans each run marked overdue."""
+    def __init__(self, root, jobs, check_ms=OVERDUE_CHECK_MS):
+        self.root      = root
+        self.jobs      = jobs
+        self.check_ms  = check_ms
+        self.ran_for   = None
+        self.listeners = []
+        self._tick()
+
+    def _tick(self):
+        today = datetime.date.today()
+        if today != self.ran_for:
+            self.ran_for = today
+            self.jobs.submit(lambda db: OverdueEngine(db).run(today),
+                             on_done=self._done, on_error=self._failed, tag=self)
+        self.root.after(self.check_ms, self._tick)
+
+    def _done(self, changed):
+        for listener in self.listeners:
+            listener(changed)
+
+    def _failed(self, error):
+        self.ran_for = None       # try again on the next tick
+
+
+# ─────────────────────────────────────────────
+#  CHANGE FEED
+# ─────────────────────────────────────────────
+class ChangePoller:
+    """Follows the change feed on a DB worker, so each desk sees the others'
+    writes without reloading. Polls every ``poll_ms`` (straight away again
+    while behind) and calls ``listeners`` on the Tk thread with each batch
+    of changes; old changes are pruned once a day."""
+    def __init__(self, root, jobs, poll_ms=CHANGE_POLL_MS):
+        self.root      = root
+        self.jobs      = jobs
+        self.poll_ms   = poll_ms
+        self.feed      = ChangeFeed()
+        self.pruned_on = None
+        self.listeners = []
+        self._tick()
+
+    def _tick(self):
+        today = datetime.date.today()
+        if today != self.pruned_on:
+            self.pruned_on = today
+            self.jobs.submit(prune_changes, on_error=lambda e: None, tag=self)
+        self.jobs.submit(self.feed.poll, on_done=self._done, on_error=self._failed, tag=self)
+
+    def _done(self, changes):
+        if changes:
+            for listener in self.listeners:
+                listener(changes)
+        self.root.after(0 if self.feed.behind else self.poll_ms, self._tick)
+
+    def _failed(self, error):
+        self.root.after(self.poll_ms, self._tick)
+
+
+def follow_changes(changes, cache, index, stats):
+    """Bring the entity cache, search index and Dashboard counters in line
+    with changes made at other desks."""
+    books = set()
+    for _, entity, id_, action, detail in changes:
+        if entity == "book":
+            if action == "import":
+                cache.clear("books")
+                index.reload()
+                stats.bump("books", int(detail))
+                continue
+            cache.invalidate(("books", id_))
+            books.add(id_)
+        elif entity == "member":
+            cache.invalidate(("members", id_))
+        elif action == "overdue":
+            stats.overdue_marked(int(detail))
+        else:                                        # a loan issued or returned
+            stats.bump(detail.lower(), 1 if action == "issue" else -1)
+            stats.loan_changed()
+        if action in ("insert", "delete"):
+            stats.bump(entity + "s", 1 if action == "insert" else -1)
+    for book_id in books:
+        index.refresh(book_id)
+
+
+# ─────────────────────────────────────────────
+#  TREEVIEW HELPERS
+# ─────────────────────────────────────────────
+LOADING_IID = "__loading__"
+
+
+def show_loading(tree):
+    """Put a muted 'Loading…' placeholder row at the top of ``tree``."""
+    if not tree.exists(LOADING_IID):
+        tree.insert("", 0, iid=LOADING_IID, values=("…", "Loading…"), tags=("loading",))
+        tree.tag_configure("loading", foreground=TEXT_MUTED)
+
+
+def clear_loading(tree):
+    if tree.winfo_exists() and tree.exists(LOADING_IID):
+        tree.delete(LOADING_IID)
+
+
+class PagedTree:
+    """Virtual list mode for a Treeview.
+
+    Rows are fetched one page at a time with keyset pagination as the user
+    scrolls, and at most ``max_pages`` pages of items are kept in the tree.
+    Pages are requested through ``submit(fn, *args, on_done=, on_error=)``
+    (the app's background executor), which calls
+    ``fetch(db, query, after, before, limit)``; ``query`` is whatever was
+    passed to ``reset()``, so the worker never reads the window's state. It
+    must return up to ``limit`` rows in ascending key order that sort after
+    ``after`` (or immediately before ``before``); ``key(row)`` returns the
+    keyset tuple of a row.
+    """
+    def __init__(self, tree, submit, fetch, key, tagger=None,
+                 page_size=TREE_PAGE_SIZE, max_pages=TREE_MAX_PAGES):
+        self.tree      = tree
+        self.submit    = submit
+        self.fetch     = fetch
+        self.key       = key
+        self.tagger    = tagger or (lambda row, i: ())
+        self.page_size = page_size
+        self.max_pages = max(2, max_pages)
+        self.pages     = []      # [(item_ids, first_key, last_key)] in display order
+        self.query     = None    # what the pages show, passed on to fetch
+        self.at_start  = True
+        self.at_end    = False
+        self._busy     = False
+        self._gen      = 0       # bumped by reset() so late pages are dropped
+
+    def reset(self, query=None):
+        self.tree.delete(*self.tree.get_children())
+        self.query    = query
+        self.pages    = []
+        self.at_start = True
+        self.at_end   = False
+        self._busy    = True
+        self._gen    += 1
+        show_loading(self.tree)
+        self._load("next")
+
+    def on_scroll(self, first, last):
+        if self._busy:
+            return
+        if last >= 1.0 - TREE_SCROLL_EDGE and not self.at_end:
+            direction = "next"
+        elif first <= TREE_SCROLL_EDGE and not self.at_start:
+            direction = "prev"
+        else:
+            return
+        self._busy = True
+        self.tree.after_idle(self._load, direction)
+
+    def _load(self, direction):
+        if direction == "next":
+            after, before = (self.pages[-1][2] if self.pages else None), None
+        else:
+            after, before = None, self.pages[0][1]
+        gen = self._gen
+        self.submit(self.fetch, self.query, after, before, self.page_size,
+                    on_done=lambda rows: self._apply(gen, direction, rows),
+                    on_error=lambda e: self._failed(gen, e))
+
+    def _failed(self, gen, error):
+        if gen == self._gen:
+            self._busy = False
+            clear_loading(self.tree)
+        messagebox.showerror("DB Error", str(error))
+
+    def _apply(self, gen, direction, rows):
+        if gen != self._gen:
+            return
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params or ())
-            return cursor.fetchone()
-        except Error as e:
-            return None
+            if not self.tree.winfo_exists():
+                return
+            clear_loading(self.tree)
+            if direction == "next" and len(rows) < self.page_size:
+                self.at_end = True
+            if direction == "prev" and len(rows) < self.page_size:
+                self.at_start = True
+            if not rows:
+                return
+
+            # Remember which row is at the top so the view does not jump
+            # when items are added or dropped above it.
+            before = len(self.tree.get_children())
+            top = round(self.tree.yview()[0] * before)
+
+            if direction == "next":
+                items = [self.tree.insert("", "end", values=row,
+                                          tags=self.tagger(row, i))
+                         for i, row in enumerate(rows)]
+                self.pages.append((items, self.key(rows[0]), self.key(rows[-1])))
+            else:
+                items = [self.tree.insert("", i, values=row,
+                                          tags=self.tagger(row, i))
+                         for i, row in enumerate(rows)]
+                self.pages.insert(0, (items, self.key(rows[0]), self.key(rows[-1])))
+                top += len(items)
+
+            if len(self.pages) > self.max_pages:
+                if direction == "next":
+                    dropped = self.pages.pop(0)[0]
+                    self.at_start = False
+                    top -= len(dropped)
+                else:
+                    dropped = self.pages.pop()[0]
+                    self.at_end = False
+                self.tree.delete(*dropped)
+
+            if before:
+                after = len(self.tree.get_children())
+                self.tree.yview_moveto(max(0, top) / after)
+        finally:
+            self._busy = False
+
+    def update(self, rows, gone=()):
+        """Rewrite the shown rows among ``rows`` and delete shown ids in ``gone``.
+
+        Rows are matched on their first column (the id). Rows not loaded are
+        left alone: they are read fresh when their page is fetched. Returns
+        the ids (as strings) of the rows rewritten.
+        """
+        rows  = {str(row[0]): row for row in rows}
+        gone  = {str(id_) for id_ in gone}
+        shown = set()
+        for items, _, _ in self.pages:
+            for i, iid in enumerate(list(items)):
+                id_ = str(self.tree.item(iid, "values")[0])
+                if id_ in gone:
+                    self.tree.delete(iid)
+                    items.remove(iid)
+                elif id_ in rows:
+                    self.tree.item(iid, values=rows[id_], tags=self.tagger(rows[id_], i))
+                    shown.add(id_)
+        return shown
+
+    def insert_first(self, row):
+        """Show a new row that sorts ahead of every row; only while at the start."""
+        if not self.at_start or not self.pages or self._busy:
+            return False
+        items, _, last = self.pages[0]
+        items.insert(0, self.tree.insert("", 0, values=row, tags=self.tagger(row, 0)))
+        self.pages[0] = (items, self.key(row), last)
+        return True
+
+
+class TreeSync:
+    """Bring a Treeview in line with a fresh result set, touching only changes.
+
+    Items use ``key(row)`` (the primary key) as their item id, so a refresh
+    deletes rows that are gone, rewrites rows whose values or tags changed,
+    inserts new rows and moves rows whose position changed; unchanged rows
+    cost no Tk calls at all, and selection survives a refresh. Inserts and
+    updates are applied ``chunk`` rows per ``after_idle`` callback so a large
+    list never freezes the window; a newer ``sync()`` supersedes one that is
+    still being applied.
+    """
+    def __init__(self, tree, key=lambda row: row[0], tagger=None,
+                 chunk=TREE_SYNC_CHUNK):
+        self.tree   = tree
+        self.key    = key
+        self.tagger = tagger or (lambda row, i: ())
+        self.chunk  = chunk
+        self.items  = {}        # iid -> (values, tags) as last written to the tree
+        self._gen   = 0
+
+    def sync(self, rows, on_done=None):
+        self._gen += 1
+        gen = self._gen
+        clear_loading(self.tree)
+        wanted = [(str(self.key(row)), tuple(row), tuple(self.tagger(row, i)))
+                  for i, row in enumerate(rows)]
+        keep = {iid for iid, _, _ in wanted}
+        gone = [iid for iid in self.items if iid not in keep]
+        if gone:
+            self.tree.delete(*gone)
+            for iid in gone:
+                del self.items[iid]
+        order  = self.tree.get_children()
+        placed = set()           # items moved up out of their old order
+
+        def step(start, j):
+            if gen != self._gen or not self.tree.winfo_exists():
+                return
+            tree = self.tree
+            end  = min(start + self.chunk, len(wanted))
+            for i in range(start, end):
+                iid, values, tags = wanted[i]
+                while j < len(order) and order[j] in placed:
+                    j += 1
+                if j < len(order) and order[j] == iid:
+                    j += 1
+                elif iid in self.items:
+                    tree.move(iid, "", i)
+                    placed.add(iid)
+                else:
+                    tree.insert("", i, iid=iid, values=values, tags=tags)
+                    self.items[iid] = (values, tags)
+                if self.items[iid] != (values, tags):
+                    tree.item(iid, values=values, tags=tags)
+                    self.items[iid] = (values, tags)
+            if end < len(wanted):
+                tree.after_idle(step, end, j)
+            elif on_done:
+                on_done()
+
+        step(0, 0)
+
+    def upsert(self, row, before=None):
+        """Rewrite one row in place, or insert it ahead of the first item whose
+        row makes ``before(other)`` true (at the end if none does)."""
+        iid, values = str(self.key(row)), tuple(row)
+        if iid not in self.items:
+            children = [c for c in self.tree.get_children() if c in self.items]
+            position = next((i for i, c in enumerate(children)
+                             if before and before(self.items[c][0])), len(children))
+            self.tree.insert("", position, iid=iid, values=values)
+        tags = tuple(self.tagger(row, self.tree.index(iid)))
+        self.tree.item(iid, values=values, tags=tags)
+        self.items[iid] = (values, tags)
+
+    def remove(self, key):
+        iid = str(key)
+        if self.items.pop(iid, None) is not None:
+            self.tree.delete(iid)
+
+
+# ─────────────────────────────────────────────
+#  LOOKUP FIELD
+# ─────────────────────────────────────────────
+class LookupEntry(tk.Frame):
+    """Type-ahead picker: an Entry with the best few matches listed under it.
+
+    Once typing pauses for ``debounce_ms``, ``fetch(db, text, limit)`` runs
+    through ``submit`` (the app's background executor) and its rows are
+    listed as ``describe(row)``. Up/Down move through the list; Return or a
+    click picks a row, which becomes ``value`` (None until something is
+    picked) and is passed to ``on_pick``. A barcode scanner types the code
+    and presses Return at once, so Return while a lookup is pending picks
+    its first row: the services list an exact id, ISBN or member code
+    match first.
+    """
+    def __init__(self, parent, submit, fetch, describe, on_pick=None,
+                 limit=LOOKUP_LIMIT, debounce_ms=LOOKUP_DEBOUNCE_MS):
+        super().__init__(parent, bg=BG_DARK)
+        self.submit      = submit
+        self.fetch       = fetch
+        self.describe    = describe
+        self.on_pick     = on_pick
+        self.limit       = limit
+        self.debounce_ms = debounce_ms
+        self.value       = None
+        self.rows        = []
+        self._after      = None     # pending debounce
+        self._waiting    = False    # lookup running
+        self._pick_first = False    # Return came before the results
+        self._setting    = False    # our own write to the entry
+        self._gen        = 0        # bumped per keystroke so late results are dropped
+
+        self.var = tk.StringVar()
+        self.entry = tk.Entry(self, textvariable=self.var, font=("Segoe UI", 11),
+                              bg=BG_CARD, fg=TEXT_PRIMARY, bd=0,
+                              insertbackground=ACCENT,
+                              highlightbackground=BORDER, highlightthickness=1)
+        self.entry.pack(fill="x", ipady=5)
+        self.listbox = tk.Listbox(self, height=6, font=("Segoe UI", 10),
+                                  bg=BG_CARD, fg=TEXT_PRIMARY, bd=0,
+                                  highlightbackground=BORDER, highlightthickness=1,
+                                  selectbackground=ACCENT_DARK, selectforeground=BG_DARK,
+                                  activestyle="none")
+        self.status = tk.Label(self, text="", font=("Segoe UI", 9),
+                               bg=BG_DARK, fg=TEXT_MUTED)
+        self.status.pack(anchor="w")
+
+        self.var.trace_add("write", lambda *_: self._typed())
+        self.entry.bind("<Down>",   lambda e: self._move(1))
+        self.entry.bind("<Up>",     lambda e: self._move(-1))
+        self.entry.bind("<Return>", lambda e: self._enter())
+        self.entry.bind("<Escape>", lambda e: self._hide())
+        self.listbox.bind("<ButtonRelease-1>", lambda e: self._pick_selected())
+
+    def focus_set(self):
+        self.entry.focus_set()
+
+    def _typed(self):
+        if self._setting:
+            return
+        self.value = None
+        self._gen += 1
+        if self._after:
+            self.after_cancel(self._after)
+            self._after = None
+        if not self.var.get().strip():
+            self._waiting = self._pick_first = False
+            self.rows = []
+            self._hide()
+            self.status.configure(text="")
+            return
+        self._after = self.after(self.debounce_ms, self._lookup)
+
+    def _lookup(self):
+        self._after   = None
+        self._waiting = True
+        gen = self._gen
+        self.status.configure(text="Looking up…")
+        self.submit(self.fetch, self.var.get(), self.limit,
+                    on_done=lambda rows: self._show(gen, rows),
+                    on_error=lambda e: self._failed(gen, e))
+
+    def _show(self, gen, rows):
+        if gen != self._gen or not self.winfo_exists():
+            return
+        self._waiting = False
+        self.rows = rows
+        self.listbox.delete(0, "end")
+        for row in rows:
+            self.listbox.insert("end", self.describe(row))
+        if not rows:
+            self._pick_first = False
+            self._hide()
+            self.status.configure(text="No matches")
+            return
+        more = "+" if len(rows) >= self.limit else ""
+        self.status.configure(text=f"{len(rows)}{more} matches  •  ↑↓ and Return to pick")
+        self.listbox.configure(height=min(len(rows), 6))
+        self.listbox.pack(fill="x", before=self.status)
+        self.listbox.selection_clear(0, "end")
+        self.listbox.selection_set(0)
+        if self._pick_first:
+            self._pick(0)
+
+    def _failed(self, gen, error):
+        if gen == self._gen and self.winfo_exists():
+            self._waiting = self._pick_first = False
+            self.status.configure(text=f"Lookup failed: {error}")
+
+    def _move(self, step):
+        if not self.rows:
+            return "break"
+        current = self.listbox.curselection()
+        i = min(max((current[0] if current else -1) + step, 0), len(self.rows) - 1)
+        self.listbox.selection_clear(0, "end")
+        self.listbox.selection_set(i)
+        self.listbox.see(i)
+        return "break"
+
+    def _enter(self):
+        if self._after:
+            self.after_cancel(self._after)
+            self._lookup()
+        if self._waiting:
+            self._pick_first = True
+        else:
+            self._pick_selected()
+        return "break"
+
+    def _pick_selected(self):
+        current = self.listbox.curselection()
+        if self.rows:
+            self._pick(current[0] if current else 0)
+
+    def _pick(self, i):
+        row = self.rows[i]
+        self.value = row
+        self._pick_first = False
+        self._setting = True
+        self.var.set(self.describe(row))
+        self._setting = False
+        self.entry.icursor("end")
+        self._hide()
+        self.status.configure(text="")
+        if self.on_pick:
+            self.on_pick(row)
+
+    def _hide(self):
+        self.listbox.pack_forget()
 
 
 # ─────────────────────────────────────────────
@@ -192,10 +753,7 @@ class LoginWindow:
         if not u or not p:
             messagebox.showwarning("Login", "Please enter username and password.")
             return
-        pw_hash = hashlib.sha256(p.encode()).hexdigest()
-        row = self.db.fetchone(
-            "SELECT id FROM admins WHERE username=%s AND password=%s", (u, pw_hash))
-        if row:
+        if authenticate(self.db, u, p):
             self.frame.destroy()
             self.on_success()
         else:
@@ -206,11 +764,18 @@ class LoginWindow:
 #  MAIN APPLICATION
 # ─────────────────────────────────────────────
 class LibraryApp:
-    def __init__(self, root, db):
+    def __init__(self, root, db, jobs, index, stats, changes):
         self.root    = root
         self.db      = db
-        self.current = None
+        self.jobs    = jobs
+        self.index   = index      # LiveSearchIndex over the catalogue
+        self.stats   = stats      # StatsCache behind the Dashboard
+        self.changes = changes    # ChangePoller following other desks' writes
+        self.current = None       # token of the current page visit
+        self._latest = {}         # slot -> newest future submitted for it
         self.build_layout()
+        self.root.bind(DIAGNOSTICS_KEY, lambda e: self.show_diagnostics())
+        self.changes.listeners.append(self._apply_changes)
         self.show_dashboard()
 
     # ── Layout skeleton ──────────────────────
@@ -283,9 +848,34 @@ class LibraryApp:
                 btn.configure(bg=BG_SIDEBAR, fg=TEXT_LIGHT)
 
     def _clear_main(self):
+        # Results still on their way for the page being left are dropped
+        self.jobs.cancel(self.current)
+        self.current = object()
         for w in self.main.winfo_children():
             w.destroy()
 
+    def _run_async(self, fn, *args, on_done=None, on_error=None, slot=None):
+        """Run ``fn(db, *args)`` on a DB worker on behalf of the current page.
+
+        Requests sharing a ``slot`` supersede each other: an older one still
+        queued is cancelled and only the newest result is delivered.
+        """
+        if slot is None:
+            return self.jobs.submit(fn, *args, on_done=on_done,
+                                    on_error=on_error, tag=self.current)
+        previous = self._latest.get(slot)
+        if previous is not None:
+            previous.cancel()
+
+        def done(result):
+            if self._latest.get(slot) is future and on_done:
+                on_done(result)
+
+        future = self.jobs.submit(fn, *args, on_done=done,
+                                  on_error=on_error, tag=self.current)
+        self._latest[slot] = future
+        return future
+
     def _page_header(self, title, subtitle=""):
         hdr = tk.Frame(self.main, bg=BG_DARK, pady=20, padx=30)
         hdr.pack(fill="x")
@@ -296,8 +886,44 @@ class LibraryApp:
                      bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w")
         tk.Frame(self.main, bg=ACCENT, height=2).pack(fill="x", padx=30)
 
+    def _long_task(self, win, label, on_finish, work):
+        """Run ``work(db, progress, cancelled)`` on a thread of its own.
+
+        Imports and exports would hold a DB_WORKERS thread for minutes, so
+        they get their own thread and pooled connection. The latest value
+        passed to ``progress`` is shown in ``label`` while ``win`` is open,
+        then ``on_finish(result, last_progress, error)`` runs on the Tk
+        thread. Returns the Event that asks ``work`` to stop.
+        """
+        cancel = threading.Event()
+        state  = {"progress": None, "result": None, "error": None, "done": False}
+
+        def run(db):
+            try:
+                state["result"] = work(db, lambda p: state.update(progress=p),
+                                       cancel.is_set)
+            except Exception as e:
+                state["error"] = e
+            finally:
+                state["done"] = True
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            if state["progress"] is not None:
+                label.configure(text=str(state["progress"]))
+            if state["done"]:
+                on_finish(state["result"], state["progress"], state["error"])
+            else:
+                win.after(200, poll)
+
+        threading.Thread(target=run, args=(self.db.background(),),
+                         daemon=True).start()
+        poll()
+        return cancel
+
     # ── Treeview helper ──────────────────────
-    def _make_tree(self, parent, columns, heights=300):
+    def _make_tree(self, parent, columns, heights=300, on_scroll=None):
         style = ttk.Style()
         style.theme_use("clam")
         style.configure("Custom.Treeview",
@@ -324,7 +950,12 @@ class LibraryApp:
                             style="Custom.Treeview")
         vsb = ttk.Scrollbar(frame, orient="vertical",   command=tree.yview)
         hsb = ttk.Scrollbar(frame, orient="horizontal", command=tree.xview)
-        tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+
+        def yscroll(first, last):
+            vsb.set(first, last)
+            if on_scroll:
+                on_scroll(float(first), float(last))
+        tree.configure(yscrollcommand=yscroll, xscrollcommand=hsb.set)
 
         vsb.pack(side="right", fill="y")
         hsb.pack(side="bottom", fill="x")
@@ -351,20 +982,22 @@ class LibraryApp:
         stats_frame.pack(fill="x")
 
         stats = [
-            ("Total Books",    self._count("SELECT COUNT(*) FROM books"),           "📖", ACCENT),
-            ("Members",        self._count("SELECT COUNT(*) FROM members"),          "👥", "#3498DB"),
-            ("Borrowed",       self._count("SELECT COUNT(*) FROM borrowings WHERE status='Borrowed'"), "🔄", WARNING),
-            ("Overdue",        self._count("SELECT COUNT(*) FROM borrowings WHERE status='Overdue'"),  "⚠️", DANGER),
+            ("Total Books",    "books",    "📖", ACCENT),
+            ("Members",        "members",  "👥", "#3498DB"),
+            ("Borrowed",       "borrowed", "🔄", WARNING),
+            ("Overdue",        "overdue",  "⚠️", DANGER),
         ]
-        for i, (label, val, icon, color) in enumerate(stats):
+        stat_labels = {}
+        for i, (label, key, icon, color) in enumerate(stats):
             card = tk.Frame(stats_frame, bg=BG_CARD, padx=20, pady=18,
                             highlightbackground=color, highlightthickness=1)
             card.grid(row=0, column=i, padx=10, sticky="ew")
             stats_frame.columnconfigure(i, weight=1)
             tk.Label(card, text=icon, font=("Segoe UI Emoji", 22),
                      bg=BG_CARD).pack(anchor="w")
-            tk.Label(card, text=str(val), font=("Georgia", 28, "bold"),
-                     bg=BG_CARD, fg=color).pack(anchor="w")
+            stat_labels[key] = tk.Label(card, text="…", font=("Georgia", 28, "bold"),
+                                        bg=BG_CARD, fg=color)
+            stat_labels[key].pack(anchor="w")
             tk.Label(card, text=label, font=("Segoe UI", 10),
                      bg=BG_CARD, fg=TEXT_MUTED).pack(anchor="w")
 
@@ -380,22 +1013,34 @@ class LibraryApp:
             tree.heading(col, text=col)
             tree.column(col, width=150)
 
-        rows = self.db.fetchall("""
-            SELECT b.title, m.name, br.borrow_date, br.due_date, br.status
-            FROM borrowings br
-            JOIN books b   ON br.book_id   = b.id
-            JOIN members m ON br.member_id = m.id
-            ORDER BY br.borrow_date DESC LIMIT 10
-        """)
-        for row in rows:
-            tag = "overdue" if row[4] == "Overdue" else ("returned" if row[4] == "Returned" else "")
-            tree.insert("", "end", values=row, tags=(tag,))
         tree.tag_configure("overdue",  foreground=DANGER)
         tree.tag_configure("returned", foreground=SUCCESS)
 
-    def _count(self, query):
-        r = self.db.fetchone(query)
-        return r[0] if r else 0
+        def show():
+            if self.stats.counts is not None:
+                for key, val in self.stats.counts.items():
+                    stat_labels[key].configure(text=str(val))
+            if self.stats.recent is not None:
+                tree.delete(*tree.get_children())
+                for row in self.stats.recent:
+                    tag = "overdue" if row[4] == "Overdue" else ("returned" if row[4] == "Returned" else "")
+                    tree.insert("", "end", values=row, tags=(tag,))
+
+        # Render from the cache at once; re-read only what is stale
+        def refresh():
+            show()
+            need_counts = self.stats.is_stale()
+            need_recent = self.stats.recent is None
+            if need_recent:
+                show_loading(tree)
+            if need_counts or need_recent:
+                self._run_async(StatsCache.fetch, need_counts, need_recent,
+                                on_done=lambda result: (self.stats.apply(result), show()),
+                                slot="dashboard")
+
+        self.dashboard_tree    = tree
+        self.refresh_dashboard = refresh
+        refresh()
 
     # ══════════════════════════════════════════
     #  BOOKS
@@ -409,33 +1054,32 @@ class LibraryApp:
         btn_bar.pack(fill="x")
         self._accent_btn(btn_bar, "+ Add Book",    self.add_book_dialog).pack(side="left", padx=(0,8))
         self._accent_btn(btn_bar, "✎ Edit",        self.edit_book_dialog, "#3498DB").pack(side="left", padx=(0,8))
-        self._accent_btn(btn_bar, "✕ Remove",      self.remove_book, DANGER).pack(side="left")
+        self._accent_btn(btn_bar, "✕ Remove",      self.remove_book, DANGER).pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "⇪ Import",      self.import_books_dialog, TEXT_MUTED).pack(side="left")
 
         cols = ("ID", "ISBN", "Title", "Author", "Genre", "Year", "Copies", "Available")
-        self.book_tree = self._make_tree(self.main, cols)
+        self.book_tree = self._make_tree(
+            self.main, cols, on_scroll=lambda f, l: self.book_pager.on_scroll(f, l))
         widths = [40, 120, 220, 150, 100, 60, 60, 70]
         for col, w in zip(cols, widths):
             self.book_tree.heading(col, text=col)
             self.book_tree.column(col, width=w, anchor="center" if col not in ("Title","Author") else "w")
+        self.book_tree.tag_configure("even", background=ROW_EVEN)
+        self.book_tree.tag_configure("odd",  background=ROW_ODD)
 
+        # Keyset on (title, id): only a bounded window of rows is ever loaded
+        self.book_pager = PagedTree(
+            self.book_tree, self._run_async, self._fetch_books_page,
+            key=lambda row: (row[2], row[0]),
+            tagger=lambda row, i: ("even" if i % 2 == 0 else "odd",))
         self._load_books()
 
     def _load_books(self, search=""):
-        for row in self.book_tree.get_children():
-            self.book_tree.delete(row)
-        if search:
-            rows = self.db.fetchall("""
-                SELECT id,isbn,title,author,genre,year,copies,available
-                FROM books WHERE title LIKE %s OR author LIKE %s OR isbn LIKE %s
-            """, (f"%{search}%",)*3)
-        else:
-            rows = self.db.fetchall(
-                "SELECT id,isbn,title,author,genre,year,copies,available FROM books ORDER BY title")
-        for i, row in enumerate(rows):
-            tag = "even" if i % 2 == 0 else "odd"
-            self.book_tree.insert("", "end", values=row, tags=(tag,))
-        self.book_tree.tag_configure("even", background=ROW_EVEN)
-        self.book_tree.tag_configure("odd",  background=ROW_ODD)
+        self._book_search = search
+        self.book_pager.reset(search)
+
+    def _fetch_books_page(self, db, search, after=None, before=None, limit=TREE_PAGE_SIZE):
+        return BookService(db).page(search, after, before, limit)
 
     def add_book_dialog(self):
         self._book_form("Add New Book", None)
@@ -445,8 +1089,17 @@ class LibraryApp:
         if not sel:
             messagebox.showwarning("Edit", "Please select a book.")
             return
-        vals = self.book_tree.item(sel[0])["values"]
-        self._book_form("Edit Book", vals)
+        book_id = self.book_tree.item(sel[0])["values"][0]
+
+        def loaded(row):
+            if row is None:
+                messagebox.showwarning("Edit", "This book no longer exists.")
+                self._load_books()
+            else:
+                self._book_form("Edit Book", row)
+
+        # The row as stored, not as the (possibly older) list shows it
+        self._run_async(lambda db: BookService(db).get(book_id), on_done=loaded)
 
     def _book_form(self, title, prefill):
         win = tk.Toplevel(self.root)
@@ -487,23 +1140,110 @@ class LibraryApp:
             genre  = entries["Genre"].get().strip()
             year   = entries["Year"].get().strip()
             copies = entries["Total Copies"].get().strip()
-            if not all([isbn, title_, author]):
-                messagebox.showwarning("Validation", "ISBN, Title and Author are required.")
-                return
-            if prefill:
-                self.db.execute("""
-                    UPDATE books SET isbn=%s,title=%s,author=%s,genre=%s,year=%s,copies=%s
-                    WHERE id=%s
-                """, (isbn, title_, author, genre or None, year or None, copies or 1, prefill[0]))
-            else:
-                self.db.execute("""
-                    INSERT INTO books (isbn,title,author,genre,year,copies,available)
-                    VALUES (%s,%s,%s,%s,%s,%s,%s)
-                """, (isbn, title_, author, genre or None, year or None, copies or 1, copies or 1))
+            fields = (isbn, title_, author, genre, year, copies)
+
+            def write(db):
+                if prefill:
+                    BookService(db).update(prefill[0], *fields)
+                    return prefill[0]
+                return BookService(db).add(*fields)
+
+            def saved(book_id):
+                if book_id:
+                    self.index.refresh(book_id)
+                    if not prefill:
+                        self.stats.bump("books")
+                win.destroy()
+                self._load_books()
+
+            save_btn.configure(state="disabled")
+            self._run_async(write, on_done=saved,
+                            on_error=lambda e: self._form_error(win, save_btn, e))
+
+        save_btn = self._accent_btn(win, "💾  Save Book", save)
+        save_btn.pack(pady=10)
+
+    def import_books_dialog(self):
+        path = filedialog.askopenfilename(
+            parent=self.root, title="Import Catalogue",
+            filetypes=[("Catalogue files", "*.csv *.mrc *.marc *.iso"),
+                       ("CSV", "*.csv"), ("MARC 21", "*.mrc *.marc *.iso"),
+                       ("All files", "*")])
+        if not path:
+            return
+        win = tk.Toplevel(self.root)
+        win.title("Import Catalogue")
+        win.configure(bg=BG_DARK)
+        win.geometry("460x300")
+        win.resizable(False, False)
+        win.grab_set()
+
+        tk.Label(win, text="Import Catalogue", font=("Georgia", 16, "bold"),
+                 bg=BG_DARK, fg=TEXT_PRIMARY, pady=15).pack()
+        tk.Label(win, text=os.path.basename(path), font=("Courier New", 9),
+                 bg=BG_DARK, fg=TEXT_MUTED).pack()
+
+        mode = tk.StringVar(value="skip")
+        opts = tk.Frame(win, bg=BG_DARK, pady=10)
+        opts.pack()
+        tk.Label(opts, text="EXISTING ISBN", font=("Courier New", 9),
+                 bg=BG_DARK, fg=TEXT_MUTED).pack(side="left", padx=(0, 10))
+        for text, value in (("Skip", "skip"), ("Update", "upsert")):
+            tk.Radiobutton(opts, text=text, variable=mode, value=value,
+                           bg=BG_DARK, fg=TEXT_PRIMARY, selectcolor=BG_CARD,
+                           activebackground=BG_DARK, font=("Segoe UI", 10)).pack(side="left")
+
+        bar = ttk.Progressbar(win, mode="indeterminate")
+        bar.pack(fill="x", padx=30, pady=(5, 8))
+        status = tk.Label(win, text="", font=("Segoe UI", 9), wraplength=400,
+                          bg=BG_DARK, fg=TEXT_MUTED)
+        status.pack()
+
+        def finished(result, report, error):
+            bar.stop()
+            report = result or report     # batches already committed
+            if report and report.inserted:
+                self.stats.bump("books", report.inserted)
+            if report and (report.inserted or report.updated):
+                self.index.reload()
+            if self._showing("book_tree"):
+                self._load_books(self._book_search)
             win.destroy()
-            self._load_books()
+            if error is not None:
+                done = f"\n\nCommitted before the error: {report}" if report else ""
+                messagebox.showerror("Import", str(error) + done)
+                return
+            detail = "".join(f"\n  {where}: {msg}" for where, msg in report.errors[:10])
+            messagebox.showinfo("Import", ("Import cancelled.\n" if report.cancelled else "")
+                                + str(report) + detail)
 
-        self._accent_btn(win, "💾  Save Book", save).pack(pady=10)
+        cancel = None
+
+        def stop():
+            if cancel is None:
+                win.destroy()
+            else:
+                cancel.set()
+                status.configure(text="Stopping after the current batch…")
+
+        def start():
+            nonlocal cancel
+            start_btn.configure(state="disabled")
+            bar.start(15)
+            status.configure(text="Importing…")
+            on_duplicate = mode.get()
+            cancel = self._long_task(
+                win, status, finished,
+                lambda db, progress, cancelled: import_books(
+                    db, path, on_duplicate=on_duplicate,
+                    progress=progress, cancelled=cancelled))
+            win.protocol("WM_DELETE_WINDOW", stop)
+
+        btns = tk.Frame(win, bg=BG_DARK, pady=12)
+        btns.pack()
+        start_btn = self._accent_btn(btns, "⇪  Start Import", start)
+        start_btn.pack(side="left", padx=(0, 8))
+        self._accent_btn(btns, "Cancel", stop, TEXT_MUTED).pack(side="left")
 
     def remove_book(self):
         sel = self.book_tree.selection()
@@ -512,8 +1252,22 @@ class LibraryApp:
             return
         vals = self.book_tree.item(sel[0])["values"]
         if messagebox.askyesno("Confirm", f"Remove '{vals[2]}'?"):
-            self.db.execute("DELETE FROM books WHERE id=%s", (vals[0],))
-            self._load_books()
+            def removed(count):
+                if count:
+                    self.stats.bump("books", -1)
+                self.index.refresh(vals[0])
+                self._load_books()
+
+            self._run_async(lambda db: BookService(db).remove(vals[0]), on_done=removed)
+
+    def _form_error(self, win, button, error):
+        """A failed save leaves the form open so it can be corrected."""
+        if win.winfo_exists():
+            button.configure(state="normal")
+        if isinstance(error, ValueError):
+            messagebox.showwarning("Validation", str(error))
+        else:
+            messagebox.showerror("DB Error", str(error))
 
     # ══════════════════════════════════════════
     #  MEMBERS
@@ -535,20 +1289,20 @@ class LibraryApp:
         for col, w in zip(cols, widths):
             self.member_tree.heading(col, text=col)
             self.member_tree.column(col, width=w)
+        self.member_tree.tag_configure("even",      background=ROW_EVEN)
+        self.member_tree.tag_configure("odd",       background=ROW_ODD)
+        self.member_tree.tag_configure("suspended", foreground=DANGER)
 
+        self.member_sync = TreeSync(
+            self.member_tree,
+            tagger=lambda row, i: ("suspended" if row[6] == "Suspended"
+                                   else ("even" if i % 2 == 0 else "odd"),))
         self._load_members()
 
     def _load_members(self):
-        for row in self.member_tree.get_children():
-            self.member_tree.delete(row)
-        rows = self.db.fetchall(
-            "SELECT id,member_id,name,email,phone,joined_date,status FROM members ORDER BY name")
-        for i, row in enumerate(rows):
-            tag = "suspended" if row[6] == "Suspended" else ("even" if i % 2 == 0 else "odd")
-            self.member_tree.insert("", "end", values=row, tags=(tag,))
-        self.member_tree.tag_configure("even",      background=ROW_EVEN)
-        self.member_tree.tag_configure("odd",       background=ROW_ODD)
-        self.member_tree.tag_configure("suspended", foreground=DANGER)
+        show_loading(self.member_tree)
+        self._run_async(lambda db: MemberService(db).all(),
+                        on_done=self.member_sync.sync, slot="members")
 
     def add_member_dialog(self):
         self._member_form("Register Member", None)
@@ -558,7 +1312,16 @@ class LibraryApp:
         if not sel:
             messagebox.showwarning("Edit", "Please select a member.")
             return
-        self._member_form("Edit Member", self.member_tree.item(sel[0])["values"])
+        id_ = self.member_tree.item(sel[0])["values"][0]
+
+        def loaded(row):
+            if row is None:
+                messagebox.showwarning("Edit", "This member no longer exists.")
+                self._load_members()
+            else:
+                self._member_form("Edit Member", row)
+
+        self._run_async(lambda db: MemberService(db).get(id_), on_done=loaded)
 
     def _member_form(self, title, prefill):
         win = tk.Toplevel(self.root)
@@ -588,7 +1351,7 @@ class LibraryApp:
                  bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
         status_var = tk.StringVar(value="Active")
         status_cb = ttk.Combobox(win, textvariable=status_var,
-                                 values=["Active", "Suspended"],
+                                 values=list(MEMBER_STATUSES),
                                  state="readonly", font=("Segoe UI", 11))
         status_cb.pack(fill="x", padx=30, pady=(2, 10))
 
@@ -604,23 +1367,26 @@ class LibraryApp:
             name  = entries["Full Name"].get().strip()
             email = entries["Email"].get().strip()
             phone = entries["Phone"].get().strip()
-            if not all([mid, name, email]):
-                messagebox.showwarning("Validation", "Member ID, Name and Email are required.")
-                return
-            if prefill:
-                self.db.execute("""
-                    UPDATE members SET member_id=%s,name=%s,email=%s,phone=%s,status=%s
-                    WHERE id=%s
-                """, (mid, name, email, phone or None, status_var.get(), prefill[0]))
-            else:
-                self.db.execute("""
-                    INSERT INTO members (member_id,name,email,phone,status)
-                    VALUES (%s,%s,%s,%s,%s)
-                """, (mid, name, email, phone or None, status_var.get()))
-            win.destroy()
-            self._load_members()
+            fields = (mid, name, email, phone, status_var.get())
+
+            def write(db):
+                if prefill:
+                    MemberService(db).update(prefill[0], *fields)
+                    return None
+                return MemberService(db).register(*fields)
+
+            def saved(new_id):
+                if new_id:
+                    self.stats.bump("members")
+                win.destroy()
+                self._load_members()
 
-        self._accent_btn(win, "💾  Save Member", save).pack(pady=10)
+            save_btn.configure(state="disabled")
+            self._run_async(write, on_done=saved,
+                            on_error=lambda e: self._form_error(win, save_btn, e))
+
+        save_btn = self._accent_btn(win, "💾  Save Member", save)
+        save_btn.pack(pady=10)
 
     def remove_member(self):
         sel = self.member_tree.selection()
@@ -629,8 +1395,12 @@ class LibraryApp:
             return
         vals = self.member_tree.item(sel[0])["values"]
         if messagebox.askyesno("Confirm", f"Remove member '{vals[2]}'?"):
-            self.db.execute("DELETE FROM members WHERE id=%s", (vals[0],))
-            self._load_members()
+            def removed(count):
+                if count:
+                    self.stats.bump("members", -1)
+                self._load_members()
+
+            self._run_async(lambda db: MemberService(db).remove(vals[0]), on_done=removed)
 
     # ══════════════════════════════════════════
     #  BORROW / RETURN
@@ -644,121 +1414,493 @@ class LibraryApp:
         btn_bar.pack(fill="x")
         self._accent_btn(btn_bar, "📤  Issue Book", self.issue_book_dialog).pack(side="left", padx=(0,8))
         self._accent_btn(btn_bar, "📥  Return Book", self.return_book, "#2ED573").pack(side="left", padx=(0,8))
-        self._accent_btn(btn_bar, "🔄  Refresh",    self._load_borrowings, TEXT_MUTED).pack(side="left")
+        self._accent_btn(btn_bar, "📚  Batch Issue", lambda: self.batch_circulation_dialog("issue"), TEXT_MUTED).pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "📦  Book Drop",  lambda: self.batch_circulation_dialog("return"), TEXT_MUTED).pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "🔄  Refresh",    self._load_borrowings, TEXT_MUTED).pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "⇩  Export",     self.export_loans_dialog, TEXT_MUTED).pack(side="left")
+        overdue_label = tk.Label(btn_bar, text="", font=("Segoe UI", 9),
+                                 bg=BG_DARK, fg=TEXT_MUTED)
+        overdue_label.pack(side="right")
+        self._run_async(lambda db: OverdueEngine(db).state(),
+                        on_done=lambda st: overdue_label.configure(
+                            text=self._overdue_summary(st)))
+
+        # Filters: open loans by default, newest first
+        self._ledger_filters = {"statuses": OPEN_STATUSES, "start": None, "end": None,
+                                "member_id": None, "book_id": None}
+        self._ledger_sort = ("borrow_date", True)
+        bar = tk.Frame(self.main, bg=BG_DARK, padx=30)
+        bar.pack(fill="x")
+
+        def label(text):
+            tk.Label(bar, text=text, font=("Courier New", 9),
+                     bg=BG_DARK, fg=TEXT_MUTED).pack(side="left", anchor="n", pady=6, padx=(0,4))
+
+        label("SHOW")
+        status_var = tk.StringVar(value="Open loans")
+        status_cb = ttk.Combobox(bar, textvariable=status_var, state="readonly", width=11,
+                                 values=list(LEDGER_VIEWS), font=("Segoe UI", 10))
+        status_cb.pack(side="left", anchor="n", padx=(0,12), pady=4)
+        dates = []
+        for text in ("FROM", "TO"):
+            label(text)
+            e = tk.Entry(bar, width=11, font=("Segoe UI", 10), bg=BG_CARD, fg=TEXT_PRIMARY,
+                         bd=0, insertbackground=ACCENT,
+                         highlightbackground=BORDER, highlightthickness=1)
+            e.pack(side="left", anchor="n", padx=(0,12), pady=4, ipady=3)
+            dates.append(e)
+        label("MEMBER")
+        member_lookup = LookupEntry(
+            bar, lambda fn, *a, **kw: self._run_async(fn, *a, slot="ledger-member", **kw),
+            lambda db, text, limit: MemberService(db).lookup(text, limit),
+            lambda m: f"{m[2]}  ·  {m[1]}", on_pick=lambda row: apply())
+        member_lookup.pack(side="left", anchor="n", padx=(0,12), pady=4)
+        label("BOOK")
+        book_lookup = LookupEntry(
+            bar, lambda fn, *a, **kw: self._run_async(fn, *a, slot="ledger-book", **kw),
+            lambda db, text, limit: BookService(db).lookup(text, limit),
+            lambda b: f"{b[2]} — {b[3]}", on_pick=lambda row: apply())
+        book_lookup.pack(side="left", anchor="n", padx=(0,12), pady=4)
+
+        def apply():
+            bounds = []
+            for e in dates:
+                value = e.get().strip()
+                try:
+                    bounds.append(datetime.date.fromisoformat(value) if value else None)
+                except ValueError:
+                    messagebox.showwarning("Filter", f"'{value}' is not a date (YYYY-MM-DD).")
+                    return
+            member = member_lookup.value if member_lookup.var.get().strip() else None
+            book   = book_lookup.value if book_lookup.var.get().strip() else None
+            self._ledger_filters = {"statuses": LEDGER_VIEWS[status_var.get()],
+                                    "start": bounds[0], "end": bounds[1],
+                                    "member_id": member[0] if member else None,
+                                    "book_id": book[0] if book else None}
+            self._load_borrowings()
+
+        def clear():
+            status_var.set("Open loans")
+            for field in dates + [member_lookup.entry, book_lookup.entry]:
+                field.delete(0, "end")
+            apply()
+
+        status_cb.bind("<<ComboboxSelected>>", lambda e: apply())
+        for e in dates:
+            e.bind("<Return>", lambda ev: apply())
+        self._accent_btn(bar, "Filter", apply, TEXT_MUTED).pack(side="left", anchor="n", padx=(0,8))
+        self._accent_btn(bar, "Clear", clear, TEXT_MUTED).pack(side="left", anchor="n")
+        self.ledger_count_label = tk.Label(bar, text="", font=("Segoe UI", 9),
+                                           bg=BG_DARK, fg=TEXT_MUTED)
+        self.ledger_count_label.pack(side="right", anchor="n", pady=6)
 
         cols = ("ID", "Book Title", "Member", "Borrow Date", "Due Date", "Return Date", "Status")
-        self.borrow_tree = self._make_tree(self.main, cols)
+        self.borrow_tree = self._make_tree(
+            self.main, cols, on_scroll=lambda f, l: self.borrow_pager.on_scroll(f, l))
         widths = [40, 200, 150, 100, 100, 100, 80]
         for col, w in zip(cols, widths):
-            self.borrow_tree.heading(col, text=col)
             self.borrow_tree.column(col, width=w)
+            if col in LEDGER_HEADINGS:
+                self.borrow_tree.heading(col, command=lambda c=col: self._sort_borrowings(c))
+        self._ledger_headings()
+        self.borrow_tree.tag_configure("overdue",  foreground=DANGER)
+        self.borrow_tree.tag_configure("returned", foreground=SUCCESS)
 
+        # Sorted and paged on the server; the keyset follows the sort column
+        self.borrow_pager = PagedTree(
+            self.borrow_tree, self._run_async, self._fetch_ledger_page,
+            key=lambda row: CirculationService.ledger_key(row, self._ledger_sort[0]),
+            tagger=lambda row, i: ({"Overdue": "overdue", "Returned": "returned"}.get(row[6], ""),))
         self._load_borrowings()
 
+    def _overdue_summary(self, state):
+        if state["last_run"] is None:
+            return "Overdue check has not run yet"
+        return (f"Overdue check: {state['last_run']:%Y-%m-%d %H:%M}"
+                f"  •  {state['rows_changed']} marked overdue")
+
     def _load_borrowings(self):
-        # Update overdue status
-        self.db.execute("""
-            UPDATE borrowings SET status='Overdue'
-            WHERE status='Borrowed' AND due_date < CURDATE()
-        """)
-        for row in self.borrow_tree.get_children():
-            self.borrow_tree.delete(row)
-        rows = self.db.fetchall("""
-            SELECT br.id, b.title, m.name,
-                   br.borrow_date, br.due_date, br.return_date, br.status
-            FROM borrowings br
-            JOIN books b   ON br.book_id   = b.id
-            JOIN members m ON br.member_id = m.id
-            ORDER BY br.borrow_date DESC
-        """)
-        for row in rows:
-            tag = {"Overdue":"overdue","Returned":"returned"}.get(row[6], "")
-            self.borrow_tree.insert("", "end", values=row, tags=(tag,))
-        self.borrow_tree.tag_configure("overdue",  foreground=DANGER)
-        self.borrow_tree.tag_configure("returned", foreground=SUCCESS)
+        # Overdue status is kept current by the OverdueScheduler
+        self.borrow_pager.reset(self._ledger_query())
+        self.ledger_count_label.configure(text="Counting…")
+        self._count_borrowings()
+
+    def _count_borrowings(self):
+        self._run_async(lambda db, f: CirculationService(db).ledger_count(**f),
+                        dict(self._ledger_filters), on_done=self._show_ledger_count,
+                        slot="ledger-count")
+
+    def _ledger_query(self):
+        """The filters and sort of the ledger as shown, for the page fetches."""
+        return dict(self._ledger_filters), self._ledger_sort
+
+    def _fetch_ledger_page(self, db, query, after=None, before=None, limit=TREE_PAGE_SIZE):
+        filters, (sort, descending) = query
+        return CirculationService(db).ledger(**filters, sort=sort, descending=descending,
+                                             after=after, before=before, limit=limit)
+
+    def _show_ledger_count(self, result):
+        count, exact = result
+        if self.ledger_count_label.winfo_exists():
+            self.ledger_count_label.configure(
+                text=f"{count:,} loans" if exact else f"more than {count:,} loans")
+
+    def _sort_borrowings(self, col):
+        """Sort by a heading; clicking the current sort column reverses it."""
+        sort, descending = LEDGER_HEADINGS[col]
+        if self._ledger_sort[0] == sort:
+            descending = not self._ledger_sort[1]
+        self._ledger_sort = (sort, descending)
+        self._ledger_headings()
+        self.borrow_pager.reset(self._ledger_query())
+
+    def _ledger_headings(self):
+        for col in self.borrow_tree["columns"]:
+            arrow = ""
+            if LEDGER_HEADINGS.get(col, (None,))[0] == self._ledger_sort[0]:
+                arrow = "  ▼" if self._ledger_sort[1] else "  ▲"
+            self.borrow_tree.heading(col, text=col + arrow)
+
+    def export_loans_dialog(self):
+        win = tk.Toplevel(self.root)
+        win.title("Export Loans")
+        win.configure(bg=BG_DARK)
+        win.geometry("420x380")
+        win.resizable(False, False)
+        win.grab_set()
+
+        tk.Label(win, text="Export Loan History", font=("Georgia", 16, "bold"),
+                 bg=BG_DARK, fg=TEXT_PRIMARY, pady=15).pack()
+
+        entries = {}
+        for f in ("Borrowed From (YYYY-MM-DD)", "Borrowed To (YYYY-MM-DD)"):
+            tk.Label(win, text=f.upper(), font=("Courier New", 9),
+                     bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
+            e = tk.Entry(win, font=("Segoe UI", 11), bg=BG_CARD, fg=TEXT_PRIMARY,
+                         bd=0, insertbackground=ACCENT,
+                         highlightbackground=BORDER, highlightthickness=1)
+            e.pack(fill="x", padx=30, pady=(2, 10), ipady=5)
+            entries[f] = e
+
+        status_vars = {}
+        opts = tk.Frame(win, bg=BG_DARK)
+        opts.pack(anchor="w", padx=30)
+        for st in LOAN_STATUSES:
+            status_vars[st] = tk.BooleanVar(value=True)
+            tk.Checkbutton(opts, text=st, variable=status_vars[st],
+                           bg=BG_DARK, fg=TEXT_PRIMARY, selectcolor=BG_CARD,
+                           activebackground=BG_DARK, font=("Segoe UI", 10)).pack(side="left")
+
+        bar = ttk.Progressbar(win, mode="indeterminate")
+        bar.pack(fill="x", padx=30, pady=(12, 8))
+        status = tk.Label(win, text="", font=("Segoe UI", 9),
+                          bg=BG_DARK, fg=TEXT_MUTED)
+        status.pack()
+
+        def finished(report, progress, error):
+            bar.stop()
+            win.destroy()
+            if error is not None:
+                messagebox.showerror("Export", str(error))
+            elif report.cancelled:
+                messagebox.showinfo("Export", "Export cancelled; no file was written.")
+            else:
+                messagebox.showinfo("Export", f"Exported {report} to\n{report.path}")
+
+        cancel = None
+
+        def stop():
+            if cancel is None:
+                win.destroy()
+            else:
+                cancel.set()
+                status.configure(text="Stopping…")
+
+        def start():
+            nonlocal cancel
+            bounds = []
+            for e in entries.values():
+                value = e.get().strip()
+                try:
+                    bounds.append(datetime.date.fromisoformat(value) if value else None)
+                except ValueError:
+                    messagebox.showwarning("Export", f"'{value}' is not a date (YYYY-MM-DD).",
+                                           parent=win)
+                    return
+            statuses = [st for st, var in status_vars.items() if var.get()]
+            if not statuses:
+                messagebox.showwarning("Export", "Select at least one status.", parent=win)
+                return
+            if len(statuses) == len(LOAN_STATUSES):
+                statuses = None
+            path = filedialog.asksaveasfilename(
+                parent=win, title="Export Loans", defaultextension=".csv",
+                filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                           ("Parquet", "*.parquet")])
+            if not path:
+                return
+            start_btn.configure(state="disabled")
+            bar.start(15)
+            status.configure(text="Exporting…")
+            cancel = self._long_task(
+                win, status, finished,
+                lambda db, progress, cancelled: export_loans(
+                    db, path, start=bounds[0], end=bounds[1], statuses=statuses,
+                    progress=progress, cancelled=cancelled))
+            win.protocol("WM_DELETE_WINDOW", stop)
+
+        btns = tk.Frame(win, bg=BG_DARK, pady=12)
+        btns.pack()
+        start_btn = self._accent_btn(btns, "⇩  Export…", start)
+        start_btn.pack(side="left", padx=(0, 8))
+        self._accent_btn(btns, "Cancel", stop, TEXT_MUTED).pack(side="left")
 
     def issue_book_dialog(self):
         win = tk.Toplevel(self.root)
         win.title("Issue Book")
         win.configure(bg=BG_DARK)
-        win.geometry("420x360")
+        win.geometry("460x560")
         win.resizable(False, False)
         win.grab_set()
 
         tk.Label(win, text="Issue Book", font=("Georgia", 16, "bold"),
                  bg=BG_DARK, fg=TEXT_PRIMARY, pady=15).pack()
 
-        # Book selector
-        tk.Label(win, text="SELECT BOOK", font=("Courier New", 9),
+        # Book and member lookups: type a title, id or name, or scan a barcode
+        tk.Label(win, text="BOOK (TITLE, ID OR ISBN)", font=("Courier New", 9),
                  bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
-        books = self.db.fetchall("SELECT id, title FROM books WHERE available > 0")
-        book_options = [f"{b[0]} – {b[1]}" for b in books]
-        book_var = tk.StringVar()
-        book_cb = ttk.Combobox(win, textvariable=book_var,
-                               values=book_options, state="readonly",
-                               font=("Segoe UI", 10), width=45)
-        book_cb.pack(fill="x", padx=30, pady=(3,12))
-
-        # Member selector
-        tk.Label(win, text="SELECT MEMBER", font=("Courier New", 9),
+        book_lookup = LookupEntry(
+            win, lambda fn, *a, **kw: self._run_async(fn, *a, slot="issue-book", **kw),
+            lambda db, text, limit: BookService(db).lookup(text, limit),
+            lambda b: f"{b[2]} — {b[3]}  ({b[7]} of {b[6]} available)",
+            on_pick=lambda row: mem_lookup.focus_set())
+        book_lookup.pack(fill="x", padx=30, pady=(3,8))
+
+        tk.Label(win, text="MEMBER (NAME, MEMBER ID OR EMAIL)", font=("Courier New", 9),
                  bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
-        members = self.db.fetchall("SELECT id, name FROM members WHERE status='Active'")
-        mem_options = [f"{m[0]} – {m[1]}" for m in members]
-        mem_var = tk.StringVar()
-        mem_cb = ttk.Combobox(win, textvariable=mem_var,
-                              values=mem_options, state="readonly",
-                              font=("Segoe UI", 10), width=45)
-        mem_cb.pack(fill="x", padx=30, pady=(3,12))
+        mem_lookup = LookupEntry(
+            win, lambda fn, *a, **kw: self._run_async(fn, *a, slot="issue-member", **kw),
+            lambda db, text, limit: MemberService(db).lookup(text, limit),
+            lambda m: f"{m[2]}  ·  {m[1]}" + ("" if m[6] == "Active" else f"  ({m[6]})"),
+            on_pick=lambda row: due_entry.focus_set())
+        mem_lookup.pack(fill="x", padx=30, pady=(3,8))
 
         # Due date
         tk.Label(win, text="DUE DATE (YYYY-MM-DD)", font=("Courier New", 9),
                  bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
-        default_due = (datetime.date.today() + datetime.timedelta(days=14)).strftime("%Y-%m-%d")
+        default_due = CirculationService.default_due().strftime("%Y-%m-%d")
         due_entry = tk.Entry(win, font=("Segoe UI", 11),
                              bg=BG_CARD, fg=TEXT_PRIMARY, bd=0,
                              insertbackground=ACCENT,
                              highlightbackground=BORDER, highlightthickness=1)
         due_entry.insert(0, default_due)
         due_entry.pack(fill="x", padx=30, pady=(3,15), ipady=5)
+        book_lookup.focus_set()
 
         def issue():
-            if not book_var.get() or not mem_var.get():
-                messagebox.showwarning("Issue", "Please select a book and member.")
+            if book_lookup.value is None or mem_lookup.value is None:
+                messagebox.showwarning("Issue", "Please pick a book and a member from the lists.")
                 return
-            book_id = int(book_var.get().split(" – ")[0])
-            mem_id  = int(mem_var.get().split(" – ")[0])
+            book_id = book_lookup.value[0]
+            mem_id  = mem_lookup.value[0]
             due     = due_entry.get().strip()
-            self.db.execute("""
-                INSERT INTO borrowings (book_id, member_id, due_date, status)
-                VALUES (%s, %s, %s, 'Borrowed')
-            """, (book_id, mem_id, due))
-            self.db.execute("UPDATE books SET available = available - 1 WHERE id=%s", (book_id,))
-            win.destroy()
-            self._load_borrowings()
-            messagebox.showinfo("Issued", "Book issued successfully!")
+            issue_btn.configure(state="disabled")
+
+            def issued(result):
+                _, status = result
+                self.index.refresh(book_id)
+                self.stats.bump(status.lower())
+                self.stats.loan_changed()
+                win.destroy()
+                self._load_borrowings()
+                messagebox.showinfo("Issued", "Book issued successfully!")
 
-        self._accent_btn(win, "📤  Issue Book", issue).pack(pady=5)
+            def failed(error):
+                if win.winfo_exists():
+                    issue_btn.configure(state="normal")
+                self._circulation_error(error)
+
+            self._run_async(lambda db: CirculationService(db).issue(book_id, mem_id, due),
+                            on_done=issued, on_error=failed)
+
+        issue_btn = self._accent_btn(win, "📤  Issue Book", issue)
+        issue_btn.pack(pady=5)
 
     def return_book(self):
-        sel = self.borrow_tree.selection()
+        sel = [iid for iid in self.borrow_tree.selection() if iid != LOADING_IID]
         if not sel:
             messagebox.showwarning("Return", "Please select a borrowing record.")
             return
-        vals = self.borrow_tree.item(sel[0])["values"]
-        if vals[6] == "Returned":
+        rows = [self.borrow_tree.item(iid)["values"] for iid in sel]
+        rows = [vals for vals in rows if vals[6] != "Returned"]
+        if not rows:
             messagebox.showinfo("Return", "This book has already been returned.")
             return
+        if len(rows) > 1:
+            # Several selected rows go back in one batch
+            if messagebox.askyesno("Confirm", f"Return {len(rows)} selected loans?"):
+                self._run_async(lambda db, ids: CirculationService(db).return_many(ids),
+                                [vals[0] for vals in rows], on_done=self._batch_returned,
+                                on_error=self._circulation_error)
+            return
+        vals = rows[0]
         if messagebox.askyesno("Confirm", f"Return '{vals[1]}' from {vals[2]}?"):
-            self.db.execute("""
-                UPDATE borrowings SET status='Returned', return_date=CURDATE()
-                WHERE id=%s
-            """, (vals[0],))
-            # Get book_id and increment available
-            row = self.db.fetchone("SELECT book_id FROM borrowings WHERE id=%s", (vals[0],))
-            if row:
-                self.db.execute("UPDATE books SET available = available + 1 WHERE id=%s", (row[0],))
-            self._load_borrowings()
-            messagebox.showinfo("Returned", "Book returned successfully!")
+            def returned(result):
+                book_id, status = result
+                self.index.refresh(book_id)
+                self.stats.bump(status.lower(), -1)   # 'Borrowed' or 'Overdue'
+                self.stats.loan_changed()
+                self._load_borrowings()
+                messagebox.showinfo("Returned", "Book returned successfully!")
+
+            self._run_async(lambda db: CirculationService(db).return_loan(vals[0]),
+                            on_done=returned, on_error=self._circulation_error)
+
+    def _batch_returned(self, report):
+        self._after_batch(report)
+        detail = "".join(f"\n  loan {r[0]}: {r[4]}" for r in report.results if r[4])
+        messagebox.showinfo("Returned", str(report) + detail)
+
+    def batch_circulation_dialog(self, mode):
+        """Issue a stack of books to one member, or return the book-drop.
+
+        Items are scanned or typed one per line; the whole list goes through
+        ``issue_many``/``return_many`` and each line's result is listed.
+        Lines that failed are left in the box to correct and retry.
+        """
+        issuing = mode == "issue"
+        title = "Batch Issue" if issuing else "Book Drop Returns"
+        win = tk.Toplevel(self.root)
+        win.title(title)
+        win.configure(bg=BG_DARK)
+        win.geometry("620x720")
+        win.grab_set()
+
+        tk.Label(win, text=title, font=("Georgia", 16, "bold"),
+                 bg=BG_DARK, fg=TEXT_PRIMARY, pady=15).pack()
+
+        by = tk.StringVar(value="book")
+        if issuing:
+            tk.Label(win, text="MEMBER (NAME, MEMBER ID OR EMAIL)", font=("Courier New", 9),
+                     bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
+            mem_lookup = LookupEntry(
+                win, lambda fn, *a, **kw: self._run_async(fn, *a, slot="batch-member", **kw),
+                lambda db, text, limit: MemberService(db).lookup(text, limit),
+                lambda m: f"{m[2]}  ·  {m[1]}" + ("" if m[6] == "Active" else f"  ({m[6]})"),
+                on_pick=lambda row: due_entry.focus_set())
+            mem_lookup.pack(fill="x", padx=30, pady=(3,8))
+            tk.Label(win, text="DUE DATE (YYYY-MM-DD)", font=("Courier New", 9),
+                     bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
+            due_entry = tk.Entry(win, font=("Segoe UI", 11),
+                                 bg=BG_CARD, fg=TEXT_PRIMARY, bd=0,
+                                 insertbackground=ACCENT,
+                                 highlightbackground=BORDER, highlightthickness=1)
+            due_entry.insert(0, CirculationService.default_due().strftime("%Y-%m-%d"))
+            due_entry.pack(fill="x", padx=30, pady=(3,8), ipady=5)
+            due_entry.bind("<Return>", lambda e: items.focus_set())
+        else:
+            opts = tk.Frame(win, bg=BG_DARK)
+            opts.pack(anchor="w", padx=30, pady=(0,8))
+            tk.Label(opts, text="ITEMS ARE", font=("Courier New", 9),
+                     bg=BG_DARK, fg=TEXT_MUTED).pack(side="left", padx=(0, 10))
+            for text, value in (("Books (ISBN or id)", "book"), ("Loan ids", "loan")):
+                tk.Radiobutton(opts, text=text, variable=by, value=value,
+                               bg=BG_DARK, fg=TEXT_PRIMARY, selectcolor=BG_CARD,
+                               activebackground=BG_DARK, font=("Segoe UI", 10)).pack(side="left")
+
+        # A scanner types each code and presses Return, which starts a new line
+        tk.Label(win, text="SCAN OR TYPE ONE ISBN OR ID PER LINE", font=("Courier New", 9),
+                 bg=BG_DARK, fg=TEXT_MUTED).pack(anchor="w", padx=30)
+        items = tk.Text(win, height=8, font=("Segoe UI", 11), bg=BG_CARD, fg=TEXT_PRIMARY,
+                        bd=0, insertbackground=ACCENT,
+                        highlightbackground=BORDER, highlightthickness=1)
+        items.pack(fill="x", padx=30, pady=(3,4))
+        status = tk.Label(win, text="", font=("Segoe UI", 9), wraplength=540,
+                          bg=BG_DARK, fg=TEXT_MUTED)
+        status.pack(anchor="w", padx=30)
+
+        def lines():
+            return [line.strip() for line in items.get("1.0", "end").splitlines() if line.strip()]
+
+        items.bind("<KeyRelease>", lambda e: status.configure(text=f"{len(lines())} items"))
+        (mem_lookup if issuing else items).focus_set()
+
+        def running(busy):
+            # The window stays open until the batch ends, so finished() can
+            # apply its results to the search index and the Dashboard
+            for btn in (start_btn, close_btn):
+                btn.configure(state="disabled" if busy else "normal")
+            win.protocol("WM_DELETE_WINDOW", (lambda: None) if busy else win.destroy)
+
+        def finished(report, progress, error):
+            running(False)
+            report = report or progress       # batches already committed
+            if report:
+                self._after_batch(report)
+                results.delete(*results.get_children())
+                for item, loan_id, book_id, st, err in report.results:
+                    results.insert("", "end", values=(item, loan_id or "", book_id or "",
+                                                      err or st), tags=("failed",) if err else ())
+                failed = [str(r[0]) for r in report.results if r[4]]
+                items.delete("1.0", "end")
+                items.insert("1.0", "\n".join(failed))
+                status.configure(text=str(report) + ("  •  failed lines left above" if failed else ""))
+            if error is not None:
+                self._circulation_error(error)
+
+        def start():
+            wanted = lines()
+            if not wanted:
+                messagebox.showwarning(title, "Scan or type at least one item.", parent=win)
+                return
+            if issuing:
+                if mem_lookup.value is None:
+                    messagebox.showwarning(title, "Please pick a member from the list.",
+                                           parent=win)
+                    return
+                member_id, due = mem_lookup.value[0], due_entry.get().strip()
+                work = lambda db, progress, cancelled: CirculationService(db).issue_many(
+                    member_id, wanted, due, progress=progress)
+            else:
+                kind = by.get()
+                work = lambda db, progress, cancelled: CirculationService(db).return_many(
+                    wanted, kind, progress=progress)
+            running(True)
+            status.configure(text=f"{'Issuing' if issuing else 'Returning'} {len(wanted)} items…")
+            self._long_task(win, status, finished, work)
+
+        btns = tk.Frame(win, bg=BG_DARK, pady=8)
+        btns.pack()
+        start_btn = self._accent_btn(btns, "📤  Issue All" if issuing else "📥  Return All", start,
+                                     ACCENT if issuing else SUCCESS)
+        start_btn.pack(side="left", padx=(0, 8))
+        close_btn = self._accent_btn(btns, "Close", win.destroy, TEXT_MUTED)
+        close_btn.pack(side="left")
+
+        results = self._make_tree(win, ("Item", "Loan", "Book", "Result"))
+        for col, w in zip(("Item", "Loan", "Book", "Result"), (160, 70, 70, 240)):
+            results.column(col, width=w)
+        results.tag_configure("failed", foreground=DANGER)
+
+    def _after_batch(self, report):
+        """Bring the search index, Dashboard counters and ledger up to date
+        after a batch issue or return."""
+        done = [r for r in report.results if r[4] is None]
+        sign = 1 if report.action == "issued" else -1
+        for book_id in {r[2] for r in done}:
+            self.index.refresh(book_id)
+        for r in done:
+            self.stats.bump(r[3].lower(), sign)
+        if done:
+            self.stats.loan_changed()
+            if self._showing("borrow_tree"):
+                self._load_borrowings()
+
+    def _circulation_error(self, error):
+        if isinstance(error, CirculationError):
+            messagebox.showwarning("Circulation", str(error))
+        else:
+            messagebox.showerror("DB Error", str(error))
 
     # ══════════════════════════════════════════
     #  SEARCH
@@ -783,8 +1925,22 @@ class LibraryApp:
                                 highlightbackground=BORDER, highlightthickness=1,
                                 width=40)
         search_entry.grid(row=1, column=0, ipady=6, padx=(0,10))
+        search_entry.bind("<Return>", lambda e: self._do_search())
+        self.search_var.trace_add("write", lambda *_: self._search_typed())
+        self._search_after = None
         self._accent_btn(search_frame, "🔍  Search",
                          lambda: self._do_search()).grid(row=1, column=1)
+        self._accent_btn(search_frame, "‹ Prev",
+                         lambda: self._do_search(self.search_page - 1),
+                         TEXT_MUTED).grid(row=1, column=2, padx=(20, 5))
+        self._accent_btn(search_frame, "Next ›",
+                         lambda: self._do_search(self.search_page + 1),
+                         TEXT_MUTED).grid(row=1, column=3)
+        self.search_status = tk.Label(search_frame, text="", font=("Segoe UI", 9),
+                                      bg=BG_DARK, fg=TEXT_MUTED)
+        self.search_status.grid(row=2, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        self.search_page = 0
+        self.search_more = False
 
         cols = ("ID", "ISBN", "Title", "Author", "Genre", "Year", "Available")
         self.search_tree = self._make_tree(self.main, cols)
@@ -792,34 +1948,251 @@ class LibraryApp:
             self.search_tree.heading(col, text=col)
             self.search_tree.column(col, width=130)
 
-    def _do_search(self):
+    def _search_typed(self):
+        # Search as you type: instantly from the in-memory index, otherwise
+        # once typing pauses so SQL is not hit on every keystroke.
+        if self._search_after:
+            self.root.after_cancel(self._search_after)
+            self._search_after = None
+        if self.index.ready:
+            self._do_search(explicit=False)
+        else:
+            self._search_after = self.root.after(
+                SEARCH_DEBOUNCE_MS, lambda: self._do_search(explicit=False))
+
+    def _do_search(self, page=0, explicit=True):
+        self._search_after = None
+        if not self.search_tree.winfo_exists():
+            return
         q = self.search_var.get().strip()
-        for row in self.search_tree.get_children():
-            self.search_tree.delete(row)
+        if page < 0 or (page > self.search_page and not self.search_more):
+            return
+        tree = self.search_tree
+        tree.delete(*tree.get_children())
+        self.search_status.configure(text="")
         if not q:
             return
-        rows = self.db.fetchall("""
-            SELECT id,isbn,title,author,genre,year,available
-            FROM books WHERE title LIKE %s OR author LIKE %s OR isbn LIKE %s OR genre LIKE %s
-        """, (f"%{q}%",)*4)
-        for row in rows:
-            self.search_tree.insert("", "end", values=row)
-        if not rows:
-            messagebox.showinfo("Search", "No books found matching your query.")
+        show_loading(tree)
+
+        def show(rows):
+            # One extra row is fetched to know whether a next page exists
+            self.search_page = page
+            self.search_more = len(rows) > SEARCH_PAGE_SIZE
+            rows = rows[:SEARCH_PAGE_SIZE]
+            clear_loading(tree)
+            for row in rows:
+                tree.insert("", "end", values=row)
+            if not rows and page == 0:
+                self.search_status.configure(text="No books found.")
+                if explicit:
+                    messagebox.showinfo("Search", "No books found matching your query.")
+            elif rows:
+                first = page * SEARCH_PAGE_SIZE + 1
+                self.search_status.configure(
+                    text=f"Page {page + 1}  •  results {first}–{first + len(rows) - 1}"
+                         + ("" if self.search_more else "  (end)"))
+
+        if self.index.ready:
+            self._latest.pop("search", None)      # outdated SQL answers are dropped
+            show(self.index.search(q, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE))
+            return
+        self._run_async(search_books, q, SEARCH_PAGE_SIZE + 1, page * SEARCH_PAGE_SIZE,
+                        on_done=show, slot="search")
+
+    # ══════════════════════════════════════════
+    #  DIAGNOSTICS  (hidden: DIAGNOSTICS_KEY)
+    # ══════════════════════════════════════════
+    def show_diagnostics(self):
+        self._clear_main()
+        self._highlight_nav("Diagnostics")
+        self._page_header("Diagnostics", "Query timings from the connection pool's profiler")
+        profiler = self.db.profiler
+
+        btn_bar = tk.Frame(self.main, bg=BG_DARK, padx=30, pady=10)
+        btn_bar.pack(fill="x")
+        toggle = self._accent_btn(btn_bar, "", lambda: (
+            setattr(profiler, "enabled", not profiler.enabled), refresh()))
+        toggle.pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "⟲  Reset", lambda: (profiler.reset(), refresh()),
+                         TEXT_MUTED).pack(side="left", padx=(0,8))
+        self._accent_btn(btn_bar, "⇩  Dump Metrics", self.dump_metrics_dialog,
+                         TEXT_MUTED).pack(side="left")
+        status = tk.Label(btn_bar, text="", font=("Segoe UI", 9),
+                          bg=BG_DARK, fg=TEXT_MUTED)
+        status.pack(side="right")
+
+        cols = ("Statement", "Calls", "Rows", "Mean ms", "p95 ms", "Max ms", "Errors", "Call Site")
+        statement_tree = self._make_tree(self.main, cols)
+        widths = [320, 60, 70, 70, 70, 70, 50, 200]
+        for col, w in zip(cols, widths):
+            statement_tree.heading(col, text=col)
+            statement_tree.column(col, width=w, anchor="w" if col in ("Statement", "Call Site")
+                                  else "center")
+
+        tk.Label(self.main, text=f"Slow Queries (over {profiler.slow_ms} ms)",
+                 font=("Georgia", 14, "bold"),
+                 bg=BG_DARK, fg=TEXT_PRIMARY,
+                 padx=30).pack(anchor="w", pady=(5, 0))
+        cols = ("Time", "ms", "Rows", "Call Site", "Statement")
+        slow_tree = self._make_tree(self.main, cols)
+        widths = [140, 60, 60, 200, 450]
+        for col, w in zip(cols, widths):
+            slow_tree.heading(col, text=col)
+            slow_tree.column(col, width=w)
+
+        shown = {}                # tree item -> statement or slow-log entry
+
+        def refresh():
+            statements, slow = profiler.snapshot()
+            toggle.configure(text="■  Stop Profiling" if profiler.enabled
+                             else "▶  Start Profiling")
+            pool  = self.db.pool.stats()
+            cache = self.db.cache.stats()
+            status.configure(text=f"{'Profiling' if profiler.enabled else 'Off'}  •  "
+                                  f"{len(statements)} statements  •  pool {pool['in_use']}"
+                                  f"/{pool['size']} in use, {pool['waits']} waits  •  "
+                                  f"cache {cache['size']} records, "
+                                  f"{cache['hits']} hits / {cache['misses']} misses")
+            shown.clear()
+            statement_tree.delete(*statement_tree.get_children())
+            for s in statements:
+                site = next(iter(s["call_sites"]), "")
+                item = statement_tree.insert("", "end", values=(
+                    s["sql"], s["calls"], s["rows"], f"{s['mean_ms']:.2f}",
+                    f"≤{s['p95_ms']}", f"{s['max_ms']:.1f}", s["errors"], site))
+                shown[item] = s
+            slow_tree.delete(*slow_tree.get_children())
+            for entry in reversed(slow):
+                item = slow_tree.insert("", "end", values=(
+                    entry["at"].replace("T", " "), entry["ms"], entry["rows"],
+                    entry["site"], entry["sql"]))
+                shown[item] = entry
+
+        def details(tree):
+            found = shown.get(tree.focus())
+            if found is None:
+                return
+            sites = found.get("call_sites") or {found["site"]: 1}
+            messagebox.showinfo("Statement", "\n\n".join([
+                found["sql"],
+                "Called from:\n" + "\n".join(f"  {site}  ×{n}" for site, n in sites.items()),
+                "Plan:\n" + "\n".join(f"  {step}" for step in found["plan"] or
+                                       ["(read once the statement runs slowly)"])]))
+
+        statement_tree.bind("<Double-1>", lambda e: details(statement_tree))
+        slow_tree.bind("<Double-1>", lambda e: details(slow_tree))
+
+        page = self.current
+
+        def tick():
+            if self.current is page and self.main.winfo_exists():
+                refresh()
+                self.root.after(DIAGNOSTICS_REFRESH_MS, tick)
+        tick()
+
+    def dump_metrics_dialog(self):
+        path = filedialog.asksaveasfilename(
+            title="Dump Query Metrics", initialfile=PROFILE_DUMP,
+            defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.db.profiler.dump(path, pool=self.db.pool.stats(),
+                                  cache=self.db.cache.stats())
+        except OSError as e:
+            messagebox.showerror("Dump Failed", str(e))
+            return
+        messagebox.showinfo("Metrics Saved", f"Query metrics written to\n{path}")
+
+    # ── Live refresh ─────────────────────────
+    def _showing(self, name):
+        """True while the page owning the widget attribute ``name`` is open."""
+        widget = getattr(self, name, None)
+        return widget is not None and widget.winfo_exists()
+
+    def _apply_changes(self, changes):
+        """Show other desks' changes on the open page, row by row.
+
+        Shared state (entity cache, search index, Dashboard counters) has
+        already been updated by follow_changes; here only the rows affected
+        are re-read, and a bulk change (an import, the overdue job) reloads
+        the list it touches.
+        """
+        ids  = {"book": set(), "member": set(), "loan": set()}
+        bulk = set()
+        issued = set()
+        for _, entity, id_, action, _ in changes:
+            if id_ is None:
+                bulk.add(action)
+                continue
+            ids[entity].add(id_)
+            if action == "issue":
+                issued.add(id_)
+
+        if self._showing("dashboard_tree"):
+            self.refresh_dashboard()
+
+        if self._showing("book_tree"):
+            if "import" in bulk:
+                self._load_books(self._book_search)
+            elif ids["book"]:
+                self._run_async(lambda db, wanted: [(i, BookService(db).get(i)) for i in wanted],
+                                sorted(ids["book"]), on_done=lambda found: self.book_pager.update(
+                                    [row for _, row in found if row],
+                                    [i for i, row in found if not row]))
+
+        if self._showing("member_tree") and ids["member"]:
+            def members(found):
+                for id_, row in found:
+                    if row is None:
+                        self.member_sync.remove(id_)
+                    else:
+                        self.member_sync.upsert(row, before=lambda other, r=row: (
+                            str(other[2]).lower(), other[0]) > (r[2].lower(), r[0]))
+
+            self._run_async(lambda db, wanted: [(i, MemberService(db).get(i)) for i in wanted],
+                            sorted(ids["member"]), on_done=members)
+
+        if self._showing("borrow_tree"):
+            if "overdue" in bulk:
+                self._load_borrowings()
+            elif ids["loan"]:
+                wanted = sorted(ids["loan"])
+
+                def loans(rows):
+                    shown = self.borrow_pager.update(
+                        rows, [i for i in wanted if i not in {r[0] for r in rows}])
+                    # New loans head the default (newest first) order
+                    if self._ledger_sort == ("borrow_date", True):
+                        for row in sorted(rows, key=lambda r: (r[3], r[0])):
+                            if row[0] in issued and str(row[0]) not in shown:
+                                self.borrow_pager.insert_first(row)
+                    self._count_borrowings()
+
+                self._run_async(lambda db, f: CirculationService(db).ledger(
+                                    **f, ids=wanted, limit=len(wanted)),
+                                dict(self._ledger_filters), on_done=loans)
 
     # ── Logout ───────────────────────────────
     def logout(self):
         if messagebox.askyesno("Logout", "Are you sure you want to logout?"):
+            self.jobs.cancel(self.current)
+            self.root.unbind(DIAGNOSTICS_KEY)
+            self.changes.listeners.remove(self._apply_changes)
             for w in self.root.winfo_children():
                 w.destroy()
-            app_start(self.root, self.db)
+            app_start(self.root, self.db, self.jobs, self.index, self.stats, self.changes)
 
 
 # ─────────────────────────────────────────────
 #  BOOTSTRAP
 # ─────────────────────────────────────────────
-def app_start(root, db):
-    LoginWindow(root, db, lambda: LibraryApp(root, db))
+def app_start(root, db, jobs, index, stats, changes):
+    LoginWindow(root, db, lambda: LibraryApp(root, db, jobs, index, stats, changes))
+
+
+def show_db_error(error):
+    messagebox.showerror("DB Error", str(error))
 
 
 if __name__ == "__main__":
@@ -829,6 +2202,23 @@ if __name__ == "__main__":
     root.minsize(1000, 620)
     root.configure(bg=BG_DARK)
 
-    db = DatabaseManager()
-    app_start(root, db)
+    db   = DatabaseManager(on_error=show_db_error, pool=ConnectionPool())
+    try:
+        db.migrate()
+    except Error as e:
+        messagebox.showerror("Database Error",
+            f"Could not open the database.\n\n{e}\n\n"
+            "Please ensure MySQL is running and update credentials in library/settings.py "
+            "(or set DB_BACKEND = \"sqlite\" to use a local database file)")
+    jobs = QueryExecutor(root, db)
+    index = LiveSearchIndex(jobs)
+    stats = StatsCache()
+    OverdueScheduler(root, jobs).listeners.append(stats.overdue_marked)
+    changes = ChangePoller(root, jobs)
+    changes.listeners.append(lambda batch: follow_changes(batch, db.cache, index, stats))
+    app_start(root, db, jobs, index, stats, changes)
     root.mainloop()
+    jobs.shutdown()
+    db.pool.close()
+    if db.profiler.enabled:
+        db.profiler.dump(PROFILE_DUMP, pool=db.pool.stats(), cache=db.cache.stats())